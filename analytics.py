@@ -0,0 +1,159 @@
+from array import array
+
+STUDENT, TEACHER = 0, 1
+
+
+class UniversityAnalytics:
+    """
+    Columnar view of a University for reports.
+    Every person is a row of typed arrays (kind, faculty code, start year, points, number of courses). The reports
+    are served from aggregates kept per group - students points histogram per faculty, persons per start year,
+    enrollments per course, teachers and courses per teacher faculty - so a report costs O(groups), not O(persons).
+    The view listens to the university changes and only re-reads the persons that changed since the last report:
+    their old row is taken out of the aggregates and the new one added. Rows of removed persons are reused.
+    """
+    def __init__(self, university):
+        self.university = university
+        self._rows = {}
+        self._kind = array('b')
+        self._alive = array('b')
+        self._faculty = array('l')
+        self._start_year = array('l')
+        self._points = array('d')
+        self._course_count = array('l')
+        self._row_courses = []
+        self._free_rows = []
+        self._faculty_codes = {}
+        self._faculty_names = []
+        self._faculty_points = {}
+        self._cohorts = ({}, {})
+        self._student_enrollments = {}
+        self._teacher_enrollments = {}
+        self._teacher_faculty_courses = {}
+        self._teacher_faculty_teachers = {}
+        self._dirty = set(university.students.keys()) | set(university.teachers.keys())
+        university.add_change_listener(self._dirty.add)
+
+    def close(self):
+        """
+        Stops following the university changes
+        """
+        self.university.remove_change_listener(self._dirty.add)
+
+    def refresh(self):
+        """
+        Applies the changes made since the last refresh. Called by every report.
+        :return: int - number of refreshed persons
+        """
+        dirty = list(self._dirty)
+        self._dirty.clear()
+        for identity_number in dirty:
+            self._refresh_person(identity_number)
+        return len(dirty)
+
+    def _faculty_code(self, faculty):
+        code = self._faculty_codes.get(faculty)
+        if code is None:
+            code = self._faculty_codes[faculty] = len(self._faculty_names)
+            self._faculty_names.append(faculty)
+        return code
+
+    def _refresh_person(self, identity_number):
+        row = self._rows.get(identity_number)
+        if row is not None:
+            self._count_row(row, -1)
+        person = self.university.get_person_by_id(identity_number)
+        if person is None:
+            if row is not None:
+                self._alive[row] = 0
+                del self._rows[identity_number]
+                self._free_rows.append(row)
+            return
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = len(self._kind)
+                for column in (self._kind, self._alive, self._faculty, self._start_year, self._course_count):
+                    column.append(0)
+                self._points.append(0.0)
+                self._row_courses.append(())
+            self._rows[identity_number] = row
+        is_student = person.person_type() == 'Student'
+        start_year = self.university.get_start_year(person.start_date)
+        self._kind[row] = STUDENT if is_student else TEACHER
+        self._alive[row] = 1
+        self._faculty[row] = self._faculty_code(person.faculty if is_student else
+                                                (person.faculties[0] if person.faculties else None))
+        self._start_year[row] = -1 if start_year is None else start_year
+        self._points[row] = person.points if is_student else 0.0
+        self._course_count[row] = len(person.courses)
+        self._row_courses[row] = tuple((str(course['id']), course['faculty']) for course in person.courses.values())
+        self._count_row(row, 1)
+
+    def _count_row(self, row, sign):
+        # adds (sign 1) or takes out (sign -1) the row from the aggregates
+        kind = self._kind[row]
+        if self._start_year[row] >= 0:
+            _add(self._cohorts[kind], self._start_year[row], sign)
+        if kind == STUDENT:
+            _add(self._faculty_points.setdefault(self._faculty[row], {}), self._points[row], sign)
+            for course_id, _ in self._row_courses[row]:
+                _add(self._student_enrollments, course_id, sign)
+        else:
+            for course_id, faculty in self._row_courses[row]:
+                _add(self._teacher_enrollments, course_id, sign)
+                _add(self._teacher_faculty_courses, faculty, sign)
+            for faculty in {faculty for _, faculty in self._row_courses[row]}:
+                _add(self._teacher_faculty_teachers, faculty, sign)
+
+    ''' reports '''
+
+    def points_by_faculty(self):
+        """
+        :return: dict - faculty to the number of students and the total, mean, min and max of their course points
+        """
+        self.refresh()
+        report = {}
+        for code, faculty in enumerate(self._faculty_names):
+            histogram = self._faculty_points.get(code)
+            if histogram:
+                count = sum(histogram.values())
+                total = sum(points * students for points, students in histogram.items())
+                report[faculty] = {'students': count, 'total': total, 'mean': total / count,
+                                   'min': min(histogram), 'max': max(histogram)}
+        return report
+
+    def enrollment_counts(self, person_type='Student'):
+        """
+        :param person_type: str - 'Student' to count the enrolled students, 'Teacher' to count the teachers
+        :return: dict - course id (int) to the number of persons of that type enrolled to it, for non empty courses
+        """
+        self.refresh()
+        enrollments = self._student_enrollments if person_type == 'Student' else self._teacher_enrollments
+        return {int(course_id): count for course_id, count in enrollments.items()}
+
+    def teacher_load_by_faculty(self):
+        """
+        :return: dict - faculty to the number of teachers teaching in it and the number of its courses they teach
+        """
+        self.refresh()
+        return {faculty: {'teachers': self._teacher_faculty_teachers.get(faculty, 0), 'courses': courses}
+                for faculty, courses in self._teacher_faculty_courses.items()}
+
+    def cohort_by_start_year(self, person_type='Student'):
+        """
+        :param person_type: str - 'Student' or 'Teacher'
+        :return: dict - start year to the number of persons of that type who started in it, sorted by year
+        """
+        self.refresh()
+        return dict(sorted(self._cohorts[STUDENT if person_type == 'Student' else TEACHER].items()))
+
+
+def _add(counters, key, sign):
+    # counters never keep a zero count, so the reports don't have to skip empty groups
+    count = counters.get(key, 0) + sign
+    if count:
+        counters[key] = count
+    else:
+        del counters[key]
@@ -0,0 +1,388 @@
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from university import University, courses_file_path
+
+FIRST_NAMES = ['Jere', 'Mariann', 'Audrie', 'Iseabal', 'Joeann', 'Lelah', 'Desirae', 'Livvyy', 'Nikki', 'Netty',
+               'Elbertina', 'Joane', 'Priscilla', 'Cathyleen', 'Yvonne', 'Minda', 'Magdalena', 'Edee', 'Angelique']
+LAST_NAMES = ['Cressida', 'Gino', 'Ivens', 'Jalbert', 'Keily', 'Gladstone', 'Gower', 'Leonard', 'Stanwood',
+              'Cassius', 'Hilbert', 'Stevy', 'Alcott', 'Hailee', 'Chabot', 'Sigfrid', 'Schlosser', 'Jorgan']
+FACULTIES = ['Agriculture & Natural Resources', 'Arts', 'Business', 'Communications & Journalism',
+             'Computers & Mathematics', 'Education', 'Engineering', 'Health', 'Humanities & Liberal Arts',
+             'Industrial Arts & Consumer Services', 'Interdisciplinary', 'Law & Public Policy', 'Life Sciences',
+             'Physical Sciences', 'Psychology & Social Work', 'Social Science']
+CITIES = [('Lisbon', 'Luxembourg'), ('Kaohsiung', 'Zimbabwe'), ('Bangalore', 'Ethiopia'), ('Miami', 'Botswana'),
+          ('Kyoto', 'Qatar'), ('Mandurah', 'Guatemala'), ('Nanjing', 'Bahrain'), ('Vienna', 'Nicaragua')]
+
+
+def generate_students(university, count, seed=0, courses_per_student=4):
+    """
+    Adds count synthetic students to the university and enrolls each one to random courses of its faculty.
+    The university courses must already be loaded.
+    :param university: University
+    :param count: int - number of students to generate
+    :param seed: int - random seed, the same seed always generates the same population
+    :param courses_per_student: int - maximal number of courses enrolled per student
+    :return: None
+    """
+    rng = random.Random(seed)
+    faculty_courses = {}
+    for course in university.list_courses():
+        faculty_courses.setdefault(course['faculty'], []).append(course)
+    faculties = sorted(faculty_courses)
+    for i in range(count):
+        identity_number = f'{100000000 + i:09d}'
+        faculty = rng.choice(faculties)
+        city, country = rng.choice(CITIES)
+        university.add_student(identity_number, f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', faculty,
+                               str(rng.randint(1990, 2022)), f'{city}, {country}, {rng.randint(0, 9999999):07d}')
+        courses = faculty_courses[faculty]
+        points = 0
+        for course in rng.sample(courses, min(courses_per_student, len(courses))):
+            if points + course['points'] <= 30:
+                university.add_course(identity_number, course['id'])
+                points += course['points']
+
+
+def measure_memory(count, compact, seed=0):
+    """
+    Builds a university with count synthetic students and measures the memory it takes
+    :param count: int - number of students
+    :param compact: bool - University compact storage mode
+    :param seed: int - random seed of the population
+    :return: int - number of bytes allocated by the population
+    """
+    university = University('benchmark', compact=compact)
+    university.load_courses(courses_file_path)
+    tracemalloc.start()
+    try:
+        generate_students(university, count, seed)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return current
+
+
+def memory_benchmark(count, seed=0):
+    """
+    Compares the memory of the default and compact storage modes on the same synthetic population
+    :return: dict - bytes per mode and the compact/default ratio
+    """
+    default = measure_memory(count, compact=False, seed=seed)
+    compact = measure_memory(count, compact=True, seed=seed)
+    return {'students': count, 'default_bytes': default, 'compact_bytes': compact, 'ratio': compact / default}
+
+
+def thread_benchmark(thread_counts=(1, 2, 4, 8), students=10000, operations=20000, seed=0):
+    """
+    Stress test of ConcurrentUniversity: every thread runs the same number of operations (one write, an
+    add_course/remove_course pair, for every four reads) on random students, and the total throughput is measured
+    for each number of threads.
+    :param thread_counts: iterable of int - numbers of threads to measure
+    :param students: int - size of the synthetic population
+    :param operations: int - operations per thread
+    :param seed: int - random seed of the population and of the operations
+    :return: list of dict - threads, operations, elapsed seconds and throughput (operations/sec)
+    """
+    from concurrency import ConcurrentUniversity
+    results = []
+    for thread_count in thread_counts:
+        university = ConcurrentUniversity('benchmark')
+        university.load_courses(courses_file_path)
+        generate_students(university, students, seed, courses_per_student=2)
+        ids = list(university.students.keys())
+        faculty_courses = {}
+        for course in university.list_courses():
+            faculty_courses.setdefault(course['faculty'], []).append(course['id'])
+
+        def worker(worker_seed):
+            rng = random.Random(worker_seed)
+            for i in range(operations):
+                person_id = rng.choice(ids)
+                if i % 5 == 0:
+                    course_id = rng.choice(faculty_courses[university.students[person_id].faculty])
+                    try:
+                        university.add_course(person_id, course_id)
+                        university.remove_course(person_id, course_id)
+                    except (ValueError, PermissionError):
+                        pass
+                elif i % 5 == 1:
+                    university.get_top_10_students()
+                else:
+                    university.get_courses(person_id)
+
+        threads = [threading.Thread(target=worker, args=(seed + i,)) for i in range(thread_count)]
+        start = perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = perf_counter() - start
+        results.append({'threads': thread_count, 'operations': thread_count * operations, 'elapsed': elapsed,
+                        'throughput': thread_count * operations / elapsed})
+    return results
+
+
+def generate_courses(count, seed=0):
+    """
+    :param count: int - number of courses
+    :param seed: int - random seed
+    :return: list of course dictionaries spread over all faculties, in courses.json format
+    """
+    rng = random.Random(seed)
+    return [{"id": 1000 + i, "name": f'COURSE {i}', "faculty": FACULTIES[i % len(FACULTIES)],
+             "points": rng.choice([2, 2.5, 3, 3.5, 4, 4.5, 5, 5.5])} for i in range(count)]
+
+
+def generate_person_rows(count, seed=0, teachers=False, first_id=100000000):
+    """
+    Lazily generates synthetic students (or teachers) csv rows, so populations of any size take constant memory
+    :param count: int - number of rows
+    :param seed: int - random seed
+    :param teachers: bool - generate teacher rows (dd/mm/yyyy start date, no address) instead of student rows
+    :param first_id: int - identity number of the first row, the next rows get consecutive numbers
+    :return: generator of row lists in the students_short.csv / teachers_short.csv columns order
+    """
+    rng = random.Random(seed)
+    for i in range(count):
+        row = [f'{first_id + i:09d}', f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', rng.choice(FACULTIES)]
+        if teachers:
+            row.append(f'{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1970, 2022)}')
+        else:
+            city, country = rng.choice(CITIES)
+            row += [str(rng.randint(1990, 2022)), f'{city}, {country}, {rng.randint(0, 9999999):07d}']
+        yield row
+
+
+def write_dataset(directory, students, seed=0):
+    """
+    Writes a synthetic dataset (students.csv, teachers.csv, courses.json) for a population of the given size:
+    one teacher for every 20 students and one course for every 1000 students (at least 173 courses, like
+    data/courses.json)
+    :param directory: str - output directory
+    :param students: int - number of students
+    :param seed: int - random seed, the same seed always writes the same files
+    :return: tuple - (students file, teachers file, courses file) paths
+    """
+    students_file = os.path.join(directory, 'students.csv')
+    teachers_file = os.path.join(directory, 'teachers.csv')
+    courses_file = os.path.join(directory, 'courses.json')
+    with open(students_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['identity_number', 'full_name', 'faculty', 'start_date', 'address'])
+        writer.writerows(generate_person_rows(students, seed))
+    with open(teachers_file, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['identity_number', 'full_name', 'faculty', 'start_date'])
+        writer.writerows(generate_person_rows(max(students // 20, 1), seed + 1, teachers=True, first_id=900000000))
+    with open(courses_file, 'w') as f:
+        json.dump(generate_courses(max(students // 1000, 173), seed), f)
+    return students_file, teachers_file, courses_file
+
+
+def _timed(results, name, operations, function, *args):
+    start = perf_counter()
+    value = function(*args)
+    elapsed = perf_counter() - start
+    results[name] = {'operations': operations, 'seconds': elapsed,
+                     'throughput': operations / elapsed if elapsed > 0 else float('inf')}
+    return value
+
+
+def run_size(students, seed=0, repeat=20, backend='memory'):
+    """
+    Times the University loaders, enrollments and reports on a synthetic population. Runs in a fresh process
+    (see run_suite), so the reported peak memory belongs to this population size only.
+    :param students: int - number of students
+    :param seed: int - random seed
+    :param repeat: int - number of calls of every report
+    :param backend: str - 'memory' for University, 'sqlite' for SQLiteUniversity on a temporary database file
+    :return: dict - operation name to operations, seconds and throughput, plus the process peak_rss_kb
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        students_file, teachers_file, courses_file = write_dataset(directory, students, seed)
+        if backend == 'sqlite':
+            from sqlite_university import SQLiteUniversity
+            university = SQLiteUniversity('benchmark', os.path.join(directory, 'university.db'))
+        else:
+            university = University('benchmark')
+        _timed(results, 'load_courses', max(students // 1000, 173), university.load_courses, courses_file)
+        _timed(results, 'load_students', students, university.load_students_bulk, students_file)
+        _timed(results, 'load_teachers', max(students // 20, 1), university.load_teachers_bulk, teachers_file)
+        rng = random.Random(seed)
+        faculty_courses = {}
+        for course in university.list_courses():
+            faculty_courses.setdefault(course['faculty'], []).append(course['id'])
+        enrollments = [(s.identity_number, rng.choice(faculty_courses[s.faculty])) for s in university.get_students()]
+
+        def enroll():
+            for person_id, course_id in enrollments:
+                university.add_course(person_id, course_id)
+
+        def unenroll():
+            for person_id, course_id in enrollments[::2]:
+                university.remove_course(person_id, course_id)
+
+        def report(method, *args):
+            for _ in range(repeat):
+                method(*args)
+
+        _timed(results, 'add_course', len(enrollments), enroll)
+        _timed(results, 'remove_course', len(enrollments[::2]), unenroll)
+        _timed(results, 'get_top_10_students', repeat, report, university.get_top_10_students)
+        _timed(results, 'get_teachers_from', repeat, report, university.get_teachers_from, '01/01/2015')
+        _timed(results, 'get_students_zip_code', repeat, report, university.get_students_zip_code)
+        if backend == 'sqlite':
+            university.close()
+    results['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+def run_suite(sizes, seed=0, repeat=20, backend='memory'):
+    """
+    :param sizes: iterable of int - population sizes (number of students), e.g. 1000 to 10000000
+    :param backend: str - 'memory' or 'sqlite', see run_size
+    :return: dict - machine readable results: seed, backend and, for every size, run_size results
+    """
+    results = {'seed': seed, 'backend': backend, 'sizes': {}}
+    for size in sizes:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results['sizes'][str(size)] = executor.submit(run_size, size, seed, repeat, backend).result()
+    return results
+
+
+def storage_benchmark(sizes, seed=0, repeat=20):
+    """
+    Runs the suite on the in memory and the SQLite backends
+    :return: dict - backend name to its run_suite results
+    """
+    return {backend: run_suite(sizes, seed, repeat, backend) for backend in ('memory', 'sqlite')}
+
+
+def snapshot_benchmark(students, seed=0):
+    """
+    Times restoring a university from its snapshot against loading the same population from the csv and json
+    source files
+    :param students: int - number of students
+    :param seed: int - random seed
+    :return: dict - csv and snapshot load results (operations, seconds, throughput) and the snapshot speedup
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        students_file, teachers_file, courses_file = write_dataset(directory, students, seed)
+        persons = students + max(students // 20, 1)
+
+        def load_csv():
+            university = University('benchmark')
+            university.load_courses(courses_file)
+            university.load_students_bulk(students_file)
+            university.load_teachers_bulk(teachers_file)
+            return university
+
+        snapshot_file = os.path.join(directory, 'university.snap')
+        _timed(results, 'csv', persons, load_csv).save_snapshot(snapshot_file)
+        _timed(results, 'snapshot', persons, University('benchmark').load_snapshot, snapshot_file)
+    results['speedup'] = results['csv']['seconds'] / results['snapshot']['seconds']
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance=0.2):
+    """
+    Finds the operations whose throughput dropped by more than tolerance compared to a baseline run
+    :param results: dict - run_suite results
+    :param baseline: dict - run_suite results stored from a previous run
+    :param tolerance: float - allowed relative throughput drop
+    :return: list of dict - size, operation, baseline and current throughput of every regression
+    """
+    regressions = []
+    for size, operations in results['sizes'].items():
+        for name, current in operations.items():
+            previous = baseline.get('sizes', {}).get(size, {}).get(name)
+            if not isinstance(current, dict) or not previous:
+                continue
+            if current['throughput'] < previous['throughput'] * (1 - tolerance):
+                regressions.append({'size': size, 'operation': name, 'baseline': previous['throughput'],
+                                    'current': current['throughput']})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='myUniversity benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    memory = subparsers.add_parser('memory', help='compare default and compact person storage memory')
+    memory.add_argument('--students', type=int, default=100000)
+    memory.add_argument('--seed', type=int, default=0)
+    threads = subparsers.add_parser('threads', help='ConcurrentUniversity throughput by number of threads')
+    threads.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    threads.add_argument('--students', type=int, default=10000)
+    threads.add_argument('--operations', type=int, default=20000, help='operations per thread')
+    threads.add_argument('--seed', type=int, default=0)
+    suite = subparsers.add_parser('suite', help='loaders, enrollments and reports on synthetic populations')
+    suite.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    suite.add_argument('--seed', type=int, default=0)
+    suite.add_argument('--repeat', type=int, default=20, help='calls of every report')
+    suite.add_argument('--output', help='json file to write the results to')
+    suite.add_argument('--baseline', help='json results of a previous run to compare to')
+    suite.add_argument('--tolerance', type=float, default=0.2, help='allowed relative throughput drop')
+    suite.add_argument('--backend', choices=['memory', 'sqlite'], default='memory')
+    storage = subparsers.add_parser('storage', help='in memory University against SQLiteUniversity')
+    storage.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    storage.add_argument('--seed', type=int, default=0)
+    storage.add_argument('--repeat', type=int, default=20, help='calls of every report')
+    snapshot = subparsers.add_parser('snapshot', help='snapshot restore against csv load')
+    snapshot.add_argument('--students', type=int, default=100000)
+    snapshot.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if args.benchmark == 'suite':
+        results = run_suite(args.sizes, args.seed, args.repeat, args.backend)
+        for size, operations in results['sizes'].items():
+            print(f"{size} students (peak rss {operations['peak_rss_kb'] / 1024:.0f} MiB)")
+            for name, result in operations.items():
+                if isinstance(result, dict):
+                    print(f"    {name:<24}{result['throughput']:>14.0f} ops/s  {result['seconds']:.3f}s")
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression['operation']} at {regression['size']} students: "
+                      f"{regression['baseline']:.0f} -> {regression['current']:.0f} ops/s")
+            if regressions:
+                sys.exit(1)
+    if args.benchmark == 'storage':
+        results = storage_benchmark(args.sizes, args.seed, args.repeat)
+        for size in results['memory']['sizes']:
+            memory, sqlite = results['memory']['sizes'][size], results['sqlite']['sizes'][size]
+            print(f'{size} students{"memory":>21}{"sqlite":>14}  (ops/s)')
+            for name, result in memory.items():
+                if isinstance(result, dict):
+                    print(f"    {name:<24}{result['throughput']:>14.0f}{sqlite[name]['throughput']:>14.0f}")
+    if args.benchmark == 'snapshot':
+        result = snapshot_benchmark(args.students, args.seed)
+        for name in ('csv', 'snapshot'):
+            print(f"{name:<10}{result[name]['throughput']:>14.0f} persons/s  {result[name]['seconds']:.3f}s")
+        print(f"snapshot restore is {result['speedup']:.1f}x faster")
+    if args.benchmark == 'threads':
+        for result in thread_benchmark(args.threads, args.students, args.operations, args.seed):
+            print(f"{result['threads']} threads: {result['operations']} operations in {result['elapsed']:.2f}s, "
+                  f"{result['throughput']:.0f} ops/s")
+    if args.benchmark == 'memory':
+        result = memory_benchmark(args.students, args.seed)
+        print(f"{result['students']} students: default {result['default_bytes'] / 2 ** 20:.1f} MiB, "
+              f"compact {result['compact_bytes'] / 2 ** 20:.1f} MiB ({result['ratio']:.0%})")
+
+
+if __name__ == '__main__':
+    main()
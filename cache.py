@@ -0,0 +1,38 @@
+class DerivedCache:
+    """
+    Memoizes values derived from the university data (aggregates, sorted reports...).
+    A value is computed on the first get and served from the cache until its key is invalidated by a change of the
+    data it depends on. Hits and misses are counted to check the cache is actually used.
+    """
+    def __init__(self):
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        """
+        :param key: hashable - cache key
+        :param compute: callable - computes the value on a miss
+        :return: the cached or freshly computed value
+        """
+        try:
+            value = self._values[key]
+        except KeyError:
+            self.misses += 1
+            value = self._values[key] = compute()
+        else:
+            self.hits += 1
+        return value
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self._values.pop(key, None)
+
+    def clear(self):
+        self._values.clear()
+
+    def stats(self):
+        """
+        :return: dict - hits, misses and number of cached entries
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._values)}
@@ -0,0 +1,143 @@
+import json
+from collections.abc import MutableMapping
+from sys import intern
+from timetable import parse_slots, format_slot
+
+READ_SIZE = 1 << 16
+
+
+class Course:
+    __slots__ = ('course_id', 'name', 'faculty', 'points', 'slots')
+
+    def __init__(self, course_id, name, faculty, points, slots=()):
+        """
+        :param slots: iterable of str - weekly time slots, e.g. ["Mon 10:00-12:00", "Wed 10:00-11:00"], kept as
+        sorted (start, end) minutes of the week intervals
+        """
+        self.course_id = course_id
+        self.name = name
+        self.faculty = intern(faculty)
+        self.points = points
+        self.slots = parse_slots(slots)
+
+    def as_dict(self):
+        course = {"id": self.course_id, "name": self.name, "faculty": self.faculty, "points": self.points}
+        if self.slots:
+            course["slots"] = [format_slot(interval) for interval in self.slots]
+        return course
+
+    def __repr__(self):
+        return f'Course(ID: {self.course_id}, name: {self.name}, faculty: {self.faculty}, points: {self.points})'
+
+
+class CourseCatalog(MutableMapping):
+    """
+    The university courses table: {str(course id): course dictionary}, like the plain dictionary it replaces.
+    Courses are stored as compact Course records; the course dictionary callers get is only built on the first
+    access of a course, and then reused so every person holds the same dictionary.
+    """
+    def __init__(self):
+        self._records = {}
+        self._dicts = {}
+
+    def add(self, course):
+        """
+        :param course: Course - course record
+        :return: None
+        """
+        course_key = str(course.course_id)
+        self._records[course_key] = course
+        self._dicts.pop(course_key, None)
+
+    def record(self, course_id):
+        """
+        :return: Course - the course record, without building its dictionary
+        """
+        return self._records[str(course_id)]
+
+    def records(self):
+        """
+        :return: a view of the (course id, Course record) pairs, without building the course dictionaries
+        """
+        return self._records.items()
+
+    def __getitem__(self, course_id):
+        course_dict = self._dicts.get(course_id)
+        if course_dict is None:
+            course_dict = self._dicts[course_id] = self._records[course_id].as_dict()
+        return course_dict
+
+    def __setitem__(self, course_id, course):
+        self._records[course_id] = Course(course['id'], course['name'], course['faculty'], course['points'],
+                                          course.get('slots', ()))
+        self._dicts[course_id] = course
+
+    def __delitem__(self, course_id):
+        del self._records[course_id]
+        self._dicts.pop(course_id, None)
+
+    def __contains__(self, course_id):
+        return course_id in self._records
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+def _iter_json_array(f):
+    decoder = json.JSONDecoder()
+    buffer, position = '', 0
+    started = False
+    while True:
+        chunk = f.read(READ_SIZE)
+        buffer, position = buffer[position:] + chunk, 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('The courses json file must hold an array of courses')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                # the value continues in the next chunk
+                break
+            if end == len(buffer) and chunk:
+                break
+            yield value
+            position = end
+        if not chunk:
+            raise ValueError('Unexpected end of the courses json array')
+
+
+def iter_courses(file_path):
+    """
+    Streams the courses of a catalog file as Course records, without holding the whole file in memory.
+    The file is either a json array of course objects (like data/courses.json) or newline delimited json,
+    one course object per line.
+    :param file_path: str - courses file path
+    :return: generator of Course records
+    """
+    with open(file_path, 'r') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            f.seek(0)
+            values = _iter_json_array(f)
+        else:
+            f.seek(0)
+            values = (json.loads(line) for line in f if line.strip())
+        for course in values:
+            yield Course(course['id'], course['name'], course['faculty'], course['points'], course.get('slots', ()))
@@ -0,0 +1,401 @@
+import threading
+from collections import namedtuple, deque
+from contextlib import contextmanager, ExitStack
+from types import MappingProxyType
+from university import University
+
+StudentView = namedtuple('StudentView', ['identity_number', 'name', 'faculty', 'start_date', 'address', 'courses',
+                                         'points'])
+TeacherView = namedtuple('TeacherView', ['identity_number', 'name', 'faculties', 'start_date', 'courses'])
+UniversityView = namedtuple('UniversityView', ['name', 'courses', 'students', 'teachers'])
+
+
+class RWLock:
+    """
+    Readers/writer lock: any number of readers or a single writer. Waiting writers block new readers, so writers
+    are not starved. Both sides are reentrant for the thread holding them, and the writer may also read.
+    """
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        depth = getattr(self._local, 'depth', 0)
+        if depth or self._writer == threading.get_ident():
+            self._local.depth = depth + 1
+            return
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        self._local.depth = 1
+
+    def release_read(self):
+        self._local.depth -= 1
+        if self._local.depth or self._writer == threading.get_ident():
+            return
+        with self._condition:
+            self._readers -= 1
+            if not self._readers:
+                self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        if self._writer == me:
+            self._writer_depth += 1
+            return
+        if getattr(self._local, 'depth', 0):
+            raise RuntimeError('Cannot upgrade a read lock to a write lock')
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer is not None or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def held(self):
+        """
+        :return: bool - True if the calling thread holds the lock, shared or exclusive
+        """
+        return self._writer == threading.get_ident() or bool(getattr(self._local, 'depth', 0))
+
+    def release_write(self):
+        self._writer_depth -= 1
+        if self._writer_depth:
+            return
+        with self._condition:
+            self._writer = None
+            self._condition.notify_all()
+
+
+class ConcurrentUniversity(University):
+    """
+    University that can be shared between threads.
+    Locking levels, always taken in this order:
+        * a university wide readers/writer lock - adding, removing or re-assigning persons, loads and snapshot()
+          take it exclusively, every other operation takes it shared
+        * per person and per course locks (striped over a fixed pool of locks) - taken by enrollment changes and
+          by reads of a person's enrollments, so operations on different persons and courses run side by side
+        * a short index lock - guards the shared indexes, leaderboard and journal while a change is applied
+    Multi-step operations like add_course (check the rules, update the person, its points and the indexes) are
+    therefore atomic to other threads.
+    Change events are queued in sequence order while the locks are held and published to the event log once they
+    are released, so a blocking event log never waits for subscribers while they are locked out of the university.
+    """
+    def __init__(self, name, compact=False, stripes=64):
+        super().__init__(name, compact)
+        self._lock = RWLock()
+        self._person_locks = [threading.RLock() for _ in range(stripes)]
+        self._course_locks = [threading.RLock() for _ in range(stripes)]
+        self._index_lock = threading.RLock()
+        self._pending_events = deque()
+        self._publish_lock = threading.Lock()
+        # the last snapshot and the ids of the persons changed since then
+        self._view = UniversityView(name, (), MappingProxyType({}), MappingProxyType({}))
+        self._view_dirty = set()
+        self._view_lock = threading.Lock()
+        self.add_change_listener(self._view_dirty.add)
+
+    @contextmanager
+    def _mutating(self, *locks):
+        """
+        Holds the locks of a change, then publishes the events it queued
+        """
+        try:
+            with ExitStack() as stack:
+                for lock in locks:
+                    stack.enter_context(lock)
+                yield
+        finally:
+            self._publish_events()
+
+    def _publish_events(self):
+        # nested calls publish when the outermost one released its locks
+        if not self._pending_events or self._lock.held():
+            return
+        with self._publish_lock:
+            while self._pending_events:
+                sequence, op, args = self._pending_events.popleft()
+                if self._events is not None:
+                    self._events.append(sequence, op, args)
+
+    def _emit_event(self, sequence, op, args):
+        # called under the index lock, so the queue is in sequence order
+        self._pending_events.append((sequence, op, args))
+
+    def _person_lock(self, person_id):
+        return self._person_locks[hash(str(person_id)) % len(self._person_locks)]
+
+    def _course_lock(self, course_id):
+        return self._course_locks[hash(str(course_id)) % len(self._course_locks)]
+
+    def snapshot(self):
+        """
+        Returns a consistent, immutable copy of the university persons and enrollments.
+        Snapshots are copy on write: the persons views are shared with the previous snapshot and only the persons
+        changed since then are copied, so other threads wait only while those few are read.
+        :return: UniversityView - name, courses tuple, and read only students/teachers mappings of
+        StudentView/TeacherView
+        """
+        with self._view_lock:
+            with self._lock.write_locked():
+                changed = self._view_dirty.copy()
+                self._view_dirty.clear()
+                students = {person_id: self._student_view(self._students.get(person_id)) for person_id in changed}
+                teachers = {person_id: self._teacher_view(self._teachers.get(person_id)) for person_id in changed}
+                courses = tuple(self.courses.values())
+            view = self._view
+            if changed:
+                view = view._replace(students=self._apply_views(view.students, students),
+                                     teachers=self._apply_views(view.teachers, teachers))
+            if courses != view.courses or self.name != view.name:
+                view = view._replace(name=self.name, courses=courses)
+            self._view = view
+            return view
+
+    @staticmethod
+    def _student_view(s):
+        if s is not None:
+            return StudentView(s.identity_number, s.name, s.faculty, s.start_date, s.address, tuple(s.courses.keys()),
+                               s.points)
+
+    @staticmethod
+    def _teacher_view(t):
+        if t is not None:
+            return TeacherView(t.identity_number, t.name, tuple(t.faculties), t.start_date, tuple(t.courses.keys()))
+
+    @staticmethod
+    def _apply_views(views, changed):
+        # the previous mapping is shared by earlier snapshots, so changes go to a copy of it
+        views = dict(views)
+        for person_id, view in changed.items():
+            if view is None:
+                views.pop(person_id, None)
+            else:
+                views[person_id] = view
+        return MappingProxyType(views)
+
+    ''' university wide (exclusive) operations '''
+
+    def load_university_data(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_university_data(*args, **kwargs)
+
+    def load_students(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_students(*args, **kwargs)
+
+    def load_teachers(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_teachers(*args, **kwargs)
+
+    def load_courses(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_courses(*args, **kwargs)
+
+    def load_students_bulk(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_students_bulk(*args, **kwargs)
+
+    def load_teachers_bulk(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_teachers_bulk(*args, **kwargs)
+
+    def load_shards(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_shards(*args, **kwargs)
+
+    def reload_students(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().reload_students(*args, **kwargs)
+
+    def reload_teachers(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().reload_teachers(*args, **kwargs)
+
+    def load_snapshot(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().load_snapshot(*args, **kwargs)
+
+    def save_snapshot(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().save_snapshot(*args, **kwargs)
+
+    def add_student(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().add_student(*args, **kwargs)
+
+    def add_teacher(self, *args, **kwargs):
+        with self._mutating(self._lock.write_locked()):
+            return super().add_teacher(*args, **kwargs)
+
+    def remove_person(self, identity_number):
+        with self._mutating(self._lock.write_locked()):
+            return super().remove_person(identity_number)
+
+    def change_faculty(self, identity_number, faculty):
+        with self._mutating(self._lock.write_locked()):
+            return super().change_faculty(identity_number, faculty)
+
+    def add_courses_bulk(self, pairs, all_or_nothing=False):
+        with self._mutating(self._lock.write_locked()):
+            return super().add_courses_bulk(pairs, all_or_nothing)
+
+    def set_course_slots(self, course_id, slots):
+        with self._mutating(self._lock.write_locked()):
+            return super().set_course_slots(course_id, slots)
+
+    def assign_teachers(self, course_ids=None, apply=False):
+        with self._mutating(self._lock.write_locked()):
+            return super().assign_teachers(course_ids, apply)
+
+    def set_course_capacity(self, course_id, capacity):
+        with self._mutating(self._lock.write_locked()):
+            return super().set_course_capacity(course_id, capacity)
+
+    def request_seat(self, person_id, course_id, priority=0):
+        with self._mutating(self._lock.write_locked()):
+            return super().request_seat(person_id, course_id, priority)
+
+    def allocate_seats(self, requests):
+        with self._mutating(self._lock.write_locked()):
+            return super().allocate_seats(requests)
+
+    ''' per person operations '''
+
+    def add_course(self, person_id, course_id):
+        with self._mutating(self._lock.read_locked(), self._person_lock(person_id), self._course_lock(course_id)):
+            return super().add_course(person_id, course_id)
+
+    def remove_course(self, person_id, course_id):
+        # waitlists only grow under the exclusive lock, so a course without waiting persons stays without
+        with self._mutating(self._lock.read_locked(), self._person_lock(person_id), self._course_lock(course_id)):
+            if not self._seats.waiting(str(course_id)):
+                return super().remove_course(person_id, course_id)
+        # the freed seat promotes other persons, whose locks aren't held here
+        with self._mutating(self._lock.write_locked()):
+            return super().remove_course(person_id, course_id)
+
+    def get_schedule(self, identity_number):
+        with self._lock.read_locked(), self._person_lock(identity_number):
+            return super().get_schedule(identity_number)
+
+    def get_course_seats(self, course_id):
+        with self._lock.read_locked(), self._course_lock(course_id):
+            return super().get_course_seats(course_id)
+
+    def get_waitlist(self, course_id):
+        with self._lock.read_locked(), self._course_lock(course_id):
+            return super().get_waitlist(course_id)
+
+    def get_courses(self, identity_number):
+        with self._lock.read_locked(), self._person_lock(identity_number):
+            return super().get_courses(identity_number)
+
+    def get_student_total_points(self, student_id):
+        with self._lock.read_locked(), self._person_lock(student_id):
+            return super().get_student_total_points(student_id)
+
+    def get_course_roster(self, course_id):
+        with self._lock.read_locked(), self._course_lock(course_id):
+            return super().get_course_roster(course_id)
+
+    ''' shared index reads and writes '''
+
+    def get_top_students(self, k):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_top_students(k)
+
+    def get_student_rank(self, identity_number):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_student_rank(identity_number)
+
+    def get_students(self):
+        with self._lock.read_locked():
+            return super().get_students()
+
+    def get_teachers(self):
+        with self._lock.read_locked():
+            return super().get_teachers()
+
+    # iter_students and iter_teachers read through these, so they take the locks one page at a time
+    def page_students(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        with self._lock.read_locked(), self._index_lock:
+            return super().page_students(cursor, limit, faculty, start_year, predicate)
+
+    def page_teachers(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        with self._lock.read_locked(), self._index_lock:
+            return super().page_teachers(cursor, limit, faculty, start_year, predicate)
+
+    def get_persons_by_start_year(self, from_year, to_year=None):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_persons_by_start_year(from_year, to_year)
+
+    def get_students_in_faculty(self, faculty):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_students_in_faculty(faculty)
+
+    def get_teachers_in_faculty(self, faculty):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_teachers_in_faculty(faculty)
+
+    def search_persons(self, query, mode='prefix', offset=0, limit=10, max_distance=None):
+        with self._lock.read_locked(), self._index_lock:
+            return super().search_persons(query, mode, offset, limit, max_distance)
+
+    def get_students_by_city(self, city):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_students_by_city(city)
+
+    def get_students_by_zip_prefix(self, prefix):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_students_by_zip_prefix(prefix)
+
+    def get_distinct_city_zip_codes(self):
+        with self._lock.read_locked(), self._index_lock:
+            return super().get_distinct_city_zip_codes()
+
+    def get_teachers_from(self, date_str):
+        with self._lock.read_locked():
+            return super().get_teachers_from(date_str)
+
+    def get_teachers_between(self, start_date, end_date):
+        with self._lock.read_locked():
+            return super().get_teachers_between(start_date, end_date)
+
+    def get_students_zip_code(self):
+        with self._lock.read_locked():
+            return super().get_students_zip_code()
+
+    def _enroll(self, person, course):
+        with self._index_lock:
+            super()._enroll(person, course)
+
+    def _unenroll(self, person, course):
+        with self._index_lock:
+            super()._unenroll(person, course)
+
+    def _record(self, op, *args):
+        with self._index_lock:
+            super()._record(op, *args)
@@ -0,0 +1,159 @@
+import threading
+from collections import namedtuple
+from time import monotonic
+
+# event type (the University method that made the change) to the names of its data fields
+EVENT_FIELDS = {
+    'add_student': ('identity_number', 'full_name', 'faculty', 'start_date', 'address'),
+    'add_teacher': ('identity_number', 'full_name', 'faculty', 'start_date'),
+    'add_course': ('identity_number', 'course_id'),
+    'remove_course': ('identity_number', 'course_id'),
+    'remove_person': ('identity_number',),
+    'change_faculty': ('identity_number', 'faculty'),
+    'set_course_slots': ('course_id', 'slots'),
+}
+
+Event = namedtuple('Event', ['offset', 'sequence', 'type', 'data'])
+
+
+class EventsLost(Exception):
+    """
+    Raised to a subscriber whose offset was overwritten before it read it. first_offset is the oldest event still
+    in the buffer: the subscriber has to resynchronize (e.g. with get_courses) and continue from there.
+    """
+    def __init__(self, offset, first_offset):
+        super().__init__(f'Events {offset} to {first_offset - 1} were overwritten before they were read')
+        self.offset = offset
+        self.first_offset = first_offset
+
+
+class EventLog:
+    """
+    Bounded in process ring buffer of University change events.
+    Every event gets an offset, counting from 0; the buffer keeps the last capacity events. When it is full:
+        * overflow='overwrite' - the oldest event is dropped, and subscribers still behind it get EventsLost
+        * overflow='block' - the writer (the University method making the change) waits until every subscriber
+          has read the oldest event, at most block_timeout seconds, and then overwrites it like 'overwrite' does
+    A University appends while the mutation holds no locks of its own (ConcurrentUniversity publishes the events
+    once its locks are released), so subscribers may call back into the university, e.g. to resynchronize.
+    A subscriber polling in the writing thread itself can never make room for that writer: with overflow='block'
+    every such append waits the whole block_timeout.
+    """
+    def __init__(self, capacity=65536, overflow='overwrite', block_timeout=10.0):
+        if overflow not in ('overwrite', 'block'):
+            raise ValueError(f"overflow must be 'overwrite' or 'block', got {overflow}")
+        if capacity < 1:
+            raise ValueError(f'capacity must be a positive number, got {capacity}')
+        self.capacity = capacity
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self._buffer = [None] * capacity
+        self._next = 0
+        self._condition = threading.Condition()
+        self._subscriptions = []
+
+    @property
+    def first_offset(self):
+        """
+        offset of the oldest event in the buffer
+        """
+        return max(self._next - self.capacity, 0)
+
+    @property
+    def next_offset(self):
+        """
+        offset the next event will get
+        """
+        return self._next
+
+    def append(self, sequence, op, args):
+        """
+        :param sequence: int - University mutation sequence number
+        :param op: str - event type, the name of the University method that made the change
+        :param args: tuple - the method arguments
+        :return: Event - the appended event
+        """
+        with self._condition:
+            if self.overflow == 'block':
+                deadline = None if self.block_timeout is None else monotonic() + self.block_timeout
+                while self._subscriptions and self._next - min(s.offset for s in self._subscriptions) >= self.capacity:
+                    remaining = None if deadline is None else deadline - monotonic()
+                    if remaining is not None and remaining <= 0:
+                        # the slowest subscriber gets EventsLost instead of blocking the writer forever
+                        break
+                    self._condition.wait(remaining)
+            event = Event(self._next, sequence, op, dict(zip(EVENT_FIELDS.get(op, ()), args)))
+            self._buffer[self._next % self.capacity] = event
+            self._next += 1
+            self._condition.notify_all()
+            return event
+
+    def subscribe(self, offset=None):
+        """
+        :param offset: int - offset of the first event to read, by default only the events appended from now on
+        :return: Subscription
+        """
+        with self._condition:
+            subscription = Subscription(self, self._next if offset is None else offset)
+            self._subscriptions.append(subscription)
+            return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._condition:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+                self._condition.notify_all()
+
+    def _read(self, subscription, max_events, timeout):
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            while subscription.offset >= self._next:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self._condition.wait(remaining)
+            if subscription.offset < self.first_offset:
+                raise EventsLost(subscription.offset, self.first_offset)
+            end = min(self._next, subscription.offset + max_events)
+            events = [self._buffer[offset % self.capacity] for offset in range(subscription.offset, end)]
+            subscription.offset = end
+            # a blocked writer may now have room
+            self._condition.notify_all()
+            return events
+
+
+class Subscription:
+    """
+    A consumer of an EventLog, reading it in batches from its own offset
+    """
+    def __init__(self, log, offset):
+        self.log = log
+        self.offset = offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def poll(self, max_events=256, timeout=0):
+        """
+        Reads the next batch of events and moves the offset past them
+        :param max_events: int - maximal batch size
+        :param timeout: float - seconds to wait for an event when there is none, None to wait forever
+        :return: list of Event, empty if no event arrived in time
+        :error handling
+            * EventsLost if events from the subscription offset were already overwritten
+        """
+        return self.log._read(self, max_events, timeout)
+
+    def seek(self, offset):
+        with self.log._condition:
+            self.offset = offset
+            self.log._condition.notify_all()
+
+    def close(self):
+        """
+        Stops the subscription, so a blocking log no longer waits for it
+        """
+        self.log._unsubscribe(self)
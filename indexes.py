@@ -0,0 +1,333 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+
+
+class KeyIndex:
+    """
+    Secondary index mapping a key (faculty, course id...) to the persons holding it.
+    Every key keeps an identity number to person dictionary, so adding, removing and listing a key's persons
+    costs O(1) per person and never scans the whole population.
+    """
+    def __init__(self):
+        self._buckets = {}
+
+    def add(self, key, person):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {}
+            self._on_key_added(key)
+        bucket[person.identity_number] = person
+
+    def add_many(self, pairs):
+        """
+        Adds a batch of persons, e.g. a chunk of a bulk load, in one call
+        :param pairs: iterable of (key, person) tuples
+        """
+        buckets = self._buckets
+        new_keys = []
+        for key, person in pairs:
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {}
+                new_keys.append(key)
+            bucket[person.identity_number] = person
+        self._on_keys_added(new_keys)
+
+    def remove(self, key, person):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(person.identity_number, None)
+        if not bucket:
+            del self._buckets[key]
+            self._on_key_removed(key)
+
+    def get(self, key):
+        """
+        :return: a list of the persons indexed under key, in insertion order
+        """
+        return list(self._buckets.get(key, {}).values())
+
+    def count(self, key):
+        return len(self._buckets.get(key, ()))
+
+    def ids(self, key):
+        """
+        :return: a live view of the identity numbers indexed under key, for membership checks without copying
+        """
+        return self._buckets.get(key, {}).keys()
+
+    def keys(self):
+        return self._buckets.keys()
+
+    def _on_key_added(self, key):
+        pass
+
+    def _on_keys_added(self, keys):
+        for key in keys:
+            self._on_key_added(key)
+
+    def _on_key_removed(self, key):
+        pass
+
+
+class SortedIndex(KeyIndex):
+    """
+    KeyIndex that also keeps its keys sorted, so range queries are a bisect plus a slice over the keys.
+    New keys are appended and the keys sorted before the next read, so loading nearly unique keys (zip codes,
+    names) costs one sort instead of an O(n) insort per key.
+    """
+    def __init__(self):
+        super().__init__()
+        self._keys = []
+        self._unsorted = False
+
+    def _on_key_added(self, key):
+        if self._keys and self._keys[-1] > key:
+            self._unsorted = True
+        self._keys.append(key)
+
+    def _on_keys_added(self, keys):
+        if keys:
+            self._keys += keys
+            self._unsorted = True
+
+    def _sort_keys(self):
+        if self._unsorted:
+            self._keys.sort()
+            self._unsorted = False
+
+    def _on_key_removed(self, key):
+        self._sort_keys()
+        del self._keys[bisect_left(self._keys, key)]
+
+    def keys(self):
+        self._sort_keys()
+        return list(self._keys)
+
+    def range_keys(self, low=None, high=None):
+        """
+        :param low: smallest key to include, None for no lower bound
+        :param high: largest key to include, None for no upper bound
+        :return: a list of the sorted keys in [low, high]
+        """
+        self._sort_keys()
+        start = 0 if low is None else bisect_left(self._keys, low)
+        end = len(self._keys) if high is None else bisect_right(self._keys, high)
+        return self._keys[start:end]
+
+    def range(self, low=None, high=None):
+        """
+        :return: a list of the persons whose key is in [low, high], ordered by key
+        """
+        return [person for key in self.range_keys(low, high) for person in self._buckets[key].values()]
+
+
+class SortedKeys:
+    """
+    Set of keys (identity numbers) read in sorted order, the stable order of cursor pagination.
+    New keys are appended and the list sorted before the next read, so a bulk load costs one sort instead of an
+    insort per key.
+    """
+    def __init__(self):
+        self._keys = []
+        self._unsorted = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        if self._keys and self._keys[-1] > key:
+            self._unsorted = True
+        self._keys.append(key)
+
+    def update(self, keys):
+        """
+        :param keys: list - new keys, added at once and sorted with the others before the next read
+        """
+        if keys:
+            self._keys += keys
+            self._unsorted = True
+
+    def discard(self, key):
+        self._sort()
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def iter_after(self, key=None, chunk_size=256):
+        """
+        Yields the keys greater than key in sorted order. Every chunk is a new bisect from the last key yielded,
+        so keys added or removed meanwhile never make the iteration skip or repeat a key.
+        :param key: the cursor, None to start from the smallest key
+        """
+        while True:
+            self._sort()
+            start = 0 if key is None else bisect_right(self._keys, key)
+            chunk = self._keys[start:start + chunk_size]
+            if not chunk:
+                return
+            yield from chunk
+            key = chunk[-1]
+
+    def _sort(self):
+        if self._unsorted:
+            self._keys.sort()
+            self._unsorted = False
+
+
+class Leaderboard:
+    """
+    Students ranking kept sorted by (points, full name) at all times, so top-K and rank queries don't sort the
+    population. Ties on both points and name keep the order in which the students were added, exactly like the
+    stable sort of the students dictionary did.
+    Each student is stored as a (points, name, -sequence, identity number) key in an ascending blocked list: sorted
+    blocks of up to 2 * BLOCK_SIZE keys plus the list of their last keys, so the best student is at the end.
+    Finding a key is two bisects, adding or removing one a bisect plus an O(BLOCK_SIZE) insert/delete in its block,
+    top(k) reads the last blocks only. The block lengths are kept in a Fenwick tree, so rank sums the lengths of the
+    preceding blocks in O(log(n / BLOCK_SIZE)); the tree is rebuilt on the next rank after a block is split or dropped.
+    """
+    BLOCK_SIZE = 512
+
+    def __init__(self):
+        self._blocks = []
+        self._maxes = []
+        self._tree = None
+        self._size = 0
+        self._entries = {}
+        self._students = {}
+        self._sequence = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, student):
+        self._sequence += 1
+        self._insert(student, self._sequence)
+
+    def add_many(self, students):
+        """
+        Adds a batch of students, e.g. a chunk of a bulk load. A batch that isn't small next to the ranking is
+        sorted once and merged with it into new blocks, instead of being inserted key by key.
+        :param students: list of students not ranked yet
+        """
+        keys = []
+        for student in students:
+            self._sequence += 1
+            key = (student.points, student.name, -self._sequence, student.identity_number)
+            self._entries[student.identity_number] = key
+            self._students[student.identity_number] = student
+            keys.append(key)
+        if len(keys) * 64 < self._size:
+            for key in keys:
+                self._insert_key(key)
+            return
+        keys += chain.from_iterable(self._blocks)
+        keys.sort()
+        self._blocks = [keys[i:i + self.BLOCK_SIZE] for i in range(0, len(keys), self.BLOCK_SIZE)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._size = len(keys)
+        self._tree = None
+
+    def remove(self, student):
+        key = self._entries.pop(student.identity_number, None)
+        if key is not None:
+            self._delete_key(key)
+            del self._students[student.identity_number]
+
+    def update(self, student):
+        """
+        Repositions a student after its points (or name) changed, keeping its original tie-break order
+        """
+        key = self._entries.get(student.identity_number)
+        if key is None:
+            return self.add(student)
+        self.remove(student)
+        self._insert(student, -key[2])
+
+    def top(self, k):
+        """
+        :param k: int - number of students
+        :return: a list of the k best ranked students, best first
+        """
+        students = []
+        for block in reversed(self._blocks):
+            for key in reversed(block):
+                if len(students) >= k:
+                    return students
+                students.append(self._students[key[3]])
+        return students
+
+    def rank(self, identity_number):
+        """
+        :param identity_number: str - student id number
+        :return: int - 1 based rank of the student, None if the student isn't ranked
+        """
+        key = self._entries.get(identity_number)
+        if key is None:
+            return None
+        i = bisect_left(self._maxes, key)
+        return self._size - self._preceding(i) - bisect_left(self._blocks[i], key)
+
+    def _preceding(self, i):
+        # number of keys in the blocks before block i
+        if self._tree is None:
+            self._build_tree()
+        tree, count = self._tree, 0
+        while i > 0:
+            count += tree[i]
+            i -= i & -i
+        return count
+
+    def _build_tree(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for i, block in enumerate(self._blocks, 1):
+            tree[i] += len(block)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _resize_block(self, i, delta):
+        tree = self._tree
+        if tree is not None:
+            i += 1
+            while i < len(tree):
+                tree[i] += delta
+                i += i & -i
+
+    def _insert(self, student, sequence):
+        key = (student.points, student.name, -sequence, student.identity_number)
+        self._entries[student.identity_number] = key
+        self._students[student.identity_number] = student
+        self._insert_key(key)
+
+    def _insert_key(self, key):
+        self._size += 1
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._tree = None
+            return
+        i = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[i]
+        insort(block, key)
+        self._maxes[i] = block[-1]
+        if len(block) > 2 * self.BLOCK_SIZE:
+            self._blocks[i:i + 1] = block[:self.BLOCK_SIZE], block[self.BLOCK_SIZE:]
+            self._maxes[i:i + 1] = block[self.BLOCK_SIZE - 1], block[-1]
+            self._tree = None
+        else:
+            self._resize_block(i, 1)
+
+    def _delete_key(self, key):
+        self._size -= 1
+        i = bisect_left(self._maxes, key)
+        block = self._blocks[i]
+        del block[bisect_left(block, key)]
+        if block:
+            self._maxes[i] = block[-1]
+            self._resize_block(i, -1)
+        else:
+            del self._blocks[i], self._maxes[i]
+            self._tree = None
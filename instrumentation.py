@@ -0,0 +1,128 @@
+import functools
+import json
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+
+# upper bounds (seconds) of the latency histogram buckets, an implicit +Inf bucket follows
+LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+
+class Metrics:
+    """
+    Per method call counts, latency histograms and processed rows of the instrumented University methods.
+    Disabled by default: an instrumented method then only pays for one attribute check.
+    When profile_dir is set (and metrics are enabled), the methods instrumented with profile=True (the loaders)
+    run under cProfile and dump their stats to '<profile_dir>/<method>-<call number>.prof'.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.profile_dir = None
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def enable(self, profile_dir=None):
+        self.enabled = True
+        self.profile_dir = profile_dir
+
+    def disable(self):
+        self.enabled = False
+        self.profile_dir = None
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+    def observe(self, method, seconds, rows=None):
+        """
+        Records one call of a method
+        :param method: str - method name
+        :param seconds: float - call duration
+        :param rows: int - number of rows (persons, courses, report lines...) the call processed, if known
+        :return: None
+        """
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = {'calls': 0, 'errors': 0, 'seconds': 0.0, 'rows': 0,
+                                                 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)}
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['buckets'][bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if rows:
+                stats['rows'] += rows
+
+    def count_error(self, method):
+        with self._lock:
+            if method in self._methods:
+                self._methods[method]['errors'] += 1
+
+    def snapshot(self):
+        """
+        :return: dict - method name to its calls, errors, total seconds, rows and latency bucket counts
+        """
+        with self._lock:
+            return {method: dict(stats, buckets=list(stats['buckets'])) for method, stats in self._methods.items()}
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump({'buckets': list(LATENCY_BUCKETS), 'methods': self.snapshot()}, f, indent=2)
+
+    def export_prometheus(self, path):
+        """
+        Writes the metrics in the Prometheus text exposition format
+        """
+        methods = self.snapshot()
+        lines = ['# TYPE myuniversity_calls_total counter']
+        lines += [f'myuniversity_calls_total{{method="{m}"}} {s["calls"]}' for m, s in methods.items()]
+        lines.append('# TYPE myuniversity_errors_total counter')
+        lines += [f'myuniversity_errors_total{{method="{m}"}} {s["errors"]}' for m, s in methods.items()]
+        lines.append('# TYPE myuniversity_rows_total counter')
+        lines += [f'myuniversity_rows_total{{method="{m}"}} {s["rows"]}' for m, s in methods.items()]
+        lines.append('# TYPE myuniversity_latency_seconds histogram')
+        for method, stats in methods.items():
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats['buckets']):
+                cumulative += count
+                lines.append(f'myuniversity_latency_seconds_bucket{{method="{method}",le="{bound}"}} {cumulative}')
+            lines.append(f'myuniversity_latency_seconds_sum{{method="{method}"}} {stats["seconds"]}')
+            lines.append(f'myuniversity_latency_seconds_count{{method="{method}"}} {stats["calls"]}')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+metrics = Metrics()
+
+
+def instrumented(rows=None, profile=False):
+    """
+    Decorator recording the calls of a University method into metrics
+    :param rows: callable - rows(result) returns the number of rows the call processed
+    :param profile: bool - run the method under cProfile when metrics.profile_dir is set
+    """
+    def decorator(method):
+        name = method.__name__
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return method(*args, **kwargs)
+            profiler = None
+            if profile and metrics.profile_dir:
+                import cProfile
+                profiler = cProfile.Profile()
+            start = perf_counter()
+            try:
+                result = profiler.runcall(method, *args, **kwargs) if profiler else method(*args, **kwargs)
+            except Exception:
+                metrics.observe(name, perf_counter() - start)
+                metrics.count_error(name)
+                raise
+            metrics.observe(name, perf_counter() - start, rows(result) if rows else None)
+            if profiler:
+                calls = metrics.snapshot()[name]['calls']
+                profiler.dump_stats(os.path.join(metrics.profile_dir, f'{name}-{calls}.prof'))
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+
+
+class Journal:
+    """
+    Append only write-ahead journal of University mutations, one json line per mutation:
+    {"seq": sequence number, "op": University method name, "args": [method arguments]}.
+    Every line is flushed to the OS as it is appended, so a process crash loses nothing. Lines are fsynced in
+    batches, every sync_every entries or sync_interval seconds after the first unsynced one (by a timer thread,
+    so an idle journal syncs its last batch too): an OS crash or power loss loses at most the unsynced batch.
+    A torn last line is ignored on replay.
+    """
+    def __init__(self, path, sync_every=100, sync_interval=1.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        # line buffered: every entry ends with a newline, so every write is flushed
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, sequence, op, args):
+        """
+        :param sequence: int - sequence number of the mutation
+        :param op: str - name of the University method that made the mutation
+        :param args: list - the method arguments
+        :return: None
+        """
+        with self._lock:
+            self._file.write(json.dumps({'seq': sequence, 'op': op, 'args': list(args)}) + '\n')
+            self._pending += 1
+            if self._pending >= self.sync_every:
+                self._sync()
+            elif self._timer is None and self.sync_interval is not None:
+                self._timer = threading.Timer(self.sync_interval, self._timed_sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        """
+        Flushes the journal and fsyncs it to disk
+        """
+        with self._lock:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def _timed_sync(self):
+        with self._lock:
+            self._timer = None
+            if self._pending and not self._file.closed:
+                self._sync()
+
+    def truncate(self):
+        """
+        Empties the journal, once its entries are covered by a snapshot
+        """
+        with self._lock:
+            self._file.close()
+            self._file = open(self.path, 'w', encoding='utf-8', buffering=1)
+            self._sync()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    @staticmethod
+    def entries(path):
+        """
+        Reads the entries of a journal file
+        :param path: str - journal file path
+        :return: generator of (sequence, op, args) tuples, in the order they were appended
+        """
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # torn write of the last entry before a crash
+                    return
+                yield entry['seq'], entry['op'], entry['args']
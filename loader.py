@@ -0,0 +1,335 @@
+import sys
+from csv import DictReader, reader
+from itertools import islice
+from operator import itemgetter
+from time import perf_counter
+from person import Address, Student, Teacher, date_to_ordinal, restore_address, restore_student, restore_teacher
+
+DEFAULT_CHUNK_SIZE = 10000
+
+STUDENT_FIELDS = ('identity_number', 'full_name', 'faculty', 'start_date', 'address')
+TEACHER_FIELDS = ('identity_number', 'full_name', 'faculty', 'start_date')
+
+
+class LoadReport:
+    """
+    Summary of a bulk load: how many rows were read and loaded, which rows were rejected and why, and how long it took.
+    Each reject is a dictionary with the data row number (1 based, header excluded), the identity number and the reason.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.rows = 0
+        self.loaded = 0
+        self.rejects = []
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def reject(self, row_number, identity_number, reason):
+        self.rejects.append({'row': row_number, 'identity_number': identity_number, 'reason': reason})
+
+    def __repr__(self):
+        return f'LoadReport(file: {self.file_path}, rows: {self.rows}, loaded: {self.loaded}, ' \
+               f'rejected: {len(self.rejects)}, rows/sec: {self.rows_per_second:.0f})'
+
+
+class ShardReport(LoadReport):
+    """
+    LoadReport of one shard of a parallel load. elapsed is the time the worker process spent reading the shard and
+    parsing its rows into person records, merge_elapsed the time spent building the persons from the records and
+    inserting them into the university.
+    """
+    def __init__(self, file_path, kind):
+        super().__init__(file_path)
+        self.kind = kind
+        self.merge_elapsed = 0.0
+        self.records = []
+        self.row_numbers = []
+
+    def __repr__(self):
+        return f'ShardReport({self.kind} file: {self.file_path}, rows: {self.rows}, loaded: {self.loaded}, ' \
+               f'rejected: {len(self.rejects)}, parse: {self.elapsed:.3f}s, merge: {self.merge_elapsed:.3f}s)'
+
+
+class ReloadReport(LoadReport):
+    """
+    LoadReport of an incremental reload: the ids inserted, updated and deleted, the number of unchanged rows, and the
+    conflicts - changes the file asks for that would break existing enrollments, which are left unapplied.
+    Each conflict is a dictionary with the identity number and the reason.
+    """
+    def __init__(self, file_path):
+        super().__init__(file_path)
+        self.inserted = []
+        self.updated = []
+        self.deleted = []
+        self.unchanged = 0
+        self.conflicts = []
+
+    def conflict(self, identity_number, reason):
+        self.conflicts.append({'identity_number': identity_number, 'reason': reason})
+
+    def __repr__(self):
+        return f'ReloadReport(file: {self.file_path}, rows: {self.rows}, inserted: {len(self.inserted)}, ' \
+               f'updated: {len(self.updated)}, deleted: {len(self.deleted)}, unchanged: {self.unchanged}, ' \
+               f'rejected: {len(self.rejects)}, conflicts: {len(self.conflicts)})'
+
+
+def read_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Streams a csv file as lists of at most chunk_size row dictionaries, so only one chunk is held in memory at a time.
+    :param file_path: str - path of the csv file
+    :param chunk_size: int - maximal number of rows per chunk
+    :return: generator of lists of row dictionaries
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk size must be a positive number, got {chunk_size}')
+    with open(file_path, 'r') as csvfile:
+        rows = DictReader(csvfile)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def student_from_values(values):
+    """
+    :param values: tuple - csv field values in the STUDENT_FIELDS order
+    :return: Student
+    """
+    identity_number, full_name, faculty, start_date, address = values
+    return Student(identity_number, full_name, faculty=faculty, start_date=start_date, address=address)
+
+
+def teacher_from_values(values):
+    """
+    :param values: tuple - csv field values in the TEACHER_FIELDS order
+    :return: Teacher
+    """
+    identity_number, full_name, faculty, start_date = values
+    return Teacher(identity_number, full_name, faculty=faculty, start_date=start_date)
+
+
+def student_record(values):
+    """
+    Parses a students csv row into a record of plain values, cheap to send from a worker process
+    :param values: tuple - csv field values in the STUDENT_FIELDS order
+    :return: tuple - (identity number, full name, faculty, start date, city, country, zip code, raw address)
+    """
+    identity_number, full_name, faculty, start_date, address = values
+    return (identity_number, full_name, faculty, start_date) + Address(address).parts()
+
+
+def teacher_record(values):
+    """
+    Parses a teachers csv row into a record of plain values, cheap to send from a worker process
+    :param values: tuple - csv field values in the TEACHER_FIELDS order
+    :return: tuple - (identity number, full name, faculty, start date, start date ordinal)
+    """
+    return values + (date_to_ordinal(values[3]),)
+
+
+def student_from_record(record):
+    """
+    :param record: tuple - a student_record
+    :return: Student - built without parsing its address again
+    """
+    return restore_student(record[0], record[1], record[2], record[3], restore_address(*record[4:]))
+
+
+def teacher_from_record(record):
+    """
+    :param record: tuple - a teacher_record
+    :return: Teacher - built without parsing its start date again
+    """
+    return restore_teacher(record[0], record[1], [record[2]], record[3], record[4])
+
+
+RECORDS = {'Student': (STUDENT_FIELDS, student_record, student_from_record),
+           'Teacher': (TEACHER_FIELDS, teacher_record, teacher_from_record)}
+
+
+def _fields_getter(header, fields):
+    # a column missing from the header gets an index no row has, so reading it fails like reading a short row
+    return itemgetter(*(header.index(field) if field in header else sys.maxsize for field in fields))
+
+
+def _build_persons(rows, row_number, header, fields, factory, known_ids, report, duplicate_reason,
+                   row_numbers=None):
+    """
+    Validates csv rows and builds the persons (or the person records) of the valid ones. Rows with a missing field,
+    and rows whose id is in known_ids or repeated in rows, are rejected into the report.
+    :param rows: list of csv rows (lists of values)
+    :param row_number: int - data row number of the first row
+    :param header: list - csv header
+    :param fields: tuple - csv columns that must have a value
+    :param factory: callable - builds a person object, or a person record, from the tuple of the fields values
+    :param known_ids: container - ids already loaded
+    :param report: LoadReport - collects the rejects
+    :param duplicate_reason: str - reject reason of a known or repeated id, formatted with the id
+    :param row_numbers: list - if given, the row number of every built person is appended to it
+    :return: list of the built persons or records, in the rows order
+    """
+    get_fields = _fields_getter(header, fields)
+    persons = []
+    ids = set()
+    for row_number, row in enumerate(rows, row_number):
+        try:
+            values = get_fields(row)
+        except IndexError:
+            values = ()
+        if not values or not all(values):
+            row = dict(zip(header, row))
+            missing = [field for field in fields if not row.get(field)]
+            report.reject(row_number, row.get('identity_number'), f'missing fields: {", ".join(missing)}')
+            continue
+        person_id = values[0]
+        if person_id in known_ids or person_id in ids:
+            report.reject(row_number, person_id, duplicate_reason.format(person_id))
+            continue
+        ids.add(person_id)
+        persons.append(factory(values))
+        if row_numbers is not None:
+            row_numbers.append(row_number)
+    return persons
+
+
+def bulk_load(file_path, persons_dict, fields, factory, add_persons, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Loads persons from a csv file into the university chunk by chunk.
+    Rows with missing fields, ids already in persons_dict and ids repeated in the file are rejected into the report
+    instead of being printed. Rows are read as plain lists, and every chunk is inserted with a single add_persons
+    call once its persons are built.
+    :param file_path: str - path of the csv file
+    :param persons_dict: dict - identity number to person dictionary of the persons already loaded
+    :param fields: tuple - csv columns that must have a value
+    :param factory: callable - builds a person object from the tuple of the fields values
+    :param add_persons: callable - inserts a list of person objects into the university
+    :param chunk_size: int - number of rows processed per batch
+    :return: LoadReport
+    """
+    if chunk_size < 1:
+        raise ValueError(f'chunk size must be a positive number, got {chunk_size}')
+    report = LoadReport(file_path)
+    start = perf_counter()
+    with open(file_path, 'r') as csvfile:
+        # like DictReader: blank lines are skipped and not counted as rows
+        rows = filter(None, reader(csvfile))
+        header = next(rows, [])
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            # earlier chunks are already in persons_dict, so a repeated id is caught across chunks too
+            persons = _build_persons(chunk, report.rows + 1, header, fields, factory, persons_dict, report,
+                                     'id {} already exists in the university')
+            add_persons(persons)
+            report.rows += len(chunk)
+            report.loaded += len(persons)
+    report.elapsed = perf_counter() - start
+    return report
+
+
+def parse_shard(task):
+    """
+    Reads one csv shard, validates its rows and parses them (addresses, dates) into person records. Runs in a worker
+    process: records are tuples of plain values, much cheaper to send back than person objects, and the parent only
+    has to check their ids against the other shards and build and insert the persons.
+    Ids repeated within the shard are rejected here, ids of the university or of other shards by the parent.
+    :param task: tuple - (kind, file path), kind being 'Student' or 'Teacher'
+    :return: ShardReport - with the person records and their row numbers
+    """
+    kind, file_path = task
+    fields, to_record, _ = RECORDS[kind]
+    report = ShardReport(file_path, kind)
+    start = perf_counter()
+    with open(file_path, 'r') as csvfile:
+        rows = filter(None, reader(csvfile))
+        header = next(rows, [])
+        rows = list(rows)
+    report.rows = len(rows)
+    report.records = _build_persons(rows, 1, header, fields, to_record, (), report,
+                                    kind + ' with id {} already exists in the university', report.row_numbers)
+    report.elapsed = perf_counter() - start
+    return report
+
+
+def parallel_load(tasks, persons_dicts, add_persons, processes=None):
+    """
+    Parses csv shards into person records in a process pool and merges them, in the given shard order, into the
+    university.
+    An id already in the university or in an earlier shard (of the same person type) is rejected, like
+    check_person_validity does for a single file.
+    :param tasks: list - (kind, file path) tuples, kind being 'Student' or 'Teacher'
+    :param persons_dicts: dict - kind to the identity number to person dictionary of the persons already loaded
+    :param add_persons: callable - inserts a list of person objects into the university
+    :param processes: int - number of worker processes, None for the number of cpus, 1 to parse in this process. A
+    single shard is always parsed in this process, a pool would only add the cost of sending its records back.
+    :return: list of ShardReport, one per shard
+    """
+    if processes == 1 or len(tasks) <= 1:
+        return [_merge_shard(parse_shard(task), persons_dicts, add_persons) for task in tasks]
+    # imported here: concurrent.futures.process (multiprocessing) costs tens of milliseconds to import, and only
+    # this function needs it
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return [_merge_shard(report, persons_dicts, add_persons) for report in executor.map(parse_shard, tasks)]
+
+
+def _merge_shard(report, persons_dicts, add_persons):
+    start = perf_counter()
+    persons_dict = persons_dicts[report.kind]
+    from_record = RECORDS[report.kind][2]
+    records = report.records
+    # the earlier shards are already in persons_dict
+    if any(record[0] in persons_dict for record in records):
+        records = []
+        for row_number, record in zip(report.row_numbers, report.records):
+            if record[0] in persons_dict:
+                report.reject(row_number, record[0],
+                              f'{report.kind} with id {record[0]} already exists in the university')
+            else:
+                records.append(record)
+        report.rejects.sort(key=lambda r: r['row'])
+    add_persons([from_record(record) for record in records])
+    report.loaded = len(records)
+    report.records, report.row_numbers = [], []
+    report.merge_elapsed = perf_counter() - start
+    return report
+
+
+def diff_rows(file_path, fields, row_hashes, matches_loaded):
+    """
+    Compares a csv file to its previously reloaded version, row by row.
+    A row is unchanged when the hash of its field values equals the hash recorded for its id by the previous reload.
+    Without recorded hashes (first reload) each row is compared to the loaded person by matches_loaded instead.
+    :param file_path: str - path of the csv file
+    :param fields: tuple - csv columns, all required
+    :param row_hashes: dict - identity number to field values hash of the previous reload, None on the first reload
+    :param matches_loaded: callable - matches_loaded(values) tells whether a row equals the loaded person
+    :return: tuple - (ReloadReport with rows, unchanged and rejects filled, list of (row number, values) pairs of the
+    new or changed rows, dict of identity number to field values hash of every valid row of the file)
+    """
+    report = ReloadReport(file_path)
+    changed = []
+    hashes = {}
+    with open(file_path, 'r') as csvfile:
+        for row_number, row in enumerate(DictReader(csvfile), 1):
+            report.rows = row_number
+            person_id = row.get('identity_number')
+            missing = [field for field in fields if not row.get(field)]
+            if missing:
+                report.reject(row_number, person_id, f'missing fields: {", ".join(missing)}')
+                continue
+            if person_id in hashes:
+                report.reject(row_number, person_id, f'id {person_id} is repeated in the file')
+                continue
+            values = tuple(row[field] for field in fields)
+            row_hash = hashes[person_id] = hash(values)
+            if (row_hashes.get(person_id) == row_hash) if row_hashes is not None else matches_loaded(values):
+                report.unchanged += 1
+            else:
+                changed.append((row_number, values))
+    return report, changed, hashes
@@ -1,7 +1,112 @@
-from university import *
+import argparse
+import os
+import sys
 
-myUniversity = University("Tel Aviv University")
-myUniversity.load_persons()
-myUniversity.load_courses()
+UNIVERSITY_NAME = "Tel Aviv University"
+STUDENTS_FILE = 'data/students_short.csv'
+TEACHERS_FILE = 'data/teachers_short.csv'
+COURSES_FILE = 'data/courses.json'
+SNAPSHOT_FILE = 'data/university.snap'
 
+# every subcommand imports only the modules it uses, so "query courses" never imports university/person and
+# the queries served from a snapshot never parse the csv files
 
+
+def open_university(args, students=True, teachers=True):
+    """
+    Returns the university from the cached snapshot when there is one, otherwise loads the courses and only the
+    person files the command needs
+    """
+    from university import University
+    university = University(UNIVERSITY_NAME)
+    if not args.no_snapshot and os.path.exists(args.snapshot):
+        university.load_snapshot(args.snapshot)
+        return university
+    university.load_courses(args.courses)
+    if students:
+        university.load_students_bulk(args.students)
+    if teachers:
+        university.load_teachers_bulk(args.teachers)
+    return university
+
+
+def load(args):
+    from university import University
+    university = University(UNIVERSITY_NAME)
+    university.load_courses(args.courses)
+    students = university.load_students_bulk(args.students)
+    teachers = university.load_teachers_bulk(args.teachers)
+    university.save_snapshot(args.snapshot)
+    print(students)
+    print(teachers)
+    print(f'{len(university.courses)} courses, snapshot saved to {args.snapshot}')
+
+
+def query_top(args):
+    university = open_university(args, teachers=False)
+    for rank, name in enumerate(university.get_top_students(args.k), 1):
+        print(f'{rank}. {name}')
+
+
+def query_teachers_from(args):
+    university = open_university(args, students=False)
+    for name, start_date in university.get_teachers_from(args.date):
+        print(f'{start_date} {name}')
+
+
+def query_courses(args):
+    from catalog import iter_courses
+    for course in iter_courses(args.courses):
+        if args.faculty is None or course.faculty == args.faculty:
+            print(f'{course.course_id} {course.name} ({course.faculty}, {course.points} points)')
+
+
+def enroll(args):
+    university = open_university(args)
+    university.add_course(args.person_id, args.course_id)
+    if not args.no_snapshot:
+        university.save_snapshot(args.snapshot)
+    print(f'{args.person_id} enrolled to course {args.course_id}')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=f'{UNIVERSITY_NAME} command line')
+    parser.add_argument('--students', default=STUDENTS_FILE, help='students csv file')
+    parser.add_argument('--teachers', default=TEACHERS_FILE, help='teachers csv file')
+    parser.add_argument('--courses', default=COURSES_FILE, help='courses json file')
+    parser.add_argument('--snapshot', default=SNAPSHOT_FILE, help='cached university snapshot')
+    parser.add_argument('--no-snapshot', action='store_true', help='load the source files even if a snapshot exists')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('load', help='load the source files and cache them in the snapshot').set_defaults(handler=load)
+
+    query = commands.add_parser('query', help='read only queries').add_subparsers(dest='query', required=True)
+    top = query.add_parser('top', help='students with the most course points')
+    top.add_argument('-k', type=int, default=10, help='number of students')
+    top.set_defaults(handler=query_top)
+    teachers_from = query.add_parser('teachers-from', help='teachers started from a date')
+    teachers_from.add_argument('date', help='start date in dd/mm/yyyy format')
+    teachers_from.set_defaults(handler=query_teachers_from)
+    courses = query.add_parser('courses', help='course catalog')
+    courses.add_argument('--faculty', help='only the courses of this faculty')
+    courses.set_defaults(handler=query_courses)
+
+    enroll_parser = commands.add_parser('enroll', help='add a course to a student or teacher')
+    enroll_parser.add_argument('person_id')
+    enroll_parser.add_argument('course_id', type=int)
+    enroll_parser.set_defaults(handler=enroll)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        args.handler(args)
+    except (ValueError, NameError, PermissionError, TypeError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
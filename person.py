@@ -1,5 +1,107 @@
 from enum import Enum
+from array import array
+from sys import intern
+from collections.abc import Mapping
+from datetime import datetime
+
+DATE_FORMAT = '%d/%m/%Y'
+
+
+def date_to_ordinal(date_str):
+    """
+    Parses a dd/mm/yyyy date string into its proleptic Gregorian ordinal (see datetime.toordinal)
+    :param date_str: str - date string
+    :return: int - the date ordinal, None if the date string isn't in dd/mm/yyyy format
+    """
+    try:
+        return datetime.strptime(date_str, DATE_FORMAT).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class Address:
+    """
+    Student address parsed once from its "city, country, zip-code" string.
+    City and country names are interned, so the many students of a city share a single string.
+    An address that isn't in that format (None included) keeps its raw value and has no city, country and zip code.
+    """
+    __slots__ = ('city', 'country', 'zip_code', '_raw')
+
+    def __init__(self, address):
+        parts = [part.strip() for part in address.split(',')] if isinstance(address, str) else ()
+        if len(parts) == 3 and all(parts):
+            self.city, self.country, self.zip_code = intern(parts[0]), intern(parts[1]), parts[2]
+            self._raw = None if address == f'{parts[0]}, {parts[1]}, {parts[2]}' else address
+        else:
+            self.city = self.country = self.zip_code = None
+            self._raw = address
+
+    @property
+    def is_valid(self):
+        return self.city is not None
+
+    @property
+    def value(self):
+        """
+        :return: the address as it was given, None if it was None
+        """
+        return str(self) if self.is_valid else self._raw
+
+    def __str__(self):
+        return self._raw if self._raw is not None else f'{self.city}, {self.country}, {self.zip_code}'
+
+    def parts(self):
+        """
+        :return: tuple - (city, country, zip code, raw), the arguments restore_address rebuilds the address from
+        """
+        return self.city, self.country, self.zip_code, self._raw
+
+    def __repr__(self):
+        return f'Address(city: {self.city}, country: {self.country}, zip code: {self.zip_code})'
+
+
+class CourseRefs(Mapping):
+    """
+    Compact replacement for a person's courses dictionary.
+    Only the (integer) course ids are stored, in an array; the course dictionaries are looked up in the shared
+    university courses table. Behaves like the {str(course id): course dict} dictionary it replaces.
+    """
+    __slots__ = ('_catalog', '_ids')
+
+    def __init__(self, catalog, ids=()):
+        self._catalog = catalog
+        self._ids = array('l', ids)
+
+    def __getitem__(self, course_id):
+        if int(course_id) not in self._ids:
+            raise KeyError(course_id)
+        return self._catalog[str(course_id)]
+
+    def __setitem__(self, course_id, course):
+        if int(course_id) not in self._ids:
+            self._ids.append(int(course_id))
+
+    def __iter__(self):
+        return (str(course_id) for course_id in self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, course_id):
+        try:
+            return int(course_id) in self._ids
+        except (TypeError, ValueError):
+            return False
+
+    def pop(self, course_id):
+        course = self[course_id]
+        self._ids.remove(int(course_id))
+        return course
+
+
 class Person:
+    __slots__ = ('name', 'identity_number', 'courses')
+
     def __init__(self, identity_number, full_name):
         self.name = full_name
         self.identity_number = identity_number
@@ -17,13 +119,23 @@ class Person:
 
 
 class Student(Person):
+    __slots__ = ('faculty', 'start_date', 'parsed_address', '_points')
+
     def __init__(self, *args, faculty, start_date, address):
         self.faculty = faculty
         self.start_date = start_date
-        self.address = address
+        self.parsed_address = Address(address)
         self._points = 0
         super().__init__(*args)
 
+    @property
+    def address(self):
+        return self.parsed_address.value
+
+    @address.setter
+    def address(self, address):
+        self.parsed_address = Address(address)
+
     @property
     def points(self):
         return self._points
@@ -39,6 +151,10 @@ class Student(Person):
         super().add_course(course)
         self._points += course['points']
 
+    def remove_course(self, course):
+        super().remove_course(course)
+        self._points -= course['points']
+
     def __repr__(self):
         courses_id = list(map(lambda c: c['id'], self.courses))
         return f'Student(ID: {self.identity_number}, full name: {self.name}, courses: {courses_id}, faculty: {self.faculty}, ' \
@@ -46,10 +162,13 @@ class Student(Person):
 
 
 class Teacher(Person):
+    __slots__ = ('faculties', 'start_date', 'start_ordinal')
+
     def __init__(self, *args, faculty, start_date):
         super().__init__(*args)
         self.faculties = [faculty]
         self.start_date = start_date
+        self.start_ordinal = date_to_ordinal(start_date)
 
     def add_course(self, course):
         super().add_course(course)
@@ -66,6 +185,46 @@ class Teacher(Person):
         return f'Teacher(ID: {self.identity_number}, full name: {self.name}, faculties: {self.faculties}, start date: {self.start_date})'
 
 
-
-
-
+def restore_address(city, country, zip_code, raw=None):
+    """
+    Rebuilds an already parsed address (e.g. parsed by a loader worker process) without parsing it again
+    :param raw: the address as given when it isn't exactly "city, country, zip-code", else None
+    :return: Address
+    """
+    address = Address.__new__(Address)
+    address.city = None if city is None else intern(city)
+    address.country = None if country is None else intern(country)
+    address.zip_code = zip_code
+    address._raw = raw
+    return address
+
+
+def restore_student(identity_number, full_name, faculty, start_date, parsed_address, courses=None, points=0):
+    """
+    Rebuilds a student from its already parsed fields, without parsing its address again
+    :return: Student
+    """
+    student = Student.__new__(Student)
+    student.identity_number = identity_number
+    student.name = full_name
+    student.courses = {} if courses is None else courses
+    student.faculty = faculty
+    student.start_date = start_date
+    student.parsed_address = parsed_address
+    student._points = points
+    return student
+
+
+def restore_teacher(identity_number, full_name, faculties, start_date, start_ordinal, courses=None):
+    """
+    Rebuilds a teacher from its already parsed fields, without parsing its start date again
+    :return: Teacher
+    """
+    teacher = Teacher.__new__(Teacher)
+    teacher.identity_number = identity_number
+    teacher.name = full_name
+    teacher.courses = {} if courses is None else courses
+    teacher.faculties = faculties
+    teacher.start_date = start_date
+    teacher.start_ordinal = start_ordinal
+    return teacher
@@ -0,0 +1,155 @@
+import heapq
+from indexes import SortedIndex
+
+MODES = ('prefix', 'substring', 'fuzzy')
+
+
+def normalize(text):
+    return ' '.join(str(text).lower().split())
+
+
+def name_keys(name):
+    """
+    :return: set - the normalized full name and each of its words, the keys a person is indexed under
+    """
+    full_name = normalize(name)
+    return {full_name, *full_name.split(' ')} - {''}
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """
+    Levenshtein distance between a and b, computed one row at a time and given up as soon as it exceeds limit
+    :return: int - the distance, or limit + 1 if it is larger than limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class NameIndex(SortedIndex):
+    """
+    Name search index over persons.
+    Every person is indexed under its normalized full name and each word of it. The keys are kept sorted, so a
+    prefix query is a bisect over them, and a trigram to keys inverted index narrows substring and typo tolerant
+    queries down to the few keys sharing the query trigrams. Only distinct keys are searched, never the persons.
+    """
+    def __init__(self):
+        super().__init__()
+        self._trigrams = {}
+        self._words = set()
+
+    def add_person(self, person):
+        for key in name_keys(person.name):
+            self.add(key, person)
+
+    def remove_person(self, person):
+        for key in name_keys(person.name):
+            self.remove(key, person)
+
+    def _on_key_added(self, key):
+        super()._on_key_added(key)
+        self._index_key(key)
+
+    def _on_keys_added(self, keys):
+        super()._on_keys_added(keys)
+        for key in keys:
+            self._index_key(key)
+
+    def _index_key(self, key):
+        for trigram in trigrams(key):
+            self._trigrams.setdefault(trigram, set()).add(key)
+        if ' ' not in key:
+            self._words.add(key)
+
+    def _on_key_removed(self, key):
+        super()._on_key_removed(key)
+        self._words.discard(key)
+        for trigram in trigrams(key):
+            keys = self._trigrams[trigram]
+            keys.discard(key)
+            if not keys:
+                del self._trigrams[trigram]
+
+    def search(self, query, mode='prefix', offset=0, limit=10, max_distance=None):
+        """
+        :param query: str - name or part of a name, case insensitive
+        :param mode: str - 'prefix' (a word or the full name starts with the query), 'substring' (the full name
+        contains the query) or 'fuzzy' (a word or the full name is within max_distance edits of the query)
+        :param offset: int - number of ranked results to skip
+        :param limit: int - maximal number of results
+        :param max_distance: int - fuzzy mode edits allowed, by default 1 for queries up to 4 characters, else 2
+        :return: a list of persons, best matches first: exact and full name matches before word matches (prefix
+        and substring) or fewer edits (fuzzy), then by name
+        """
+        if mode not in MODES:
+            raise ValueError(f'Invalid search mode {mode}. Mode should be one of {", ".join(MODES)}')
+        query = normalize(query)
+        if not query:
+            return []
+        if mode == 'prefix':
+            ranked = self._prefix_matches(query)
+        elif mode == 'substring':
+            ranked = self._substring_matches(query)
+        else:
+            if max_distance is None:
+                max_distance = 1 if len(query) <= 4 else 2
+            ranked = self._fuzzy_matches(query, max_distance)
+        best = {}
+        for rank, key in ranked:
+            for person_id, person in self._buckets[key].items():
+                if person_id not in best or rank < best[person_id][0]:
+                    best[person_id] = (rank, person)
+        top = heapq.nsmallest(offset + limit, ((rank, person.name, person_id, person)
+                                               for person_id, (rank, person) in best.items()))
+        return [match[3] for match in top[offset:]]
+
+    def _prefix_matches(self, query):
+        for key in self.range_keys(query, query + '\U0010ffff'):
+            yield (0 if key == query else 1 if ' ' in key else 2), key
+
+    def _substring_matches(self, query):
+        query_trigrams = trigrams(query)
+        if query_trigrams:
+            postings = sorted((self._trigrams.get(trigram, set()) for trigram in query_trigrams), key=len)
+            keys = set(postings[0]).intersection(*postings[1:])
+        else:
+            # shorter than a trigram: scan the distinct words (far fewer than the full names)
+            keys = self._words if ' ' not in query else self._keys
+        for key in keys:
+            position = key.find(query)
+            if position >= 0:
+                yield (0 if position == 0 else 1 if key[position - 1] == ' ' else 2), key
+
+    def _fuzzy_matches(self, query, max_distance):
+        query_trigrams = trigrams(query)
+        # every edit destroys at most 3 of the query trigrams
+        needed = len(query_trigrams) - 3 * max_distance
+        if needed > 0:
+            hits = {}
+            for trigram in query_trigrams:
+                for key in self._trigrams.get(trigram, ()):
+                    hits[key] = hits.get(key, 0) + 1
+            candidates = [key for key, count in hits.items() if count >= needed]
+        else:
+            # too short for the trigrams to narrow it down: max_distance edits leave at least one of
+            # max_distance + 1 pieces of the query intact, so only the words containing a piece can match
+            size = len(query) // (max_distance + 1)
+            pieces = [query[i * size:(i + 1) * size] for i in range(max_distance + 1)] if size else ()
+            candidates = [word for word in self._words if any(piece in word for piece in pieces)] \
+                if pieces else self._words
+        for key in candidates:
+            distance = edit_distance(query, key, max_distance)
+            if distance <= max_distance:
+                yield distance, key
@@ -0,0 +1,98 @@
+import heapq
+
+
+class CourseFullError(PermissionError):
+    pass
+
+
+class SeatAllocator:
+    """
+    Seat counts and waitlists of the courses.
+    Every course keeps a counter of its enrolled students, so checking for a free seat is O(1). Waitlists are heaps
+    ordered by priority (higher first) and then by request order, so equal priorities are served FIFO. Next to every
+    heap, a person id to current entry map: removed and re-prioritised entries stay in the heap until they surface.
+    Courses without a capacity have unlimited seats.
+    """
+    def __init__(self):
+        self._capacities = {}
+        self._taken = {}
+        self._waitlists = {}
+        self._entries = {}
+        self._sequence = 0
+
+    def set_capacity(self, course_key, capacity):
+        if capacity is None:
+            self._capacities.pop(course_key, None)
+        else:
+            self._capacities[course_key] = capacity
+
+    def capacity(self, course_key):
+        return self._capacities.get(course_key)
+
+    def taken(self, course_key):
+        return self._taken.get(course_key, 0)
+
+    def free_seats(self, course_key, pending=0):
+        """
+        :param course_key: str - course id
+        :param pending: int - seats already promised in the current batch
+        :return: int - number of free seats, None for a course without capacity
+        """
+        capacity = self._capacities.get(course_key)
+        if capacity is None:
+            return None
+        return max(capacity - self._taken.get(course_key, 0) - pending, 0)
+
+    def take(self, course_key, count=1):
+        self._taken[course_key] = self._taken.get(course_key, 0) + count
+
+    def release(self, course_key):
+        self._taken[course_key] -= 1
+
+    def enqueue(self, course_key, person_id, priority=0):
+        """
+        Adds a person to the course waitlist, or updates its priority if it is already waiting. O(log n): the old
+        heap entry of a re-prioritised person is left in the heap and skipped once it surfaces.
+        """
+        self._sequence += 1
+        entry = (-priority, self._sequence, person_id)
+        self._entries.setdefault(course_key, {})[person_id] = entry
+        waitlist = self._waitlists.setdefault(course_key, [])
+        heapq.heappush(waitlist, entry)
+        if len(waitlist) > 2 * len(self._entries[course_key]) + 64:
+            # mostly stale entries: rebuild the heap from the current ones
+            waitlist[:] = self._entries[course_key].values()
+            heapq.heapify(waitlist)
+
+    def dequeue(self, person_id, course_key=None):
+        """
+        Removes a person from the waitlist of a course, or from every waitlist when course_key is None. Its heap
+        entries are left in the heaps and skipped once they surface.
+        """
+        course_keys = self._entries if course_key is None else (course_key,)
+        for key in course_keys:
+            entries = self._entries.get(key)
+            if entries:
+                entries.pop(person_id, None)
+
+    def pop_next(self, course_key):
+        """
+        :return: str - id of the next person of the course waitlist, None if nobody is waiting
+        """
+        waitlist = self._waitlists.get(course_key)
+        entries = self._entries.get(course_key)
+        while waitlist:
+            entry = heapq.heappop(waitlist)
+            if entries.get(entry[2]) is entry:
+                del entries[entry[2]]
+                return entry[2]
+        return None
+
+    def waiting(self, course_key):
+        return len(self._entries.get(course_key, ()))
+
+    def waitlist(self, course_key):
+        """
+        :return: a list of the ids of the persons waiting for the course, next to be served first
+        """
+        return [entry[2] for entry in sorted(self._entries.get(course_key, {}).values())]
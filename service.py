@@ -0,0 +1,211 @@
+import argparse
+import asyncio
+import random
+from itertools import groupby
+from time import perf_counter
+
+READ_METHODS = ('get_courses', 'get_person_by_id', 'get_top_10_students', 'list_courses')
+WRITE_METHODS = ('add_course', 'remove_course', 'add_student')
+
+
+class UniversityService:
+    """
+    Asyncio front-end of a University.
+    Reads run directly on the event loop, they never wait for each other. Writes are queued and applied by a single
+    writer task in batches of up to max_batch, so the University is only mutated from one place and a batch is
+    applied without the event loop switching to readers in the middle of it. Consecutive add_course writes of a batch
+    are applied with a single add_courses_bulk call, which checks them in the order they were queued.
+    Use as 'async with UniversityService(university) as service:' or call start() and stop().
+    """
+    def __init__(self, university, max_batch=256):
+        self.university = university
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue = None
+        self._writer = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        """
+        Applies the writes already queued and stops the writer task
+        """
+        await self._queue.join()
+        self._writer.cancel()
+        try:
+            await self._writer
+        except asyncio.CancelledError:
+            pass
+
+    ''' reads '''
+
+    async def get_courses(self, identity_number):
+        return self.university.get_courses(identity_number)
+
+    async def get_person_by_id(self, person_id):
+        return self.university.get_person_by_id(person_id)
+
+    async def get_top_10_students(self):
+        return self.university.get_top_10_students()
+
+    async def list_courses(self):
+        return self.university.list_courses()
+
+    ''' writes '''
+
+    async def add_course(self, person_id, course_id):
+        return await self._write('add_course', person_id, course_id)
+
+    async def remove_course(self, person_id, course_id):
+        return await self._write('remove_course', person_id, course_id)
+
+    async def add_student(self, identity_number, full_name, faculty, start_date, address):
+        return await self._write('add_student', identity_number, full_name, faculty, start_date, address)
+
+    async def _write(self, method, *args):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((method, args, future))
+        return await future
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for enrollments, writes in groupby(batch, key=lambda write: write[0] == 'add_course'):
+                if enrollments:
+                    self._apply_enrollments(list(writes))
+                else:
+                    for method, args, future in writes:
+                        try:
+                            result = getattr(self.university, method)(*args)
+                        except Exception as e:
+                            self._settle(future, error=e)
+                        else:
+                            self._settle(future, result)
+            self.batches += 1
+            self.writes += len(batch)
+
+    def _apply_enrollments(self, writes):
+        try:
+            results = self.university.add_courses_bulk([args for _, args, _ in writes], all_or_nothing=False)
+        except Exception as e:
+            for _, _, future in writes:
+                self._settle(future, error=e)
+            return
+        for (_, _, future), result in zip(writes, results):
+            if result.accepted:
+                self._settle(future)
+            else:
+                self._settle(future, error=(result.error_type or ValueError)(result.reason))
+
+    def _settle(self, future, result=None, error=None):
+        if not future.cancelled():
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        self._queue.task_done()
+
+
+def percentile(sorted_values, percent):
+    """
+    :param sorted_values: list - values sorted from low to high
+    :param percent: float - percentile between 0 and 100
+    :return: the nearest-rank percentile of the values, None for no values
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[round(percent / 100 * (len(sorted_values) - 1))]
+
+
+def generate_operations(university, count, write_ratio=0.1, seed=0):
+    """
+    Generates a random mix of service requests on the university students and courses
+    :param university: University - with loaded courses and students
+    :param count: int - number of requests
+    :param write_ratio: float - share of add_course/remove_course requests
+    :param seed: int - random seed
+    :return: list of (method name, args tuple)
+    """
+    rng = random.Random(seed)
+    students = list(university.students.keys())
+    courses = [course['id'] for course in university.list_courses()]
+    operations = []
+    for _ in range(count):
+        if rng.random() < write_ratio:
+            operations.append((rng.choice(('add_course', 'remove_course')), (rng.choice(students), rng.choice(courses))))
+        else:
+            method = rng.choice(READ_METHODS)
+            if method in ('get_courses', 'get_person_by_id'):
+                operations.append((method, (rng.choice(students),)))
+            else:
+                operations.append((method, ()))
+    return operations
+
+
+async def run_load(service, operations, concurrency=100):
+    """
+    In-process load generator: concurrency client tasks send the operations to the service as fast as they can.
+    Rejected requests (e.g. an add_course breaking the enrollment rules) count as errors, not failures of the run.
+    :param service: UniversityService - started service
+    :param operations: list of (method name, args tuple)
+    :param concurrency: int - number of concurrent clients
+    :return: dict - requests, errors, elapsed seconds, throughput (requests/sec), p50 and p99 latency in seconds
+    """
+    latencies = []
+    errors = 0
+    pending = iter(operations)
+
+    async def client():
+        nonlocal errors
+        for method, args in pending:
+            start = perf_counter()
+            try:
+                await getattr(service, method)(*args)
+            except Exception:
+                errors += 1
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = perf_counter() - start
+    latencies.sort()
+    return {'requests': len(latencies), 'errors': errors, 'elapsed': elapsed,
+            'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+            'p50': percentile(latencies, 50), 'p99': percentile(latencies, 99)}
+
+
+def main():
+    from university import University, students_file_path, teachers_file_path, courses_file_path
+    parser = argparse.ArgumentParser(description='In-process load test of the University service')
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    university = University('load test')
+    university.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+    operations = generate_operations(university, args.requests, args.write_ratio, args.seed)
+
+    async def load():
+        async with UniversityService(university) as service:
+            return await run_load(service, operations, args.concurrency)
+
+    stats = asyncio.run(load())
+    print(f"{stats['requests']} requests ({stats['errors']} rejected) in {stats['elapsed']:.2f}s: "
+          f"{stats['throughput']:.0f} req/s, p50 {stats['p50'] * 1000:.3f} ms, p99 {stats['p99'] * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+Snapshot file layout (all integers little endian):
+    header      magic 'MYUNISNP', u16 version, u32 persons count, u64 journal sequence number of the last mutation
+                included and the u64 offsets of the four sections below
+    courses     university name, u32 courses count, courses (i64 id, name, faculty, f64 points, u16 time slots
+                count, u32 start and u32 end minute of the week of every slot), u32 faculties count, faculty names
+    students    u32 students count and one column per field: identity number, full name, start date, faculty,
+                address city, country, zip code and raw address (strings), courses (list of i64 ids)
+    teachers    u32 teachers count and the columns identity number, full name, start date (strings), start date
+                ordinal (i64, 0 when the date isn't valid), faculties (list of strings), courses (list of i64 ids)
+    index       u32 position of every person (students first, then teachers), sorted by identity number
+Strings of the courses section are stored as a u32 byte length followed by utf-8 bytes.
+Columns are stored field by field, so a whole column is decoded in bulk:
+    string      u8 has missing values flag, u8 missing (None) flag per row if the flag is set, u32 end offset of
+                every row (count + 1 offsets, the first is 0) and all the rows utf-8 bytes
+    i64         count i64 values
+    list        u32 end offset of every row in the items column (count + 1 offsets), then the items column
+Addresses are stored parsed (see person.Address.parts), so restoring a student doesn't parse it again.
+The index lets SnapshotReader find a single person with a binary search over the memory mapped file, so only the
+pages of the records actually read are faulted in.
+"""
+
+import mmap
+import struct
+import sys
+from array import array
+from itertools import accumulate, islice
+from person import restore_address
+from timetable import format_slot
+
+MAGIC = b'MYUNISNP'
+VERSION = 4
+
+# magic, version, number of persons, journal sequence, courses, students, teachers and index sections offsets
+_HEADER = struct.Struct('<8sHxxIQQQQQ')
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+
+STUDENT, TEACHER = 0, 1
+
+STUDENT_COLUMNS = ('identity_number', 'full_name', 'start_date', 'faculty', 'city', 'country', 'zip_code',
+                   'raw_address', 'courses')
+TEACHER_COLUMNS = ('identity_number', 'full_name', 'start_date', 'start_ordinal', 'faculties', 'courses')
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _pack_str(value):
+    data = str(value).encode('utf-8')
+    return _U32.pack(len(data)) + data
+
+
+def _pack_array(typecode, values):
+    values = array(typecode, values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _pack_str_column(values):
+    data = [b'' if value is None else str(value).encode('utf-8') for value in values]
+    missing = bytes(value is None for value in values)
+    parts = [_U8.pack(any(missing))]
+    if any(missing):
+        parts.append(missing)
+    parts += [_pack_array('I', accumulate(map(len, data), initial=0)), b''.join(data)]
+    return b''.join(parts)
+
+
+def _pack_list_column(lists, pack_items):
+    return _pack_array('I', accumulate(map(len, lists), initial=0)) + pack_items([item for items in lists
+                                                                                  for item in items])
+
+
+def _pack_ids(lists):
+    return _pack_list_column(lists, lambda ids: _pack_array('q', map(int, ids)))
+
+
+def _pack_students(students):
+    addresses = [student.parsed_address.parts() for student in students]
+    columns = [_U32.pack(len(students))]
+    columns += [_pack_str_column([student.identity_number for student in students]),
+                _pack_str_column([student.name for student in students]),
+                _pack_str_column([student.start_date for student in students]),
+                _pack_str_column([student.faculty for student in students])]
+    columns += [_pack_str_column([address[i] for address in addresses]) for i in range(4)]
+    columns.append(_pack_ids([list(student.courses.keys()) for student in students]))
+    return b''.join(columns)
+
+
+def _pack_teachers(teachers):
+    return b''.join([_U32.pack(len(teachers)),
+                     _pack_str_column([teacher.identity_number for teacher in teachers]),
+                     _pack_str_column([teacher.name for teacher in teachers]),
+                     _pack_str_column([teacher.start_date for teacher in teachers]),
+                     _pack_array('q', (teacher.start_ordinal or 0 for teacher in teachers)),
+                     _pack_list_column([teacher.faculties for teacher in teachers], _pack_str_column),
+                     _pack_ids([list(teacher.courses.keys()) for teacher in teachers])])
+
+
+def write_snapshot(university, path, sequence=0):
+    """
+    Writes the university courses, faculties, persons and enrollments to a binary snapshot file
+    :param university: University
+    :param path: str - snapshot file path
+    :param sequence: int - journal sequence number of the last mutation included in the snapshot
+    :return: None
+    """
+    courses = [university.courses.record(course_id) for course_id in university.courses]
+    students, teachers = list(university.students.values()), list(university.teachers.values())
+    ids = [student.identity_number for student in students] + [teacher.identity_number for teacher in teachers]
+    with open(path, 'wb') as f:
+        f.write(b'\0' * _HEADER.size)
+        courses_offset = f.tell()
+        f.write(_pack_str(university.name) + _U32.pack(len(courses)))
+        for course in courses:
+            f.write(_I64.pack(int(course.course_id)) + _pack_str(course.name) + _pack_str(course.faculty) +
+                    _F64.pack(course.points) + _U16.pack(len(course.slots)) +
+                    b''.join(_U32.pack(start) + _U32.pack(end) for start, end in course.slots))
+        f.write(_U32.pack(len(university.faculties)))
+        f.write(b''.join(_pack_str(faculty) for faculty in university.faculties))
+        students_offset = f.tell()
+        f.write(_pack_students(students))
+        teachers_offset = f.tell()
+        f.write(_pack_teachers(teachers))
+        index_offset = f.tell()
+        f.write(_pack_array('I', sorted(range(len(ids)), key=ids.__getitem__)))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, VERSION, len(ids), sequence, courses_offset, students_offset, teachers_offset,
+                             index_offset))
+
+
+class _Column:
+    """
+    A column of a persons table, read from the memory mapped snapshot: get decodes one row, read decodes them all
+    """
+    def __init__(self, data, offset, count):
+        self._data = data
+        self._count = count
+
+    def _array(self, typecode, offset, count):
+        values = array(typecode)
+        values.frombytes(self._data[offset:offset + count * values.itemsize])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+
+class _StrColumn(_Column):
+    def __init__(self, data, offset, count):
+        super().__init__(data, offset, count)
+        self._missing = None
+        if _U8.unpack_from(data, offset)[0]:
+            self._missing = offset + _U8.size
+            offset += count
+        self._offsets = offset + _U8.size
+        self._blob = self._offsets + (count + 1) * _U32.size
+        self.end = self._blob + _U32.unpack_from(data, self._blob - _U32.size)[0]
+
+    def get(self, row):
+        if self._missing is not None and self._data[self._missing + row]:
+            return None
+        start, end = struct.unpack_from('<II', self._data, self._offsets + row * _U32.size)
+        return self._data[self._blob + start:self._blob + end].decode('utf-8')
+
+    def read(self):
+        offsets = self._array('I', self._offsets, self._count + 1)
+        blob = self._data[self._blob:self.end]
+        text = blob.decode('utf-8')
+        if len(text) == len(blob):
+            # ascii only: the byte offsets are character offsets too, slice the decoded text
+            values = [text[start:end] for start, end in zip(offsets, islice(offsets, 1, None))]
+        else:
+            values = [blob[start:end].decode('utf-8') for start, end in zip(offsets, islice(offsets, 1, None))]
+        if self._missing is not None:
+            for row, missing in enumerate(self._data[self._missing:self._missing + self._count]):
+                if missing:
+                    values[row] = None
+        return values
+
+
+class _I64Column(_Column):
+    def __init__(self, data, offset, count):
+        super().__init__(data, offset, count)
+        self._offset = offset
+        self.end = offset + count * _I64.size
+
+    def get(self, row):
+        return _I64.unpack_from(self._data, self._offset + row * _I64.size)[0]
+
+    def read(self):
+        return self._array('q', self._offset, self._count)
+
+
+class _ListColumn(_Column):
+    def __init__(self, data, offset, count, items_column):
+        super().__init__(data, offset, count)
+        self._offsets = offset
+        items = _U32.unpack_from(data, offset + count * _U32.size)[0]
+        self._items = items_column(data, offset + (count + 1) * _U32.size, items)
+        self.end = self._items.end
+
+    def get(self, row):
+        start, end = struct.unpack_from('<II', self._data, self._offsets + row * _U32.size)
+        return [self._items.get(item) for item in range(start, end)]
+
+    def read(self):
+        offsets = self._array('I', self._offsets, self._count + 1)
+        items = self._items.read()
+        return [items[start:end].tolist() if isinstance(items, array) else items[start:end]
+                for start, end in zip(offsets, islice(offsets, 1, None))]
+
+
+def _read_table(data, offset, columns):
+    count = _U32.unpack_from(data, offset)[0]
+    offset += _U32.size
+    table = {}
+    for name in columns:
+        if name == 'start_ordinal':
+            column = _I64Column(data, offset, count)
+        elif name == 'courses':
+            column = _ListColumn(data, offset, count, _I64Column)
+        elif name == 'faculties':
+            column = _ListColumn(data, offset, count, _StrColumn)
+        else:
+            column = _StrColumn(data, offset, count)
+        table[name] = column
+        offset = column.end
+    return count, table
+
+
+class SnapshotReader:
+    """
+    Read only, memory mapped access to a snapshot file.
+    read_students and read_teachers decode whole columns at once, for restoring the university; find decodes a
+    single person on demand, touching only a handful of pages.
+    """
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise SnapshotError(f'{path} is not a university snapshot')
+        if len(self._data) < _HEADER.size:
+            self.close()
+            raise SnapshotError(f'{path} is not a university snapshot')
+        magic, version, self._count, self.sequence, self._courses_offset, students_offset, teachers_offset, \
+            self._index_offset = _HEADER.unpack_from(self._data)
+        if magic != MAGIC:
+            self.close()
+            raise SnapshotError(f'{path} is not a university snapshot')
+        if version != VERSION:
+            self.close()
+            raise SnapshotError(f'Unsupported snapshot version {version} (expected {VERSION})')
+        self._students_count, self._students = _read_table(self._data, students_offset, STUDENT_COLUMNS)
+        _, self._teachers = _read_table(self._data, teachers_offset, TEACHER_COLUMNS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def read_catalog(self):
+        """
+        :return: tuple - (university name, list of course dictionaries, list of faculties)
+        """
+        name, offset = self._str(self._courses_offset)
+        count, offset = self._unpack(_U32, offset)
+        courses = []
+        for _ in range(count):
+            course_id, offset = self._unpack(_I64, offset)
+            course_name, offset = self._str(offset)
+            faculty, offset = self._str(offset)
+            points, offset = self._unpack(_F64, offset)
+            course = {"id": course_id, "name": course_name, "faculty": faculty,
+                      "points": int(points) if points.is_integer() else points}
+            slots_count, offset = self._unpack(_U16, offset)
+            if slots_count:
+                course["slots"] = [format_slot(struct.unpack_from('<II', self._data, offset + 8 * i))
+                                   for i in range(slots_count)]
+                offset += 8 * slots_count
+            courses.append(course)
+        count, offset = self._unpack(_U32, offset)
+        faculties = []
+        for _ in range(count):
+            faculty, offset = self._str(offset)
+            faculties.append(faculty)
+        return name, courses, faculties
+
+    def read_students(self):
+        """
+        :return: dict - STUDENT_COLUMNS name to the list of the values of every student, in the order they were saved
+        """
+        return {name: column.read() for name, column in self._students.items()}
+
+    def read_teachers(self):
+        """
+        :return: dict - TEACHER_COLUMNS name to the list of the values of every teacher, in the order they were saved
+        """
+        return {name: column.read() for name, column in self._teachers.items()}
+
+    def records(self):
+        """
+        :return: generator of all person records (dictionaries), in the order they were saved
+        """
+        for kind, table in ((STUDENT, self.read_students()), (TEACHER, self.read_teachers())):
+            for values in zip(*table.values()):
+                yield self._record(kind, dict(zip(table, values)))
+
+    def find(self, identity_number):
+        """
+        Binary searches the id index for a person record
+        :param identity_number: str - person id number
+        :return: dict - the person record, None if the id is not in the snapshot
+        """
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            kind, table, row = self._locate(_U32.unpack_from(self._data, self._index_offset + middle * _U32.size)[0])
+            person_id = table['identity_number'].get(row)
+            if person_id == identity_number:
+                return self._record(kind, {name: column.get(row) for name, column in table.items()})
+            if person_id < identity_number:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _locate(self, position):
+        if position < self._students_count:
+            return STUDENT, self._students, position
+        return TEACHER, self._teachers, position - self._students_count
+
+    def _unpack(self, fmt, offset):
+        return fmt.unpack_from(self._data, offset)[0], offset + fmt.size
+
+    def _str(self, offset):
+        length, offset = self._unpack(_U32, offset)
+        return self._data[offset:offset + length].decode('utf-8'), offset + length
+
+    @staticmethod
+    def _record(kind, values):
+        record = {'type': 'Student' if kind == STUDENT else 'Teacher', 'identity_number': values['identity_number'],
+                  'full_name': values['full_name'], 'start_date': values['start_date']}
+        if kind == STUDENT:
+            record['faculty'] = values['faculty']
+            record['address'] = restore_address(values['city'], values['country'], values['zip_code'],
+                                                values['raw_address']).value
+        else:
+            record['faculties'] = list(values['faculties'])
+        record['courses'] = list(values['courses'])
+        return record
@@ -0,0 +1,603 @@
+import json
+import sqlite3
+from collections.abc import ItemsView, Mapping, ValuesView
+from time import perf_counter
+from catalog import iter_courses
+from loader import LoadReport, read_chunks, DEFAULT_CHUNK_SIZE, STUDENT_FIELDS, TEACHER_FIELDS
+from person import Student, Teacher, Address, date_to_ordinal
+from university import BaseUniversity, ITER_PAGE_SIZE, new_person_error, removal_error, faculty_change_error
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    faculty TEXT NOT NULL,
+    points NUMERIC NOT NULL
+);
+CREATE TABLE IF NOT EXISTS persons (
+    seq INTEGER PRIMARY KEY,
+    identity_number TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    faculty TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    start_ordinal INTEGER,
+    start_year INTEGER,
+    address TEXT,
+    city TEXT,
+    zip_code TEXT,
+    points NUMERIC NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS persons_faculty ON persons (type, faculty);
+CREATE INDEX IF NOT EXISTS persons_start_ordinal ON persons (type, start_ordinal);
+CREATE INDEX IF NOT EXISTS persons_start_year ON persons (start_year);
+CREATE INDEX IF NOT EXISTS persons_top ON persons (type, points DESC, full_name DESC, seq);
+CREATE INDEX IF NOT EXISTS persons_city_zip_code ON persons (city || ' ' || zip_code)
+    WHERE type = 'Student' AND city IS NOT NULL;
+CREATE TABLE IF NOT EXISTS teacher_faculties (
+    identity_number TEXT NOT NULL,
+    faculty TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (identity_number, faculty)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS teacher_faculties_faculty ON teacher_faculties (faculty);
+CREATE TABLE IF NOT EXISTS enrollments (
+    identity_number TEXT NOT NULL,
+    course_id INTEGER NOT NULL,
+    UNIQUE (identity_number, course_id)
+);
+CREATE INDEX IF NOT EXISTS enrollments_course ON enrollments (course_id, identity_number);
+'''
+
+# the statements are module constants: sqlite3 keeps the compiled statement of every distinct sql text of a
+# connection in its statement cache, so each of them is prepared once and then only re-bound
+PERSON_COLUMNS = 'p.identity_number, p.type, p.full_name, p.faculty, p.start_date, p.address'
+INSERT_COURSE = 'INSERT OR REPLACE INTO courses (id, name, faculty, points) VALUES (?, ?, ?, ?)'
+INSERT_PERSON = 'INSERT INTO persons (identity_number, type, full_name, faculty, start_date, start_ordinal, ' \
+                'start_year, address, city, zip_code) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+INSERT_TEACHER_FACULTY = 'INSERT OR IGNORE INTO teacher_faculties (identity_number, faculty, position) ' \
+                         'SELECT ?1, ?2, COALESCE(MAX(position), 0) + 1 FROM teacher_faculties WHERE identity_number = ?1'
+DELETE_TEACHER_FACULTY = 'DELETE FROM teacher_faculties WHERE identity_number = ?1 AND faculty = ?2 AND NOT EXISTS (' \
+                         'SELECT 1 FROM enrollments e JOIN courses c ON c.id = e.course_id ' \
+                         'WHERE e.identity_number = ?1 AND c.faculty = ?2)'
+INSERT_ENROLLMENT = 'INSERT INTO enrollments (identity_number, course_id) VALUES (?, ?)'
+DELETE_ENROLLMENT = 'DELETE FROM enrollments WHERE identity_number = ? AND course_id = ?'
+ADD_POINTS = 'UPDATE persons SET points = points + ? WHERE identity_number = ?'
+SELECT_PERSON = f'SELECT {PERSON_COLUMNS} FROM persons p WHERE p.identity_number = ?'
+SELECT_EXISTING_IDS = 'SELECT identity_number FROM persons WHERE identity_number IN (SELECT value FROM json_each(?))'
+SELECT_ENROLLMENTS = 'SELECT e.identity_number, c.id, c.name, c.faculty, c.points FROM enrollments e ' \
+                     'JOIN courses c ON c.id = e.course_id ' \
+                     'WHERE e.identity_number IN (SELECT value FROM json_each(?)) ORDER BY e.rowid'
+SELECT_PERSONS_AFTER = f'SELECT p.seq, {PERSON_COLUMNS} FROM persons p WHERE p.type = ? AND p.seq > ? ' \
+                       f'ORDER BY p.seq LIMIT ?'
+SELECT_TEACHER_FACULTIES = 'SELECT identity_number, faculty FROM teacher_faculties ' \
+                           'WHERE identity_number IN (SELECT value FROM json_each(?)) ORDER BY position'
+
+
+class PersonsMapping(Mapping):
+    """
+    Read only {identity number: person} view of the students or the teachers of a SQLiteUniversity, in insertion
+    order like University.students and University.teachers. Lookups, membership tests and len are single queries
+    and values and items read the table ITER_PAGE_SIZE rows at a time, so the population is never all in memory.
+    """
+    def __init__(self, university, person_type):
+        self._university = university
+        self._type = person_type
+
+    def __getitem__(self, identity_number):
+        person = self._university.get_person_by_id(identity_number)
+        if person is None or person.person_type() != self._type:
+            raise KeyError(identity_number)
+        return person
+
+    def __contains__(self, identity_number):
+        return self._university._conn.execute('SELECT 1 FROM persons WHERE identity_number = ? AND type = ?',
+                                              (identity_number, self._type)).fetchone() is not None
+
+    def __iter__(self):
+        return (row[0] for row in self._university._conn.execute(
+            'SELECT identity_number FROM persons WHERE type = ? ORDER BY seq', (self._type,)))
+
+    def __len__(self):
+        return self._university._conn.execute('SELECT COUNT(*) FROM persons WHERE type = ?',
+                                              (self._type,)).fetchone()[0]
+
+    def values(self):
+        return _PersonsValues(self)
+
+    def items(self):
+        return _PersonsItems(self)
+
+    def _iter_persons(self):
+        seq = 0
+        while True:
+            rows = self._university._conn.execute(SELECT_PERSONS_AFTER,
+                                                  (self._type, seq, ITER_PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            seq = rows[-1][0]
+            yield from self._university._build_persons([row[1:] for row in rows])
+
+
+class _PersonsValues(ValuesView):
+    def __iter__(self):
+        return self._mapping._iter_persons()
+
+
+class _PersonsItems(ItemsView):
+    def __iter__(self):
+        return ((person.identity_number, person) for person in self._mapping._iter_persons())
+
+
+class SQLiteUniversity(BaseUniversity):
+    """
+    University stored in an embedded SQLite database instead of Python dictionaries, with the same API as
+    University for loading, enrolling and querying (the backend independent methods and enrollment checks are
+    shared through BaseUniversity), so the population doesn't have to fit in memory and a file database is ready as
+    soon as it is opened.
+    Persons are indexed by identity number, faculty, start date, start year and course points, and enrollments by
+    (person, course) and (course, person), so the queries are index lookups and scans instead of full table scans.
+    Person objects returned by the getters are built from the database rows: changing them doesn't change the
+    database. Course capacities, time slots, journals, snapshots and change listeners are University only features.
+    """
+    def __init__(self, name, path=':memory:'):
+        """
+        :param name: str - university name
+        :param path: str - database file path, by default a private in memory database
+        """
+        self.name = name
+        self.path = path
+        self._conn = sqlite3.connect(path, cached_statements=256)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode = WAL')
+            self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.executescript(SCHEMA)
+        self._students = PersonsMapping(self, 'Student')
+        self._teachers = PersonsMapping(self, 'Teacher')
+        self.faculties = [row[0] for row in self._conn.execute('SELECT DISTINCT faculty FROM courses')]
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    ''' getters'''
+
+    @property
+    def students(self):
+        return self._students
+
+    @property
+    def teachers(self):
+        return self._teachers
+
+    ''' university methods '''
+
+    def load_university_data(self, students_file, teachers_file, courses_file):
+        self.load_students(students_file)
+        self.load_teachers(teachers_file)
+        self.load_courses(courses_file)
+
+    def load_students(self, file_path):
+        for reject in self.load_students_bulk(file_path).rejects:
+            print(f"exception occurred for student (id: {reject['identity_number']}): {reject['reason']}")
+
+    def load_teachers(self, file_path):
+        for reject in self.load_teachers_bulk(file_path).rejects:
+            print(f"exception occurred for teacher (id: {reject['identity_number']}): {reject['reason']}")
+
+    def load_students_bulk(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Streams students from a csv file, inserting every chunk of chunk_size rows in one transaction.
+        :param file_path: str - path of the students csv file
+        :param chunk_size: int - number of rows read and inserted per transaction
+        :return: LoadReport - rows read, rows loaded, rejected rows with reasons and rows per second
+        """
+        return self._bulk_load(file_path, 'Student', STUDENT_FIELDS, chunk_size)
+
+    def load_teachers_bulk(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Streams teachers from a csv file, inserting every chunk of chunk_size rows in one transaction.
+        :param file_path: str - path of the teachers csv file
+        :param chunk_size: int - number of rows read and inserted per transaction
+        :return: LoadReport - rows read, rows loaded, rejected rows with reasons and rows per second
+        """
+        return self._bulk_load(file_path, 'Teacher', TEACHER_FIELDS, chunk_size)
+
+    def _bulk_load(self, file_path, kind, fields, chunk_size):
+        report = LoadReport(file_path)
+        start = perf_counter()
+        for chunk in read_chunks(file_path, chunk_size):
+            accepted = {}
+            existing = {row[0] for row in self._conn.execute(
+                SELECT_EXISTING_IDS, (json.dumps([row.get('identity_number') for row in chunk]),))}
+            for row_number, row in enumerate(chunk, report.rows + 1):
+                person_id = row.get('identity_number')
+                missing = [field for field in fields if not row.get(field)]
+                if missing:
+                    report.reject(row_number, person_id, f'missing fields: {", ".join(missing)}')
+                elif person_id in existing or person_id in accepted:
+                    report.reject(row_number, person_id, f'id {person_id} already exists in the university')
+                else:
+                    accepted[person_id] = row
+            with self._conn:
+                self._insert_persons(kind, [tuple(row[field] for field in fields) for row in accepted.values()])
+            report.rows += len(chunk)
+            report.loaded += len(accepted)
+        report.elapsed = perf_counter() - start
+        return report
+
+    def _insert_persons(self, kind, values):
+        if kind == 'Student':
+            rows = []
+            for identity_number, full_name, faculty, start_date, address in values:
+                parsed = Address(address)
+                rows.append((identity_number, kind, full_name, faculty, str(start_date), None,
+                             self.get_start_year(start_date), address, parsed.city, parsed.zip_code))
+            self._conn.executemany(INSERT_PERSON, rows)
+        else:
+            self._conn.executemany(INSERT_PERSON, [
+                (identity_number, kind, full_name, faculty, start_date, date_to_ordinal(start_date),
+                 self.get_start_year(start_date), None, None, None)
+                for identity_number, full_name, faculty, start_date in values])
+            self._conn.executemany(INSERT_TEACHER_FACULTY, [(value[0], value[2]) for value in values])
+
+    def load_courses(self, file_path):
+        """
+        Streams the courses of a json array or newline delimited json file into the courses table
+        :param file_path: str - courses file path
+        :return: None
+        """
+        with self._conn:
+            self._conn.executemany(INSERT_COURSE, ((course.course_id, course.name, course.faculty, course.points)
+                                                   for course in iter_courses(file_path)))
+        self.faculties = [row[0] for row in self._conn.execute('SELECT DISTINCT faculty FROM courses')]
+
+    def get_person_by_id(self, person_id):
+        persons = self._build_persons(self._conn.execute(SELECT_PERSON, (person_id,)).fetchall())
+        return persons[0] if persons else None
+
+    def _build_persons(self, rows):
+        """
+        Builds Student and Teacher objects, with their courses, from persons rows (PERSON_COLUMNS), fetching the
+        enrollments of all the rows with one query
+        """
+        if not rows:
+            return []
+        ids = json.dumps([row[0] for row in rows])
+        courses = {}
+        for identity_number, course_id, name, faculty, points in self._conn.execute(SELECT_ENROLLMENTS, (ids,)):
+            courses.setdefault(identity_number, []).append({"id": course_id, "name": name, "faculty": faculty,
+                                                            "points": points})
+        faculties = {}
+        if any(row[1] == 'Teacher' for row in rows):
+            for identity_number, faculty in self._conn.execute(SELECT_TEACHER_FACULTIES, (ids,)):
+                faculties.setdefault(identity_number, []).append(faculty)
+        persons = []
+        for identity_number, kind, full_name, faculty, start_date, address in rows:
+            if kind == 'Student':
+                person = Student(identity_number, full_name, faculty=faculty, start_date=start_date, address=address)
+                for course in courses.get(identity_number, ()):
+                    person.add_course(course)
+            else:
+                person = Teacher(identity_number, full_name, faculty=faculty, start_date=start_date)
+                person.courses = {str(course['id']): course for course in courses.get(identity_number, ())}
+                person.faculties = faculties.get(identity_number, [])
+            persons.append(person)
+        return persons
+
+    def get_student_total_points(self, student_id):
+        return self._conn.execute('SELECT COALESCE(SUM(c.points), 0) FROM enrollments e JOIN courses c '
+                                  'ON c.id = e.course_id WHERE e.identity_number = ?', (student_id,)).fetchone()[0]
+
+    def remove_person(self, identity_number):
+        """
+        Removes a person (student or teacher) from the University only if it has no courses enrolled to it
+        :param identity_number: str - person (student or teacher) id number
+        :return: None
+        :error handling
+            * NameError in case identity number is not in the university
+            * PermissionError in case the person has any courses enrolled to it
+        """
+        person = self.get_person_by_id(identity_number)
+        error = removal_error(identity_number, person)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+        with self._conn:
+            self._conn.execute('DELETE FROM persons WHERE identity_number = ?', (identity_number,))
+            self._conn.execute('DELETE FROM teacher_faculties WHERE identity_number = ?', (identity_number,))
+
+    def get_courses(self, identity_number):
+        """
+        Returns a list of courses the person (student/teacher) has enrolled to him
+        :param identity_number: str - person id number
+        :return: list of all course dictionaries the person (student/teacher) is enrolled in
+        :error handling
+            * NameError in case identity number is not in the system
+        """
+        if not self._conn.execute('SELECT 1 FROM persons WHERE identity_number = ?', (identity_number,)).fetchone():
+            raise NameError(f'Given id number {identity_number} is not listed in the university')
+        return [{"id": course_id, "name": name, "faculty": faculty, "points": points}
+                for _, course_id, name, faculty, points in
+                self._conn.execute(SELECT_ENROLLMENTS, (json.dumps([identity_number]),))]
+
+    def iter_person_courses(self, identity_number, faculty=None, predicate=None):
+        if not self._conn.execute('SELECT 1 FROM persons WHERE identity_number = ?', (identity_number,)).fetchone():
+            raise NameError(f'Given id number {identity_number} is not listed in the university')
+        courses = ({"id": course_id, "name": name, "faculty": course_faculty, "points": points}
+                   for _, course_id, name, course_faculty, points in
+                   self._conn.execute(SELECT_ENROLLMENTS, (json.dumps([identity_number]),)))
+        return (course for course in courses
+                if (faculty is None or course['faculty'] == faculty) and (predicate is None or predicate(course)))
+
+    ''' index methods '''
+
+    def get_students_in_faculty(self, faculty):
+        return self._build_persons(self._conn.execute(
+            f"SELECT {PERSON_COLUMNS} FROM persons p WHERE p.type = 'Student' AND p.faculty = ? ORDER BY p.seq",
+            (faculty,)).fetchall())
+
+    def get_teachers_in_faculty(self, faculty):
+        return self._build_persons(self._conn.execute(
+            f'SELECT {PERSON_COLUMNS} FROM teacher_faculties f JOIN persons p USING (identity_number) '
+            f'WHERE f.faculty = ? ORDER BY p.seq', (faculty,)).fetchall())
+
+    def get_persons_by_start_year(self, from_year, to_year=None):
+        return self._build_persons(self._conn.execute(
+            f'SELECT {PERSON_COLUMNS} FROM persons p WHERE p.start_year BETWEEN ? AND ? ORDER BY p.start_year, p.seq',
+            (int(from_year), int(from_year if to_year is None else to_year))).fetchall())
+
+    def get_course_roster(self, course_id):
+        return self._build_persons(self._conn.execute(
+            f'SELECT {PERSON_COLUMNS} FROM enrollments e JOIN persons p USING (identity_number) '
+            f'WHERE e.course_id = ? ORDER BY e.rowid', (int(course_id),)).fetchall())
+
+    ''' courses methods '''
+
+    def get_course_by_id(self, course_id):
+        """
+        returns a course dictionary
+        :param course_id: int
+        :return: returns a course object
+        """
+        if not str(course_id).isdigit():
+            return None
+        row = self._conn.execute('SELECT id, name, faculty, points FROM courses WHERE id = ?',
+                                 (int(course_id),)).fetchone()
+        return {"id": row[0], "name": row[1], "faculty": row[2], "points": row[3]} if row else None
+
+    def list_courses(self):
+        return [{"id": course_id, "name": name, "faculty": faculty, "points": points} for course_id, name, faculty,
+                points in self._conn.execute('SELECT id, name, faculty, points FROM courses ORDER BY rowid')]
+
+    def iter_courses(self, faculty=None, predicate=None):
+        query = 'SELECT id, name, faculty, points FROM courses' + (' WHERE faculty = ?' if faculty is not None else '')
+        for course_id, name, course_faculty, points in self._conn.execute(query + ' ORDER BY rowid',
+                                                                          () if faculty is None else (faculty,)):
+            course = {"id": course_id, "name": name, "faculty": course_faculty, "points": points}
+            if predicate is None or predicate(course):
+                yield course
+
+    def add_course(self, person_id, course_id):
+        """
+        Adds the course (by id) to the person with the given identity_number, checking the University rules.
+        :param person_id: str, identity number of the person
+        :param course_id: str, id of the course
+        :return: None
+        :error handling
+            * ValueError in case person id or course id is missing
+        """
+        person = self.get_person_by_id(person_id)
+        if not person:
+            raise ValueError(f'Person with id {person_id} does not exist.')
+        course = self.get_course_by_id(course_id)
+        if not course:
+            raise ValueError(f'Course with id {course_id} does not exist.')
+        error = self._person_enrollment_error(person, course)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+        with self._conn:
+            self._enroll(person, course)
+
+    def add_courses_bulk(self, pairs, all_or_nothing=False):
+        """
+        Adds a batch of (person id, course id) enrollments in one transaction, checking the same rules as
+        University.add_courses_bulk.
+        :param pairs: iterable of (person id, course id) tuples
+        :param all_or_nothing: bool - when True nothing is enrolled if any pair is rejected
+        :return: a list of EnrollmentResult (person_id, course_id, accepted, reason, error_type), one per pair in the
+        given order
+        """
+        results, accepted = self._enrollment_results(self._check_enrollments(pairs), all_or_nothing)
+        with self._conn:
+            for person, course in accepted:
+                self._enroll(person, course)
+        return results
+
+    def _enroll(self, person, course):
+        self._conn.execute(INSERT_ENROLLMENT, (person.identity_number, course['id']))
+        if person.person_type() == 'Student':
+            self._conn.execute(ADD_POINTS, (course['points'], person.identity_number))
+        else:
+            self._conn.execute(INSERT_TEACHER_FACULTY, (person.identity_number, course['faculty']))
+
+    def remove_course(self, person_id, course_id):
+        """
+        Removes the course from the correct person (student/teacher)
+        :param person_id: str, identity number of the person
+        :param course_id: int, id of the course
+        :return: None
+        :error handling
+            * given person id doesn't exist, raise ValueError
+            * given course id doesn't, raise ValueError
+            * If the person isn’t enrolled in the course, do nothing.
+        """
+        row = self._conn.execute('SELECT type FROM persons WHERE identity_number = ?', (person_id,)).fetchone()
+        if not row:
+            raise ValueError(f'Person with id {person_id} does not exist in the university.')
+        course = self.get_course_by_id(course_id)
+        if not course:
+            raise ValueError(f'course with id {course_id} is not listed in the university.')
+        with self._conn:
+            if self._conn.execute(DELETE_ENROLLMENT, (person_id, course['id'])).rowcount:
+                if row[0] == 'Student':
+                    self._conn.execute(ADD_POINTS, (-course['points'], person_id))
+                else:
+                    self._conn.execute(DELETE_TEACHER_FACULTY, (person_id, course['faculty']))
+
+    ''' students methods '''
+
+    def get_students(self):
+        return self._build_persons(self._conn.execute(
+            f"SELECT {PERSON_COLUMNS} FROM persons p WHERE p.type = 'Student' ORDER BY p.seq").fetchall())
+
+    def page_students(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        return self._page('Student', 'p.faculty = ?', cursor, limit, faculty, start_year, predicate)
+
+    def get_number_of_students(self):
+        return self._conn.execute("SELECT COUNT(*) FROM persons WHERE type = 'Student'").fetchone()[0]
+
+    def change_faculty(self, identity_number, faculty):
+        """
+        changes the faculty of the student only if he has no courses enrolled in other faculties.
+        :param identity_number: str - student id number
+        :param faculty: str - faculty name
+        :return: None
+        :error handling
+            * NameError in case identity number is not in the system
+            * PermissionError If the student has courses enrolled in it from another faculty,
+            * ValueError in case the faculty isn't listed in the University
+        """
+        student = self.get_person_by_id(identity_number)
+        if student and student.person_type() != 'Student':
+            student = None
+        error = faculty_change_error(identity_number, student, faculty, self.faculties)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+        if student.faculty == faculty:
+            return
+        with self._conn:
+            self._conn.execute('UPDATE persons SET faculty = ? WHERE identity_number = ?', (faculty, identity_number))
+
+    def add_student(self, identity_number, full_name, faculty, start_date, address):
+        """
+        Creates a new student in the system assigned with the relevant faculty.
+        :error handling
+            * NameError if identity number is already in the university
+            * PermissionError if identity_number isn’t 9 digits
+            * ValueError if the given faculty does not exist in the university
+            * TypeError if start_year isn’t in the yyyy date format,
+        """
+        self._check_new_person('Student', identity_number, faculty, start_date)
+        with self._conn:
+            self._insert_persons('Student', [(identity_number, full_name, faculty, start_date, address)])
+
+    ''' teachers methods '''
+
+    def get_teachers(self):
+        return self._build_persons(self._conn.execute(
+            f"SELECT {PERSON_COLUMNS} FROM persons p WHERE p.type = 'Teacher' ORDER BY p.seq").fetchall())
+
+    def page_teachers(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        faculty_condition = 'EXISTS (SELECT 1 FROM teacher_faculties f ' \
+                            'WHERE f.identity_number = p.identity_number AND f.faculty = ?)'
+        return self._page('Teacher', faculty_condition, cursor, limit, faculty, start_year, predicate)
+
+    def _page(self, person_type, faculty_condition, cursor, limit, faculty, start_year, predicate):
+        """
+        Keyset pagination over the identity number unique index: every page starts with an index seek past the
+        cursor. The predicate runs on the built persons, so pages are fetched until limit persons pass it.
+        """
+        conditions, params = ['p.type = ?'], [person_type]
+        if faculty is not None:
+            conditions.append(faculty_condition)
+            params.append(faculty)
+        if start_year is not None:
+            conditions.append('p.start_year = ?')
+            params.append(int(start_year))
+        query = f'SELECT {PERSON_COLUMNS} FROM persons p WHERE {" AND ".join(conditions)} ' \
+                f'AND p.identity_number > ? ORDER BY p.identity_number LIMIT ?'
+        page = []
+        while len(page) < limit:
+            rows = self._conn.execute(query, (*params, cursor or '', limit - len(page))).fetchall()
+            if not rows:
+                break
+            cursor = rows[-1][0]
+            persons = self._build_persons(rows)
+            page.extend(persons if predicate is None else filter(predicate, persons))
+        return page, page[-1].identity_number if len(page) == limit else None
+
+    def get_number_of_teachers(self):
+        return self._conn.execute("SELECT COUNT(*) FROM persons WHERE type = 'Teacher'").fetchone()[0]
+
+    def add_teacher(self, identity_number, full_name, faculty, start_date):
+        """
+        Creates a new teacher in the system with a given faculty.
+        :error handling
+            * NameError if identity number is already in the university
+            * PermissionError if identity_number isn’t 9 digits
+            * ValueError if the given faculty does not exist in the university
+            * TypeError if start_year isn’t in the dd/mm/yyyy date format,
+        """
+        self._check_new_person('Teacher', identity_number, faculty, start_date)
+        with self._conn:
+            self._insert_persons('Teacher', [(identity_number, full_name, faculty, start_date)])
+
+    def _check_new_person(self, person_type, identity_number, faculty, start_date):
+        listed = self._conn.execute('SELECT 1 FROM persons WHERE identity_number = ?', (identity_number,)).fetchone()
+        error = new_person_error(person_type, identity_number, faculty, start_date, bool(listed), self.faculties)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+
+    ''' general methods '''
+
+    def get_top_10_students(self):
+        return self.get_top_students(10)
+
+    def get_top_students(self, k):
+        """
+        :param k: int - number of students to return
+        :return: a list of the full names of the top k students, ranked like University.get_top_students
+        """
+        return [row[0] for row in self._conn.execute(
+            "SELECT full_name FROM persons WHERE type = 'Student' ORDER BY points DESC, full_name DESC, seq LIMIT ?",
+            (k,))]
+
+    def get_students_zip_code(self):
+        return tuple(row[0] for row in self._conn.execute(
+            "SELECT city || ' ' || zip_code FROM persons WHERE type = 'Student' AND city IS NOT NULL "
+            "ORDER BY city || ' ' || zip_code"))
+
+    def get_teachers_from(self, date_str):
+        """
+        :param date_str: str - start date in dd/mm/yyyy format.
+        :return: a list of (name, start date) tuples of the teachers started from the given date, sorted by dates
+        (old to new) and names (A to Z).
+        :error handling
+            * ValueError - If the given date isn’t in dd/mm/yyyy format
+        """
+        start_ordinal = date_to_ordinal(date_str)
+        if start_ordinal is None:
+            raise ValueError(f'Given date: {date_str} is not in dd/mm/yyyy format')
+        return self._teachers_in_date_range(start_ordinal, None)
+
+    def get_teachers_between(self, start_date, end_date):
+        start_ordinal, end_ordinal = date_to_ordinal(start_date), date_to_ordinal(end_date)
+        for date_str, ordinal in ((start_date, start_ordinal), (end_date, end_ordinal)):
+            if ordinal is None:
+                raise ValueError(f'Given date: {date_str} is not in dd/mm/yyyy format')
+        return self._teachers_in_date_range(start_ordinal, end_ordinal)
+
+    def _teachers_in_date_range(self, start_ordinal, end_ordinal):
+        return [tuple(row) for row in self._conn.execute(
+            "SELECT full_name, start_date FROM persons WHERE type = 'Teacher' AND start_ordinal >= ? "
+            "AND start_ordinal <= COALESCE(?, start_ordinal) ORDER BY start_ordinal, full_name",
+            (start_ordinal, end_ordinal))]
@@ -0,0 +1,152 @@
+import re
+from bisect import bisect_left, bisect_right
+
+DAYS = ('Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat')
+MINUTES_PER_DAY = 24 * 60
+
+_SLOT = re.compile(r'^(\w{3}) (\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$')
+
+
+class ScheduleConflictError(PermissionError):
+    pass
+
+
+def parse_slot(slot):
+    """
+    :param slot: str - weekly time slot, e.g. "Mon 10:00-12:30"
+    :return: tuple - (start, end) minutes from the beginning of the week
+    :error handling
+        * ValueError if the slot isn't in the "Ddd hh:mm-hh:mm" format or ends before it starts
+    """
+    match = _SLOT.match(str(slot))
+    if not match or match.group(1) not in DAYS:
+        raise ValueError(f'Invalid time slot {slot}. Time slots should be in the "Mon 10:00-12:00" format')
+    day = DAYS.index(match.group(1)) * MINUTES_PER_DAY
+    start = day + int(match.group(2)) * 60 + int(match.group(3))
+    end = day + int(match.group(4)) * 60 + int(match.group(5))
+    if not start < end <= day + MINUTES_PER_DAY:
+        raise ValueError(f'Invalid time slot {slot}. A time slot must end after it starts, on the same day')
+    return start, end
+
+
+def format_slot(interval):
+    """
+    :param interval: tuple - (start, end) minutes from the beginning of the week
+    :return: str - the slot in the "Mon 10:00-12:00" format
+    """
+    start, end = interval
+    day, start = divmod(start, MINUTES_PER_DAY)
+    end -= day * MINUTES_PER_DAY
+    return f'{DAYS[day]} {start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}'
+
+
+def parse_slots(slots):
+    """
+    :param slots: iterable of str - the weekly time slots of a course
+    :return: tuple of (start, end) intervals sorted by start time
+    :error handling
+        * ValueError if a slot is invalid or two slots of the course overlap
+    """
+    intervals = tuple(sorted(parse_slot(slot) for slot in slots or ()))
+    for (_, previous_end), (start, _) in zip(intervals, intervals[1:]):
+        if start < previous_end:
+            raise ValueError(f'Overlapping time slots {[format_slot(i) for i in intervals]}')
+    return intervals
+
+
+class Schedule:
+    """
+    The weekly time slots a person is busy in: disjoint intervals kept sorted by start time in parallel lists,
+    so checking whether a new interval clashes is a binary search and a look at its two neighbours.
+    """
+    __slots__ = ('_starts', '_ends', '_owners')
+
+    def __init__(self):
+        self._starts = []
+        self._ends = []
+        self._owners = []
+
+    def __len__(self):
+        return len(self._starts)
+
+    def copy(self):
+        schedule = Schedule()
+        schedule._starts, schedule._ends, schedule._owners = list(self._starts), list(self._ends), list(self._owners)
+        return schedule
+
+    def slots(self):
+        """
+        :return: a list of (time slot, course id) tuples, sorted by time
+        """
+        return [(format_slot((start, end)), int(owner))
+                for start, end, owner in zip(self._starts, self._ends, self._owners)]
+
+    def conflict(self, intervals):
+        """
+        :param intervals: iterable of (start, end) intervals
+        :return: the owner (course id) of a busy interval overlapping one of the intervals, None if they are all free
+        """
+        for start, end in intervals:
+            i = bisect_right(self._starts, start)
+            if i and self._ends[i - 1] > start:
+                return self._owners[i - 1]
+            if i < len(self._starts) and self._starts[i] < end:
+                return self._owners[i]
+        return None
+
+    def add(self, owner, intervals):
+        for start, end in intervals:
+            i = bisect_right(self._starts, start)
+            self._starts.insert(i, start)
+            self._ends.insert(i, end)
+            self._owners.insert(i, owner)
+
+    def remove(self, owner, intervals):
+        for start, _ in intervals:
+            i = bisect_left(self._starts, start)
+            while self._owners[i] != owner:
+                i += 1
+            del self._starts[i], self._ends[i], self._owners[i]
+
+
+def assign_teachers(courses, teachers, schedules, max_courses=12, max_faculties=3):
+    """
+    Greedy teacher assignment: courses are taken by start time (interval partitioning order) and each one goes to
+    the least loaded teacher that already teaches in its faculty and is free at its time slots, or else to the
+    least loaded free teacher that can still add a faculty.
+    The teachers' current courses, faculties and schedules count towards the limits and clashes.
+    :param courses: iterable of Course records to staff
+    :param teachers: iterable of Teacher objects
+    :param schedules: dict - teacher identity number to the Schedule of its current courses (missing when empty)
+    :param max_courses: int - maximal number of courses per teacher
+    :param max_faculties: int - maximal number of faculties per teacher
+    :return: dict - course id to the identity number of its assigned teacher, courses no teacher fits are left out
+    """
+    load = {}
+    faculties = {}
+    busy = {}
+    by_faculty = {}
+    for teacher in teachers:
+        teacher_id = teacher.identity_number
+        load[teacher_id] = len(teacher.courses)
+        faculties[teacher_id] = set(teacher.faculties)
+        busy[teacher_id] = schedules[teacher_id].copy() if teacher_id in schedules else Schedule()
+        for faculty in teacher.faculties:
+            by_faculty.setdefault(faculty, set()).add(teacher_id)
+    assignments = {}
+    for course in sorted(courses, key=lambda c: (c.slots[0][0] if c.slots else -1, c.course_id)):
+        def fits(teacher_id):
+            return load[teacher_id] < max_courses and busy[teacher_id].conflict(course.slots) is None
+        in_faculty = by_faculty.get(course.faculty, ())
+        candidates = [t for t in in_faculty if fits(t)] or \
+                     [t for t in load if len(faculties[t]) < max_faculties and t not in in_faculty and fits(t)]
+        if not candidates:
+            continue
+        teacher_id = min(candidates, key=lambda t: (load[t], t))
+        assignments[course.course_id] = teacher_id
+        load[teacher_id] += 1
+        busy[teacher_id].add(str(course.course_id), course.slots)
+        if course.faculty not in faculties[teacher_id]:
+            faculties[teacher_id].add(course.faculty)
+            by_faculty.setdefault(course.faculty, set()).add(teacher_id)
+    return assignments
@@ -1,32 +1,352 @@
+import heapq
+import os
+from collections import Counter, namedtuple
 from csv import DictReader
-from itertools import islice
 from person import *
-import json
 from datetime import datetime
+from itertools import chain
+from time import perf_counter
+from cache import DerivedCache
+from catalog import Course, CourseCatalog, iter_courses
+from instrumentation import instrumented
+from indexes import KeyIndex, SortedIndex, SortedKeys, Leaderboard
+from loader import bulk_load, parallel_load, diff_rows, student_from_values, teacher_from_values, DEFAULT_CHUNK_SIZE, \
+    STUDENT_FIELDS, TEACHER_FIELDS
+from seats import SeatAllocator, CourseFullError
+from timetable import Schedule, ScheduleConflictError, assign_teachers
+from search import NameIndex
 
 students_file_path = 'data/students_short.csv'
 teachers_file_path = 'data/teachers_short.csv'
 courses_file_path = 'data/courses.json'
 
+JOURNALED_METHODS = ('add_student', 'add_teacher', 'add_course', 'remove_course', 'remove_person', 'change_faculty',
+                     'set_course_slots')
 
-class Course:
-    def __init__(self, course_id, name, faculty, points):
-        self.course_id = course_id
-        self.name = name
-        self.faculty = faculty
-        self.points = points
+EnrollmentResult = namedtuple('EnrollmentResult', ['person_id', 'course_id', 'accepted', 'reason', 'error_type'],
+                              defaults=(None,))
+AllocationResult = namedtuple('AllocationResult', ['person_id', 'course_id', 'status', 'reason'])
+
+# page size the iter_ generators read with
+ITER_PAGE_SIZE = 1000
+
+
+def enrollment_rule_error(person, course, course_ids, faculties, points):
+    """
+    Checks the enrollment rules of adding a course to a person with the given current enrollments
+    :param person: Student or Teacher
+    :param course: dict - course dictionary
+    :param course_ids: container of the str ids of the courses the person is enrolled to
+    :param faculties: container of the faculties a teacher teaches in, None for students
+    :param points: total course points of a student
+    :return: tuple - (exception type, message) of the broken rule, None if the enrollment is allowed
+    """
+    course_id = course['id']
+    person_id = person.identity_number
+    person_type = person.person_type()
+    if str(course_id) in course_ids:
+        return ValueError, f"The course id {course_id} ({course['name']}) is already enrolled to {person_type} " \
+                           f"{person.name} id: {person_id}"
+    if person_type == 'Teacher':
+        if len(faculties) >= 3 and course['faculty'] not in faculties:
+            return PermissionError, f"Cannot add course '{course['name']}' (id: {course_id}, faculty: " \
+                                    f"{course['faculty']}) to {person_type} {person.name} (id: {person_id}) " \
+                                    f"since he/she already teaches in 3 other faculties"
+        if len(course_ids) >= 12:
+            return PermissionError, f"Cannot add course '{course['name']}' (id: {course_id}, faculty: " \
+                                    f"{course['faculty']}) to {person_type} {person.name} (id: {person_id}) " \
+                                    f"since he/she already teaches in 12 courses"
+    if person_type == 'Student':
+        if course['faculty'] != person.faculty:
+            return PermissionError, f'Cannot add course "{course["name"]}" (id: {course_id}) since it does not ' \
+                                    f'belong to the assigned faculty of student {person.name} (id: {person_id})'
+        if points + course['points'] > 30:
+            return PermissionError, f'Cannot add course "{course["name"]}" (id: {course_id}) since student ' \
+                                    f'{person.name} total courses points will exceed 30 points'
+    return None
+
+
+def new_person_error(person_type, identity_number, faculty, start_date, listed, faculties):
+    """
+    Checks the rules of adding a student or teacher, shared by the University storage backends
+    :param person_type: str - 'Student' or 'Teacher'
+    :param listed: bool - True if the identity number is already in the university
+    :param faculties: container of the university faculties
+    :return: tuple - (exception type, message) of the broken rule, None if the person can be added
+    """
+    if listed:
+        return NameError, f'Given id number {identity_number} is already in the university'
+    if not identity_number.isdigit() or len(identity_number) != 9:
+        return PermissionError, f'Invalid id number {identity_number}. ID number should be 9 digits'
+    if faculty not in faculties:
+        return ValueError, f"Given faculty '{faculty}' is not listed in the university"
+    if person_type == 'Student' and (not str(start_date).isdigit() or len(str(start_date)) != 4):
+        return TypeError, 'Invalid start year format. Start year must be in the yyyy format'
+    if person_type == 'Teacher' and date_to_ordinal(start_date) is None:
+        return TypeError, f"Given start date '{start_date}' is not in the correct format (dd/mm/yyyy)"
+    return None
+
+
+def removal_error(identity_number, person):
+    """
+    Checks the rules of removing a person
+    :param person: Student or Teacher, None if the identity number is not in the university
+    :return: tuple - (exception type, message) of the broken rule, None if the person can be removed
+    """
+    if not person:
+        return NameError, f'Given id number {identity_number} is not listed in the university'
+    if len(person.courses) > 0:
+        return PermissionError, f"Cannot remove {person.person_type()}: {person.name} (id: " \
+                                f"{person.identity_number}) since he/she is enrolled to at least 1 course"
+    return None
+
+
+def faculty_change_error(identity_number, student, faculty, faculties):
+    """
+    Checks the rules of changing the faculty of a student. Changing to the current faculty is allowed (and a no-op).
+    :param student: Student, None if the identity number is not a student of the university
+    :param faculties: container of the university faculties
+    :return: tuple - (exception type, message) of the broken rule, None if the faculty can be changed
+    """
+    if not student:
+        return NameError, f'Given id number {identity_number} is not in the system'
+    if faculty not in faculties:
+        return ValueError, f"Given faculty: {faculty} is not listed in the university"
+    if len(student.courses) > 0 and student.faculty != faculty:
+        return PermissionError, f"Cannot change the faculty for student: {student.name} since he is enrolled to " \
+                                f"courses in the faculty: {student.faculty}"
+    return None
+
+
+class BaseUniversity:
+    """
+    University API shared by the storage backends (University keeps the population in Python dictionaries,
+    sqlite_university.SQLiteUniversity in a SQLite database): faculties, date and start year helpers, iteration over
+    the pages of persons and the batch enrollment checks.
+    A backend stores the persons and courses and implements get_person_by_id, get_course_by_id, page_students and
+    page_teachers; it may extend _enrollment_error with its own rules (e.g. course seats and time slots).
+    """
+    faculties = []
+
+    def get_person_by_id(self, person_id):
+        raise NotImplementedError
+
+    def get_course_by_id(self, course_id):
+        raise NotImplementedError
+
+    def page_students(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        raise NotImplementedError
+
+    def page_teachers(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        raise NotImplementedError
+
+    def load_faculties(self, file_path):
+        self.faculties = list(self._read_faculties(file_path))
+
+    @staticmethod
+    def _read_faculties(file_path):
+        return tuple({course.faculty for course in iter_courses(file_path)})
+
+    def get_faculties(self):
+        """
+        :return: all faculties collected from all the courses the university teaches.
+        """
+        return self.faculties
+
+    def check_person_validity(self, person, persons_dict):
+        person_id = person.identity_number
+        person_type = person.person_type()
+        if person_id in persons_dict.keys():
+            raise ValueError(f'{person_type} with id {person_id} already exists in the university.')
+
+    def iter_students(self, faculty=None, start_year=None, predicate=None):
+        """
+        Generator over the students ordered by identity number, read a page at a time (see page_students), so
+        memory stays constant and students added or removed meanwhile never break the iteration
+        """
+        return self._iter_pages(self.page_students, faculty, start_year, predicate)
+
+    def iter_teachers(self, faculty=None, start_year=None, predicate=None):
+        """
+        Generator over the teachers ordered by identity number, read a page at a time (see page_teachers)
+        """
+        return self._iter_pages(self.page_teachers, faculty, start_year, predicate)
+
+    @staticmethod
+    def _iter_pages(page_method, faculty, start_year, predicate):
+        cursor = None
+        while True:
+            page, cursor = page_method(cursor, ITER_PAGE_SIZE, faculty, start_year, predicate)
+            yield from page
+            if cursor is None:
+                return
+
+    ''' assistance methods '''
+
+    @staticmethod
+    def get_start_year(start_date):
+        """
+        Extracts the start year from a student (yyyy) or teacher (dd/mm/yyyy) start date
+        :param start_date: str - start date
+        :return: int - the start year, None if the date has no valid year
+        """
+        year = str(start_date)[-4:]
+        return int(year) if year.isdigit() else None
+
+    def check_date_format(self, date_str):
+        """
+        Checks if the given date string is in dd/mm/yyyy format
+        :param date_str: str - date string
+        :return: bool - True if the date string is in the correct format, False otherwise
+        """
+        format = '%d/%m/%Y'
+        try:
+            result = bool(datetime.strptime(date_str, format))
+            return result
+        except ValueError:
+            return False
+
+    def compare_dates(self, date1, date2):
+        """
+        Converts given date strings to date objects and compares between the two dates objects
+        :param date1: str - first date string
+        :param date2: str - second date string
+        :return: bool - True if date1 is similar or bigger than date2, False if otherwise
+        """
+        dt_obj1 = datetime.strptime(date1, '%d/%m/%Y')
+        dt_obj2 = datetime.strptime(date2, '%d/%m/%Y')
+        return True if dt_obj2 >= dt_obj1 else False
+
+    ''' enrollment checks '''
+
+    def _check_enrollments(self, pairs):
+        """
+        Checks a batch of enrollments against per person running totals (courses, points, faculties, time slots)
+        and per course seats promised to the batch, computed once for the whole batch
+        :param pairs: iterable of (person id, course id) tuples
+        :return: a list of (person_id, course_id, person, course, error) tuples, error is the (exception type,
+        message) of the broken rule or None if the enrollment is allowed
+        """
+        checked = []
+        totals = {}
+        pending_seats = {}
+        for person_id, course_id in pairs:
+            # a person is looked up once per batch
+            person = totals[person_id][0] if person_id in totals else self.get_person_by_id(person_id)
+            course = self.get_course_by_id(course_id)
+            if not person:
+                checked.append((person_id, course_id, None, course,
+                                (ValueError, f'Person with id {person_id} does not exist.')))
+                continue
+            if not course:
+                checked.append((person_id, course_id, person, None,
+                                (ValueError, f'Course with id {course_id} does not exist.')))
+                continue
+            if person_id not in totals:
+                totals[person_id] = (person, set(person.courses.keys()),
+                                     set(person.faculties) if person.person_type() == 'Teacher' else None,
+                                     [getattr(person, 'points', 0)], [self._batch_schedule(person_id)])
+            _, course_ids, faculties, points, schedule = totals[person_id]
+            course_key = str(course['id'])
+            error = self._enrollment_error(person, course, course_ids, faculties, points[0],
+                                           pending_seats.get(course_key, 0), schedule[0])
+            if not error:
+                course_ids.add(course_key)
+                slots = self._course_slots(course_key)
+                if slots:
+                    # the batch's time slots go to a copy, the person's schedule changes only once enrolled
+                    schedule[0] = schedule[0].copy() if schedule[0] is not None else Schedule()
+                    schedule[0].add(course_key, slots)
+                if faculties is None:
+                    points[0] += course['points']
+                    pending_seats[course_key] = pending_seats.get(course_key, 0) + 1
+                else:
+                    faculties.add(course['faculty'])
+            checked.append((person_id, course_id, person, course, error))
+        return checked
+
+    @staticmethod
+    def _enrollment_results(checked, all_or_nothing):
+        """
+        :param checked: list - _check_enrollments result
+        :param all_or_nothing: bool - when True nothing is enrolled if any pair is rejected
+        :return: tuple - (list of EnrollmentResult, one per pair in the given order, list of the (person, course)
+        pairs to enroll)
+        """
+        results = []
+        accepted = []
+        for person_id, course_id, person, course, error in checked:
+            if error:
+                results.append(EnrollmentResult(person_id, course_id, False, error[1], error[0]))
+            else:
+                accepted.append((person, course))
+                results.append(EnrollmentResult(person_id, course_id, True, None))
+        if all_or_nothing and len(accepted) < len(results):
+            return [result if not result.accepted else
+                    result._replace(accepted=False, reason='Not enrolled since other enrollments of the batch were rejected')
+                    for result in results], []
+        return results, accepted
+
+    def _person_enrollment_error(self, person, course):
+        return self._enrollment_error(person, course, person.courses, person.faculties if
+                                      person.person_type() == 'Teacher' else None, getattr(person, 'points', 0))
+
+    def _enrollment_error(self, person, course, course_ids, faculties, points, pending_seats=0, schedule=None):
+        """
+        Checks the enrollment rules, see enrollment_rule_error
+        :param pending_seats: int - seats of the course already given to students of the same batch
+        :param schedule: Schedule - the person's busy time slots, by default its current schedule
+        :return: tuple - (exception type, message) of the broken rule, None if the enrollment is allowed
+        """
+        return enrollment_rule_error(person, course, course_ids, faculties, points)
 
-    def __repr__(self):
-        return f'Course(ID: {self.course_id}, name: {self.name}, faculty: {self.faculty}, points: {self.points})'
+    def _batch_schedule(self, person_id):
+        """
+        :return: Schedule - the busy time slots a batch of enrollments of the person is checked against, None if none
+        """
+        return None
+
+    def _course_slots(self, course_key):
+        """
+        :return: the (start, end) time slots of the course, empty if it has none
+        """
+        return ()
 
 
-class University:
-    def __init__(self, name):
+class University(BaseUniversity):
+    def __init__(self, name, compact=False):
+        """
+        :param name: str - university name
+        :param compact: bool - store every person's enrollments as an array of course ids pointing into the shared
+        courses table (CourseRefs) instead of a dictionary of course dictionaries. Saves memory on large populations.
+        """
         self.name = name
-        self.courses = {}
+        self.compact = compact
+        self.courses = CourseCatalog()
         self.faculties = []
         self._students = {}
         self._teachers = {}
+        self._student_ids = SortedKeys()
+        self._teacher_ids = SortedKeys()
+        self._student_faculty_index = KeyIndex()
+        self._teacher_faculty_index = KeyIndex()
+        self._start_year_index = SortedIndex()
+        self._course_index = KeyIndex()
+        self._leaderboard = Leaderboard()
+        self._teacher_date_index = SortedIndex()
+        self._journal = None
+        self._sequence = 0
+        self._cache = DerivedCache()
+        self._change_listeners = []
+        self._city_index = KeyIndex()
+        self._zip_code_index = SortedIndex()
+        self._city_zip_code_index = SortedIndex()
+        self._seats = SeatAllocator()
+        self._row_hashes = {}
+        self._schedules = {}
+        self._events = None
+        # built by the first search_persons call, so loads of universities nobody searches don't pay for it
+        self._name_index = None
 
     ''' getters'''
 
@@ -46,6 +366,7 @@ class University:
         # self.load_faculties(courses_file)
         self.load_courses(courses_file)
 
+    @instrumented(profile=True)
     def load_students(self, file_path):
         with open(file_path, 'r') as csvfile:
             students = DictReader(csvfile)
@@ -54,11 +375,12 @@ class University:
                     student = Student(s['identity_number'], s['full_name'], faculty=s['faculty'],
                                       start_date=s['start_date'], address=s['address'])
                     self.check_person_validity(student, self._students)
-                    self._students[s['identity_number']] = student
+                    self._add_person(student)
                 except Exception:
                     print(
                         f'exception occurred for student {student.name} (id: {student.identity_number}) whom id already exists in the system')
 
+    @instrumented(profile=True)
     def load_teachers(self, file_path):
         with open(file_path, 'r') as csvfile:
             teachers = DictReader(csvfile)
@@ -67,36 +389,315 @@ class University:
                     teacher = Teacher(t['identity_number'], t['full_name'], faculty=t['faculty'],
                                       start_date=t['start_date'])
                     self.check_person_validity(teacher, self._teachers)
-                    self._teachers[t['identity_number']] = teacher
+                    self._add_person(teacher)
                 except Exception:
                     print(
                         f'exception occurred for teacher {teacher.name} (id: {teacher.identity_number}) whom id already exists in the system')
 
+    @instrumented(rows=lambda report: report.rows, profile=True)
+    def load_students_bulk(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Streams students from a (possibly very large) csv file in chunks of chunk_size rows.
+        Unlike load_students, rejected rows are collected into the returned report instead of being printed.
+        :param file_path: str - path of the students csv file
+        :param chunk_size: int - number of rows read and inserted per batch
+        :return: LoadReport - rows read, rows loaded, rejected rows with reasons and rows per second
+        """
+        return bulk_load(file_path, self._students, STUDENT_FIELDS, student_from_values, self._add_persons, chunk_size)
+
+    @instrumented(rows=lambda report: report.rows, profile=True)
+    def load_teachers_bulk(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Streams teachers from a (possibly very large) csv file in chunks of chunk_size rows.
+        Unlike load_teachers, rejected rows are collected into the returned report instead of being printed.
+        :param file_path: str - path of the teachers csv file
+        :param chunk_size: int - number of rows read and inserted per batch
+        :return: LoadReport - rows read, rows loaded, rejected rows with reasons and rows per second
+        """
+        return bulk_load(file_path, self._teachers, TEACHER_FIELDS, teacher_from_values, self._add_persons, chunk_size)
+
+    @instrumented(rows=lambda reports: sum(report.rows for report in reports), profile=True)
+    def load_shards(self, students_files=(), teachers_files=(), processes=None):
+        """
+        Loads students and teachers csv shards in parallel: the shards are read, validated and turned into persons
+        in a process pool, and only inserted here.
+        Ids already in the university, or in an earlier shard, are rejected into the shard's report.
+        :param students_files: list - paths of students csv shards
+        :param teachers_files: list - paths of teachers csv shards
+        :param processes: int - number of worker processes, None for the number of cpus, 1 to parse in this process
+        :return: list of ShardReport - rows, rejects and parse/merge timings per shard (students shards first)
+        """
+        tasks = [('Student', path) for path in students_files] + [('Teacher', path) for path in teachers_files]
+        return parallel_load(tasks, {'Student': self._students, 'Teacher': self._teachers}, self._add_persons,
+                             processes)
+
+    @instrumented(rows=lambda report: report.rows, profile=True)
+    def reload_students(self, file_path):
+        """
+        Applies an updated students csv file to the loaded students: new ids are inserted, changed rows update
+        their student in place (keeping its enrollments) and students missing from the file are deleted.
+        Unchanged rows are detected by comparing per row hashes to the previous reload, so only the changed rows
+        touch the students and the indexes.
+        :param file_path: str - path of the students csv file
+        :return: ReloadReport - inserted, updated and deleted ids, unchanged rows count, rejected rows and conflicts
+        :error handling
+            * a deleted student enrolled to courses, or a changed faculty of a student enrolled to courses, is
+              reported as a conflict and not applied
+        """
+        return self._reload('Student', file_path)
+
+    @instrumented(rows=lambda report: report.rows, profile=True)
+    def reload_teachers(self, file_path):
+        """
+        Applies an updated teachers csv file to the loaded teachers, like reload_students.
+        :param file_path: str - path of the teachers csv file
+        :return: ReloadReport
+        :error handling
+            * a deleted teacher teaching courses, or a teacher teaching courses moved to a faculty it doesn't teach
+              in, is reported as a conflict and not applied
+        """
+        return self._reload('Teacher', file_path)
+
+    def _reload(self, kind, file_path):
+        start = perf_counter()
+        if kind == 'Student':
+            persons_dict, others, fields, factory = self._students, self._teachers, STUDENT_FIELDS, student_from_values
+        else:
+            persons_dict, others, fields, factory = self._teachers, self._students, TEACHER_FIELDS, teacher_from_values
+        report, changed, hashes = diff_rows(file_path, fields, self._row_hashes.get(kind),
+                                            lambda values: self._row_matches(persons_dict.get(values[0]), values))
+        for row_number, values in changed:
+            person_id = values[0]
+            person = persons_dict.get(person_id)
+            if person is None and person_id in others:
+                report.reject(row_number, person_id, f'id {person_id} already exists in the university')
+                hashes[person_id] = None
+            elif person is None:
+                self._add_person(factory(values))
+                report.inserted.append(person_id)
+            else:
+                conflict = self._update_person(person, values)
+                if conflict:
+                    report.conflict(person_id, conflict)
+                    # never equal to a row hash, so the row is applied again by the next reload
+                    hashes[person_id] = None
+                else:
+                    report.updated.append(person_id)
+        rejected = {reject['identity_number'] for reject in report.rejects}
+        for person_id in persons_dict.keys() - hashes.keys() - rejected:
+            person = persons_dict[person_id]
+            if person.courses:
+                report.conflict(person_id, f'{kind} {person.name} is not in the file but is enrolled to courses')
+            else:
+                self._remove_person(person)
+                report.deleted.append(person_id)
+        self._row_hashes[kind] = hashes
+        report.loaded = len(report.inserted) + len(report.updated)
+        report.elapsed = perf_counter() - start
+        return report
+
+    @staticmethod
+    def _row_matches(person, values):
+        if person is None:
+            return False
+        if person.person_type() == 'Student':
+            return (person.name, person.faculty, str(person.start_date), person.address) == values[1:]
+        return person.name == values[1] and values[2] in person.faculties and person.start_date == values[3]
+
+    def _update_person(self, person, values):
+        """
+        Updates a person in place from its changed csv row, re-indexing it
+        :return: str - the reason the change can't be applied, None once applied
+        """
+        if person.person_type() == 'Student':
+            _, name, faculty, start_date, address = values
+            if faculty != person.faculty and person.courses:
+                return f'Cannot change the faculty of student {person.name} to {faculty} since he/she is enrolled ' \
+                       f'to courses of the faculty {person.faculty}'
+        else:
+            _, name, faculty, start_date = values
+            if faculty not in person.faculties and person.courses:
+                return f'Cannot change the faculty of teacher {person.name} to {faculty} since he/she teaches ' \
+                       f'courses of other faculties'
+        self._remove_person(person)
+        person.name, person.start_date = name, start_date
+        if person.person_type() == 'Student':
+            person.faculty, person.address = faculty, address
+        else:
+            if faculty not in person.faculties:
+                person.faculties = [faculty]
+            person.start_ordinal = date_to_ordinal(start_date)
+        self._add_person(person)
+        return None
+
     def load_faculties(self, file_path):
-        with open(file_path, 'r') as f:
-            courses = json.load(f)
-        self.faculties = list(set(list(map(lambda d: d['faculty'], courses))))
+        file_stat = os.stat(file_path)
+        self.faculties = list(self._cache.get(('faculties', os.path.abspath(file_path), file_stat.st_mtime_ns,
+                                               file_stat.st_size), lambda: self._read_faculties(file_path)))
 
+    @instrumented(profile=True)
     def load_courses(self, file_path):
-        with open(file_path, 'r') as jsonfile:
-            courses = json.load(jsonfile)
+        """
+        Streams the courses of a json array (like data/courses.json) or newline delimited json file into the
+        courses table, collecting the faculties in the same pass.
+        :param file_path: str - courses file path
+        :return: None
+        """
+        faculties = set()
+        for course in iter_courses(file_path):
+            self.courses.add(course)
+            faculties.add(course.faculty)
+        self.faculties = list(faculties)
+
+    def save_snapshot(self, path):
+        """
+        Saves the university (courses, faculties, persons and enrollments) to a versioned binary snapshot file.
+        :param path: str - snapshot file path
+        :return: None
+        """
+        from snapshot import write_snapshot
+        write_snapshot(self, path, self._sequence)
+
+    @instrumented(profile=True)
+    def load_snapshot(self, path):
+        """
+        Restores a university saved by save_snapshot into this (empty) university, instead of parsing the csv and
+        json source files. Snapshot contents are trusted, so the enrollment rules are not checked again.
+        Use snapshot.SnapshotReader to look up single persons of a snapshot without loading all of it.
+        :param path: str - snapshot file path
+        :return: None
+        :error handling
+            * SnapshotError if the file is not a snapshot or has an unsupported version
+        """
+        from snapshot import SnapshotReader
+        with SnapshotReader(path) as reader:
+            self.name, courses, self.faculties = reader.read_catalog()
+            self._sequence = reader.sequence
+            students, teachers = reader.read_students(), reader.read_teachers()
         for course in courses:
-            course_dict = {"id": course['id'], "name": course['name'], "faculty": course['faculty'], "points": course['points']}
-            self.courses[str(course['id'])] = course_dict
-        self.load_faculties(file_path)
+            self.courses[str(course['id'])] = course
+        points = {course['id']: course['points'] for course in courses}
+        # persons are built with their final courses and points, then every index and the leaderboard take them
+        # all at once
+        persons = [restore_student(identity_number, full_name, faculty, start_date,
+                                   restore_address(city, country, zip_code, raw_address),
+                                   self._restored_courses(course_ids),
+                                   sum(map(points.__getitem__, course_ids)))
+                   for identity_number, full_name, start_date, faculty, city, country, zip_code, raw_address, course_ids
+                   in zip(*students.values())]
+        persons += [restore_teacher(identity_number, full_name, faculties, start_date, start_ordinal or None,
+                                    self._restored_courses(course_ids))
+                    for identity_number, full_name, start_date, start_ordinal, faculties, course_ids
+                    in zip(*teachers.values())]
+        self._add_persons(persons)
+        enrollments = [(course_id, person) for person, course_ids in
+                       zip(persons, chain(students['courses'], teachers['courses'])) for course_id in course_ids]
+        self._course_index.add_many((str(course_id), person) for course_id, person in enrollments)
+        for course_id, person in enrollments:
+            record = self.courses.record(course_id)
+            if record.slots:
+                self._schedule_course(person, record)
+        for course_id, count in Counter(chain.from_iterable(students['courses'])).items():
+            self._seats.take(str(course_id), count)
+
+    def _restored_courses(self, course_ids):
+        if self.compact:
+            return CourseRefs(self.courses, course_ids)
+        return {str(course_id): self.courses[str(course_id)] for course_id in course_ids} if course_ids else {}
+
+    ''' journal methods '''
+
+    def attach_journal(self, journal):
+        """
+        Starts recording every add_student, add_teacher, add_course, remove_course, remove_person and
+        change_faculty call to the given write-ahead journal. Loads are not journaled.
+        :param journal: Journal
+        :return: None
+        """
+        self._journal = journal
+
+    def replay_journal(self, path):
+        """
+        Re-applies the journaled mutations that are newer than this university's state (its last snapshot or
+        the mutations already replayed), so the work done is proportional to the journal size.
+        :param path: str - journal file path
+        :return: int - number of replayed mutations
+        """
+        from journal import Journal
+        journal, self._journal = self._journal, None
+        replayed = 0
+        try:
+            for sequence, op, args in Journal.entries(path):
+                if sequence <= self._sequence:
+                    continue
+                if op not in JOURNALED_METHODS:
+                    raise ValueError(f'Unknown journal operation {op} (sequence {sequence})')
+                getattr(self, op)(*args)
+                self._sequence = sequence
+                replayed += 1
+        finally:
+            self._journal = journal
+        return replayed
+
+    def compact_journal(self, snapshot_path):
+        """
+        Saves a snapshot of the university and empties the attached journal, whose mutations it now includes.
+        The snapshot is written to a temporary file first, so a crash never leaves a partial snapshot behind.
+        :param snapshot_path: str - snapshot file path
+        :return: None
+        """
+        temp_path = f'{snapshot_path}.tmp'
+        self.save_snapshot(temp_path)
+        os.replace(temp_path, snapshot_path)
+        if self._journal:
+            self._journal.truncate()
+
+    def recover(self, snapshot_path, journal_path):
+        """
+        Restores the university after a restart: loads the last snapshot (when there is one), replays the journal
+        on top of it and keeps journaling to the same journal file.
+        :param snapshot_path: str - snapshot file path
+        :param journal_path: str - journal file path
+        :return: int - number of replayed mutations
+        """
+        from journal import Journal
+        if os.path.exists(snapshot_path):
+            self.load_snapshot(snapshot_path)
+        replayed = self.replay_journal(journal_path)
+        self.attach_journal(Journal(journal_path))
+        return replayed
+
+    def _record(self, op, *args):
+        self._sequence += 1
+        if self._journal:
+            self._journal.append(self._sequence, op, args)
+        if self._events is not None:
+            self._emit_event(self._sequence, op, args)
+
+    def _emit_event(self, sequence, op, args):
+        self._events.append(sequence, op, args)
+
+    def attach_event_log(self, event_log):
+        """
+        Starts emitting a change event to the given event log for every journaled mutation (add_student,
+        add_teacher, add_course, remove_course, remove_person, change_faculty and set_course_slots), including the
+        enrollments made by waitlist promotions. Like the journal, loads and reloads emit no events.
+        Subscribers of the log read only the changes, instead of polling get_courses for every person.
+        :param event_log: EventLog
+        :return: None
+        """
+        self._events = event_log
 
     def get_student_total_points(self, student_id):
-        total = 0
-        student = self.get_person_by_id(student_id)
-        for course_id in student.courses.keys():
-            total += self.courses[course_id]['points']
-        return total
+        # the student keeps the running sum of its courses points up to date on every enroll/unenroll
+        return self.get_person_by_id(student_id).points
 
-    def check_person_validity(self, person, persons_dict):
-        person_id = person.identity_number
-        person_type = person.person_type()
-        if person_id in persons_dict.keys():
-            raise ValueError(f'{person_type} with id {person_id} already exists in the university.')
+    def cache_stats(self):
+        """
+        :return: dict - hits, misses and number of entries of the derived values cache (zip codes report,
+        faculties read from courses files)
+        """
+        return self._cache.stats()
 
     def get_person_by_id(self, person_id):
         if person_id in self.students.keys():
@@ -106,15 +707,10 @@ class University:
         else:
             return None
 
-    def get_faculties(self):
-        """
-        :return: all faculties collected from all the courses the university teaches.
-        """
-        return self.faculties
-
     def remove_person(self, identity_number):
         """
-        Removes a person (student or teacher) from the University only if it has no courses enrolled to it
+        Removes a person (student or teacher) from the University only if it has no courses enrolled to it.
+        The person also leaves the waitlists it is on.
         :param identity_number: str - person (student or teacher) id number
         :return: None
         :error handling
@@ -122,14 +718,13 @@ class University:
             * PermissionError in case the person has any courses enrolled to it
         """
         person = self.get_person_by_id(identity_number)
-        person_type = person.person_type()
-        if not person:
-            raise NameError(f'Given id number {identity_number} is not listed in the university')
-        if len(person.courses) > 0:
-            raise PermissionError(
-                f"Cannot remove {person_type}: {person.name} (id: {person.identity_num}) "
-                f"since he/she is enrolled to at least 1 course")
-        self.students.pop(identity_number) if person_type == "Student" else self.teachers.pop(identity_number)
+        error = removal_error(identity_number, person)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+        self._remove_person(person)
+        self._seats.dequeue(identity_number)
+        self._record('remove_person', identity_number)
 
     def get_courses(self, identity_number):
         """
@@ -144,31 +739,252 @@ class University:
             raise NameError(f'Given id number {identity_number} is not listed in the university')
         return list(person.courses.values()) if len(person.courses) > 0 else []
 
+    def iter_person_courses(self, identity_number, faculty=None, predicate=None):
+        """
+        Generator version of get_courses, yielding the person's course dictionaries without building their list.
+        Like iterating a dictionary, enrolling or unenrolling the person while iterating raises RuntimeError.
+        :param identity_number: str - person id number
+        :param faculty: str - only the courses of this faculty
+        :param predicate: callable - only the course dictionaries it returns True for
+        :return: a generator of course dictionaries
+        :error handling
+            * NameError in case identity number is not in the system, raised on the call, not on the first next()
+        """
+        person = self.get_person_by_id(identity_number)
+        if not person:
+            raise NameError(f'Given id number {identity_number} is not listed in the university')
+        return (course for course in person.courses.values()
+                if (faculty is None or course['faculty'] == faculty) and (predicate is None or predicate(course)))
 
-    ''' assistance methods '''
-    def check_date_format(self, date_str):
+
+    ''' index methods '''
+
+    def get_students_in_faculty(self, faculty):
         """
-        Checks if the given date string is in dd/mm/yyyy format
-        :param date_str: str - date string
-        :return: bool - True if the date string is in the correct format, False otherwise
+        :param faculty: str - faculty name
+        :return: a list of the students assigned to the faculty, without scanning all students
         """
-        format = '%d/%m/%Y'
-        try:
-            result = bool(datetime.strptime(date_str, format))
-            return result
-        except ValueError:
-            return False
+        return self._student_faculty_index.get(faculty)
 
-    def compare_dates(self, date1, date2):
+    def get_teachers_in_faculty(self, faculty):
         """
-        Converts given date strings to date objects and compares between the two dates objects
-        :param date1: str - first date string
-        :param date2: str - second date string
-        :return: bool - True if date1 is similar or bigger than date2, False if otherwise
+        :param faculty: str - faculty name
+        :return: a list of the teachers teaching in the faculty, without scanning all teachers
         """
-        dt_obj1 = datetime.strptime(date1, '%d/%m/%Y')
-        dt_obj2 = datetime.strptime(date2, '%d/%m/%Y')
-        return True if dt_obj2 >= dt_obj1 else False
+        return self._teacher_faculty_index.get(faculty)
+
+    def get_persons_by_start_year(self, from_year, to_year=None):
+        """
+        Returns students and teachers that started between the two years (inclusive), ordered by start year.
+        :param from_year: int - first start year to include
+        :param to_year: int - last start year to include, by default only from_year
+        :return: a list of person objects ordered by start year
+        """
+        return self._start_year_index.range(int(from_year), int(from_year if to_year is None else to_year))
+
+    def get_students_by_city(self, city):
+        """
+        :param city: str - city name
+        :return: a list of the students living in the city
+        """
+        return self._city_index.get(city)
+
+    def get_students_by_zip_prefix(self, prefix):
+        """
+        :param prefix: str - beginning of a zip code, e.g. "61"
+        :return: a list of the students whose zip code starts with the prefix, ordered by zip code
+        """
+        return self._zip_code_index.range(str(prefix), f'{prefix}\U0010ffff')
+
+    def get_distinct_city_zip_codes(self):
+        """
+        :return: a sorted list of the distinct “city zip-code” strings of the students, e.g. “Haifa 922745”
+        """
+        return self._city_zip_code_index.keys()
+
+    def search_persons(self, query, mode='prefix', offset=0, limit=10, max_distance=None):
+        """
+        Searches students and teachers by name, without scanning all persons.
+        The name index is built on the first search and kept up to date from then on.
+        :param query: str - name or part of a name, case insensitive
+        :param mode: str - 'prefix', 'substring' or 'fuzzy' (typo tolerant, see max_distance)
+        :param offset: int - number of ranked results to skip, for paging
+        :param limit: int - page size
+        :param max_distance: int - edits a fuzzy match may be away from the query, by default 1 or 2 by query length
+        :return: a list of persons, best matches first (see search.NameIndex.search)
+        :error handling
+            * ValueError in case the mode is unknown
+        """
+        if self._name_index is None:
+            name_index = NameIndex()
+            for persons in (self._students, self._teachers):
+                for person in persons.values():
+                    name_index.add_person(person)
+            self._name_index = name_index
+        return self._name_index.search(query, mode, offset, limit, max_distance)
+
+    def get_course_roster(self, course_id):
+        """
+        :param course_id: int - course id
+        :return: a list of the persons (students and teachers) enrolled to the course, without scanning all persons
+        """
+        return self._course_index.get(str(course_id))
+
+    def _add_person(self, person):
+        if self.compact and not person.courses:
+            person.courses = CourseRefs(self.courses)
+        if person.person_type() == 'Student':
+            self._students[person.identity_number] = person
+            self._student_ids.add(person.identity_number)
+            self._student_faculty_index.add(person.faculty, person)
+            self._leaderboard.add(person)
+            self._index_address(person)
+            self._cache.invalidate('zip_codes')
+        else:
+            self._teachers[person.identity_number] = person
+            self._teacher_ids.add(person.identity_number)
+            for faculty in person.faculties:
+                self._teacher_faculty_index.add(faculty, person)
+            if person.start_ordinal is not None:
+                self._teacher_date_index.add(person.start_ordinal, person)
+        start_year = self.get_start_year(person.start_date)
+        if start_year is not None:
+            self._start_year_index.add(start_year, person)
+        if self._name_index is not None:
+            self._name_index.add_person(person)
+        self._notify_change(person.identity_number)
+
+    def _add_persons(self, persons):
+        """
+        Inserts a batch of new persons, e.g. a chunk of a bulk load: the persons dictionaries are updated once and
+        every index takes the whole batch in one call, the leaderboard sorting it at once
+        :param persons: list of Student and Teacher objects whose ids aren't in the university yet
+        """
+        students, teachers = [], []
+        for person in persons:
+            if self.compact and not person.courses:
+                person.courses = CourseRefs(self.courses)
+            (students if person.person_type() == 'Student' else teachers).append(person)
+        if students:
+            self._students.update({student.identity_number: student for student in students})
+            self._student_ids.update([student.identity_number for student in students])
+            self._student_faculty_index.add_many((student.faculty, student) for student in students)
+            self._leaderboard.add_many(students)
+            addresses = [(student.parsed_address, student) for student in students if student.parsed_address.is_valid]
+            self._city_index.add_many((address.city, student) for address, student in addresses)
+            self._zip_code_index.add_many((address.zip_code, student) for address, student in addresses)
+            self._city_zip_code_index.add_many((f'{address.city} {address.zip_code}', student)
+                                               for address, student in addresses)
+            self._cache.invalidate('zip_codes')
+        if teachers:
+            self._teachers.update({teacher.identity_number: teacher for teacher in teachers})
+            self._teacher_ids.update([teacher.identity_number for teacher in teachers])
+            self._teacher_faculty_index.add_many((faculty, teacher) for teacher in teachers
+                                                 for faculty in teacher.faculties)
+            self._teacher_date_index.add_many((teacher.start_ordinal, teacher) for teacher in teachers
+                                              if teacher.start_ordinal is not None)
+        # a batch has few distinct start dates, each is parsed once
+        start_years = {start_date: self.get_start_year(start_date)
+                       for start_date in {person.start_date for person in persons}}
+        self._start_year_index.add_many((start_years[person.start_date], person) for person in persons
+                                        if start_years[person.start_date] is not None)
+        if self._name_index is not None:
+            for person in persons:
+                self._name_index.add_person(person)
+        if self._change_listeners:
+            for person in persons:
+                self._notify_change(person.identity_number)
+
+    def _remove_person(self, person):
+        if person.person_type() == 'Student':
+            self._students.pop(person.identity_number)
+            self._student_ids.discard(person.identity_number)
+            self._student_faculty_index.remove(person.faculty, person)
+            self._leaderboard.remove(person)
+            self._unindex_address(person)
+            self._cache.invalidate('zip_codes')
+        else:
+            self._teachers.pop(person.identity_number)
+            self._teacher_ids.discard(person.identity_number)
+            for faculty in person.faculties:
+                self._teacher_faculty_index.remove(faculty, person)
+            if person.start_ordinal is not None:
+                self._teacher_date_index.remove(person.start_ordinal, person)
+        start_year = self.get_start_year(person.start_date)
+        if start_year is not None:
+            self._start_year_index.remove(start_year, person)
+        if self._name_index is not None:
+            self._name_index.remove_person(person)
+        self._notify_change(person.identity_number)
+
+    def _index_address(self, student):
+        address = student.parsed_address
+        if address.is_valid:
+            self._city_index.add(address.city, student)
+            self._zip_code_index.add(address.zip_code, student)
+            self._city_zip_code_index.add(f'{address.city} {address.zip_code}', student)
+
+    def _unindex_address(self, student):
+        address = student.parsed_address
+        if address.is_valid:
+            self._city_index.remove(address.city, student)
+            self._zip_code_index.remove(address.zip_code, student)
+            self._city_zip_code_index.remove(f'{address.city} {address.zip_code}', student)
+
+    def _enroll(self, person, course):
+        faculties = list(person.faculties) if person.person_type() == 'Teacher' else None
+        person.add_course(course)
+        self._course_index.add(str(course['id']), person)
+        self._schedule_course(person, self.courses.record(course['id']))
+        if faculties is not None:
+            self._reindex_teacher_faculties(person, faculties)
+        else:
+            self._leaderboard.update(person)
+            self._seats.take(str(course['id']))
+        self._notify_change(person.identity_number)
+
+    def _unenroll(self, person, course):
+        faculties = list(person.faculties) if person.person_type() == 'Teacher' else None
+        person.remove_course(course)
+        self._course_index.remove(str(course['id']), person)
+        record = self.courses.record(course['id'])
+        if record.slots:
+            schedule = self._schedules[person.identity_number]
+            schedule.remove(str(record.course_id), record.slots)
+            if not schedule:
+                del self._schedules[person.identity_number]
+        if faculties is not None:
+            self._reindex_teacher_faculties(person, faculties)
+        else:
+            self._leaderboard.update(person)
+            self._seats.release(str(course['id']))
+        self._notify_change(person.identity_number)
+
+    def _schedule_course(self, person, record):
+        if record.slots:
+            self._schedules.setdefault(person.identity_number, Schedule()).add(str(record.course_id), record.slots)
+
+    def add_change_listener(self, listener):
+        """
+        Registers a callback called with the identity number of every person added, removed, re-assigned or whose
+        enrollments changed, by any method (loads and snapshot restores included).
+        :param listener: callable - listener(identity_number)
+        :return: None
+        """
+        self._change_listeners.append(listener)
+
+    def remove_change_listener(self, listener):
+        self._change_listeners.remove(listener)
+
+    def _notify_change(self, identity_number):
+        for listener in self._change_listeners:
+            listener(identity_number)
+
+    def _reindex_teacher_faculties(self, teacher, old_faculties):
+        for faculty in set(old_faculties) - set(teacher.faculties):
+            self._teacher_faculty_index.remove(faculty, teacher)
+        for faculty in set(teacher.faculties) - set(old_faculties):
+            self._teacher_faculty_index.add(faculty, teacher)
 
     ''' courses methods '''
     def get_course_by_id(self, course_id):
@@ -179,6 +995,7 @@ class University:
         """
         return self.courses[str(course_id)] if str(course_id) in self.courses.keys() else None
 
+    @instrumented()
     def add_course(self, person_id, course_id):
         """
         Adds the course (by id) to the person with the given identity_number.
@@ -187,37 +1004,75 @@ class University:
         :return: None
         :error handling
             * ValueError in case person id or course id is missing
+            * CourseFullError (a PermissionError) in case a student asks for a course with no free seats
         """
-        if not self.get_person_by_id(person_id):
+        person = self.get_person_by_id(person_id)
+        if not person:
             raise ValueError(f'Person with id {person_id} does not exist.')
-        if str(course_id) not in self.courses.keys():
+        course = self.get_course_by_id(course_id)
+        if not course:
             raise ValueError(f'Course with id {course_id} does not exist.')
-        person = self.get_person_by_id(person_id)
-        course = self.get_course_by_id(str(course_id))
-        person_type = person.person_type()
-        if str(course_id) in person.courses.keys():
-            raise ValueError(
-                f'The course id {course_id} ({course.name}) is already enrolled to {person_type} {person.name} id: {person.identity_num}')
-        if person_type == 'Teacher':
-            if len(person.faculties) == 3 and course.faculty not in person.faculties:
-                raise PermissionError(
-                    f"Cannot add course '{course.name}' (id: {course_id}, faculty: {course.faculty}) to {person_type} "
-                    f"{person.name} (id: {person_id}) since he/she already teaches in 3 other faculties")
-            if len(person.courses) == 12:
-                raise PermissionError(
-                    f"Cannot add course '{course.name}' (id: {course_id}, faculty: {course.faculty}) to {person_type} "
-                    f"{person.name} (id: {person_id}) since he/she already teaches in 12 courses")
-        if person_type == 'Student':
-            student_tot_points = self.get_student_total_points(person_id)
-            if course['faculty'] != person.faculty:
-                raise PermissionError(
-                    f'Cannot add course "{course.name}" (id: {course_id}) since it does not belong to the assigned faculty '
-                    f'of student {person.name} (id: {person_id})')
-            if student_tot_points + course['points'] > 30:
-                raise PermissionError(
-                    f'Cannot add course "{course.name}" (id: {course_id}) since student {person.name} total courses points will exceed 30 points')
-        person.add_course(course)
+        error = self._person_enrollment_error(person, course)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+        self._enroll(person, course)
+        self._record('add_course', person_id, course_id)
 
+    @instrumented(rows=len)
+    def add_courses_bulk(self, pairs, all_or_nothing=False):
+        """
+        Adds a batch of (person id, course id) enrollments, checking the same rules as add_course.
+        The rules are checked against per person running totals (courses, points, faculties) computed once for the
+        whole batch, so pairs of the same person in the batch are checked against each other too.
+        :param pairs: iterable of (person id, course id) tuples
+        :param all_or_nothing: bool - when True nothing is enrolled if any pair is rejected, otherwise
+        (best effort) every accepted pair is enrolled
+        :return: a list of EnrollmentResult (person_id, course_id, accepted, reason, error_type), one per pair in the
+        given order; error_type is the exception add_course would have raised for a rejected pair
+        """
+        results, accepted = self._enrollment_results(self._check_enrollments(pairs), all_or_nothing)
+        for person, course in accepted:
+            self._enroll(person, course)
+            self._record('add_course', person.identity_number, course['id'])
+        return results
+
+    def _batch_schedule(self, person_id):
+        return self._schedules.get(person_id)
+
+    def _course_slots(self, course_key):
+        return self.courses.record(course_key).slots
+
+    def _schedule_conflict_error(self, person, course, schedule=None):
+        record = self.courses.record(course['id'])
+        if schedule is None:
+            schedule = self._schedules.get(person.identity_number)
+        if not record.slots or schedule is None:
+            return None
+        clash = schedule.conflict(record.slots)
+        if clash is None:
+            return None
+        return ScheduleConflictError, f'Cannot add course "{course["name"]}" (id: {course["id"]}) to ' \
+                                      f'{person.person_type()} {person.name} (id: {person.identity_number}) since ' \
+                                      f'its time slots clash with course {clash}'
+
+    def _enrollment_error(self, person, course, course_ids, faculties, points, pending_seats=0, schedule=None):
+        """
+        Checks the enrollment rules (see enrollment_rule_error), time slot clashes and the free seats of the course
+        :param pending_seats: int - seats of the course already given to students of the same batch
+        :param schedule: Schedule - the person's busy time slots, by default its current schedule
+        :return: tuple - (exception type, message) of the broken rule, None if the enrollment is allowed
+        """
+        error = super()._enrollment_error(person, course, course_ids, faculties, points)
+        if error is None:
+            error = self._schedule_conflict_error(person, course, schedule)
+        if error is None and person.person_type() == 'Student' and \
+                self._seats.free_seats(str(course['id']), pending_seats) == 0:
+            return CourseFullError, f'Cannot add course "{course["name"]}" (id: {course["id"]}) since all its ' \
+                                    f'{self._seats.capacity(str(course["id"]))} seats are taken'
+        return error
+
+    @instrumented()
     def remove_course(self, person_id, course_id):
         """
         Removes the course from the correct person (student/teacher)
@@ -228,6 +1083,7 @@ class University:
             * given person id doesn't exist, raise ValueError
             * given course id doesn't, raise ValueError
             * If the person isn’t enrolled in the course, do nothing.
+        The seat freed by a student goes to the next person of the course waitlist.
         """
         person = self.get_person_by_id(person_id)
         if not person:
@@ -236,7 +1092,144 @@ class University:
             raise ValueError(f'course with id {course_id} is not listed in the university.')
         if str(course_id) in person.courses.keys():
             course = self.get_course_by_id(course_id)
-            person.remove_course(course)
+            self._unenroll(person, course)
+            self._record('remove_course', person_id, course_id)
+            self._promote_waitlist(str(course_id))
+
+    ''' timetable methods '''
+
+    def set_course_slots(self, course_id, slots):
+        """
+        Sets the weekly time slots of a course. Enrollments to courses with time slots are checked for clashes
+        with the other courses of the person.
+        :param course_id: int - course id
+        :param slots: list of str - time slots, e.g. ["Mon 10:00-12:00", "Wed 10:00-11:00"], empty for no slots
+        :return: None
+        :error handling
+            * ValueError in case the course doesn't exist or a slot is invalid
+            * PermissionError in case persons are enrolled to the course
+        """
+        if str(course_id) not in self.courses:
+            raise ValueError(f'course with id {course_id} is not listed in the university.')
+        if self._course_index.count(str(course_id)):
+            raise PermissionError(f'Cannot change the time slots of course {course_id} since persons are enrolled to it')
+        record = self.courses.record(course_id)
+        self.courses.add(Course(record.course_id, record.name, record.faculty, record.points, slots))
+        self._record('set_course_slots', course_id, list(slots))
+
+    def get_schedule(self, identity_number):
+        """
+        :param identity_number: str - person id number
+        :return: a list of (time slot, course id) tuples of the person's timed courses, sorted by time
+        """
+        schedule = self._schedules.get(identity_number)
+        return schedule.slots() if schedule is not None else []
+
+    def assign_teachers(self, course_ids=None, apply=False):
+        """
+        Assigns teachers to courses with a greedy solver (see timetable.assign_teachers) that keeps every teacher
+        within 3 faculties and 12 courses and its time slots free of clashes.
+        :param course_ids: iterable of int - courses to staff, by default every course no teacher teaches
+        :param apply: bool - enroll the assigned teachers to their courses
+        :return: dict - course id to the identity number of its assigned teacher, courses no teacher fits are left out
+        """
+        if course_ids is None:
+            course_ids = [course_id for course_id in self.courses
+                          if not any(person.person_type() == 'Teacher' for person in self.get_course_roster(course_id))]
+        assignments = assign_teachers([self.courses.record(course_id) for course_id in course_ids],
+                                      self._teachers.values(), self._schedules)
+        if apply:
+            self.add_courses_bulk([(teacher_id, course_id) for course_id, teacher_id in assignments.items()])
+        return assignments
+
+    ''' seats methods '''
+
+    def set_course_capacity(self, course_id, capacity):
+        """
+        Limits the number of students enrolled to a course. Teachers don't take seats.
+        Capacities and waitlists are registration state: they are not journaled nor saved in snapshots.
+        :param course_id: int - course id
+        :param capacity: int - number of seats, None for unlimited seats
+        :return: None
+        :error handling
+            * ValueError in case the course doesn't exist or the capacity isn't a non negative int
+        """
+        if str(course_id) not in self.courses:
+            raise ValueError(f'course with id {course_id} is not listed in the university.')
+        if capacity is not None and (not isinstance(capacity, int) or capacity < 0):
+            raise ValueError(f'Invalid capacity {capacity}. Capacity should be a non negative number of seats')
+        self._seats.set_capacity(str(course_id), capacity)
+        self._promote_waitlist(str(course_id))
+
+    def get_course_seats(self, course_id):
+        """
+        :param course_id: int - course id
+        :return: dict - capacity (None if unlimited), taken seats, free seats (None if unlimited) and number of
+        waiting persons of the course
+        """
+        course_key = str(course_id)
+        return {'capacity': self._seats.capacity(course_key), 'taken': self._seats.taken(course_key),
+                'free': self._seats.free_seats(course_key), 'waiting': self._seats.waiting(course_key)}
+
+    def get_waitlist(self, course_id):
+        """
+        :param course_id: int - course id
+        :return: a list of the ids of the persons waiting for a seat in the course, next to be promoted first
+        """
+        return self._seats.waitlist(str(course_id))
+
+    def request_seat(self, person_id, course_id, priority=0):
+        """
+        Enrolls the person to the course like add_course, or puts it on the course waitlist when the course is full.
+        Waiting persons are promoted by priority (higher first), equal priorities in request order (FIFO).
+        :param person_id: str - identity number of the person
+        :param course_id: int - course id
+        :param priority: int - waitlist priority
+        :return: str - 'enrolled' or 'waitlisted'
+        :error handling
+            * same as add_course, except for full courses
+        """
+        try:
+            self.add_course(person_id, course_id)
+        except CourseFullError:
+            self._seats.enqueue(str(course_id), person_id, priority)
+            return 'waitlisted'
+        return 'enrolled'
+
+    @instrumented(rows=len)
+    def allocate_seats(self, requests):
+        """
+        Runs a batched seat allocation round: the requests are served by priority (higher first, equal priorities
+        in the given order), the rules are checked once for the whole batch like add_courses_bulk, and the requests
+        for courses that ran out of seats are put on the course waitlists.
+        :param requests: iterable of (person id, course id) or (person id, course id, priority) tuples
+        :return: a list of AllocationResult (person_id, course_id, status, reason), one per request in the given
+        order, status is 'enrolled', 'waitlisted' or 'rejected'
+        """
+        requests = [tuple(request) if len(request) == 3 else (*request, 0) for request in requests]
+        order = sorted(range(len(requests)), key=lambda i: -requests[i][2])
+        results = [None] * len(requests)
+        checked = self._check_enrollments(requests[i][:2] for i in order)
+        for i, (person_id, course_id, person, course, error) in zip(order, checked):
+            if not error:
+                self._enroll(person, course)
+                self._record('add_course', person_id, course_id)
+                results[i] = AllocationResult(person_id, course_id, 'enrolled', None)
+            elif error[0] is CourseFullError:
+                self._seats.enqueue(str(course_id), person_id, requests[i][2])
+                results[i] = AllocationResult(person_id, course_id, 'waitlisted', error[1])
+            else:
+                results[i] = AllocationResult(person_id, course_id, 'rejected', error[1])
+        return results
+
+    def _promote_waitlist(self, course_key):
+        course = self.courses[course_key]
+        while self._seats.waiting(course_key) and self._seats.free_seats(course_key) != 0:
+            person = self.get_person_by_id(self._seats.pop_next(course_key))
+            # persons removed, or who can no longer take the course, lose their place
+            if person and not self._person_enrollment_error(person, course):
+                self._enroll(person, course)
+                self._record('add_course', person.identity_number, course['id'])
 
     def list_courses(self):
         """
@@ -244,10 +1237,38 @@ class University:
         """
         return list(self.courses.values())
 
+    def iter_courses(self, faculty=None, predicate=None):
+        """
+        Generator over the courses offered, in list_courses order, without building their list. Courses change
+        only on load_courses: like iterating a dictionary, loading courses while iterating raises RuntimeError.
+        :param faculty: str - only the courses of this faculty
+        :param predicate: callable - only the course dictionaries it returns True for
+        :return: a generator of course dictionaries
+        """
+        for course_id, record in self.courses.records():
+            if faculty is not None and record.faculty != faculty:
+                continue
+            course = self.courses[course_id]
+            if predicate is None or predicate(course):
+                yield course
+
     ''' students methods '''
     def get_students(self):
         return list(self.students.values())
 
+    def page_students(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        """
+        Returns one page of the students, ordered by identity number
+        :param cursor: str - the cursor returned with the previous page, None for the first page
+        :param limit: int - page size
+        :param faculty: str - only the students of this faculty
+        :param start_year: int - only the students started in this year
+        :param predicate: callable - only the students it returns True for
+        :return: tuple - (list of students, cursor of the next page or None after the last page)
+        """
+        return self._page(self._students, self._student_ids, self._student_faculty_index, cursor, limit, faculty,
+                          start_year, predicate)
+
     def get_number_of_students(self):
         return len(self.students)
 
@@ -263,17 +1284,17 @@ class University:
             * PermissionError If the student has courses enrolled in it from another faculty,
             * ValueError in case the faculty isn't listed in the University
         """
-        if identity_number not in self.students.keys() or identity_number in self.teachers.keys():
-            raise NameError(f'Given id number {identity_number} is not in the system')
-        if faculty not in self.faculties:
-            raise ValueError(f"Given faculty: {faculty} is not listed in the university")
-        student = self.get_person_by_id(identity_number)
-        if len(student.courses) > 0 and student.faculty != faculty:
-            raise PermissionError(
-                f"Cannot change the faculty for student: {student.name} since he is enrolled to courses in "
-                f"the faculty: {student.faculty}")
-        if len(student.courses) == 0 and student.faculty != faculty:
+        student = self.students.get(identity_number)
+        error = faculty_change_error(identity_number, student, faculty, self.faculties)
+        if error:
+            error_type, message = error
+            raise error_type(message)
+        if student.faculty != faculty:
+            self._student_faculty_index.remove(student.faculty, student)
             student.faculty = faculty
+            self._student_faculty_index.add(faculty, student)
+            self._notify_change(identity_number)
+            self._record('change_faculty', identity_number, faculty)
 
     def add_student(self, identity_number, full_name, faculty, start_date, address):
         """
@@ -290,15 +1311,9 @@ class University:
             * ValueError if the given faculty does not exist in the university
             * TypeError if start_year isn’t in the yyyy date format,
         """
-        if identity_number in self.students.keys() or identity_number in self.teachers.keys():
-            raise NameError(f'Given id number {identity_number} is already in the university')
-        if not identity_number.isdigit() or len(identity_number) != 9:
-            raise PermissionError(f'Invalid id number {identity_number}. ID number should be 9 digits')
-        if faculty not in self.faculties:
-            raise ValueError(f"Given faculty '{faculty}' is not listed in the university")
-        if not str(start_date).isdigit() or len(str(start_date)) != 4:
-            raise TypeError(f'Invalid start year format. Start year must be in the yyyy format')
-        self.students[identity_number] = Student(identity_number, full_name, faculty=faculty, start_date=start_date, address=address)
+        self._check_new_person('Student', identity_number, faculty, start_date)
+        self._add_person(Student(identity_number, full_name, faculty=faculty, start_date=start_date, address=address))
+        self._record('add_student', identity_number, full_name, faculty, start_date, address)
 
     ''' teachers methods '''
 
@@ -309,6 +1324,45 @@ class University:
         """
         return list(self.teachers.values())
 
+    def page_teachers(self, cursor=None, limit=100, faculty=None, start_year=None, predicate=None):
+        """
+        Returns one page of the teachers, ordered by identity number
+        :param cursor: str - the cursor returned with the previous page, None for the first page
+        :param limit: int - page size
+        :param faculty: str - only the teachers teaching in this faculty
+        :param start_year: int - only the teachers started in this year
+        :param predicate: callable - only the teachers it returns True for
+        :return: tuple - (list of teachers, cursor of the next page or None after the last page)
+        """
+        return self._page(self._teachers, self._teacher_ids, self._teacher_faculty_index, cursor, limit, faculty,
+                          start_year, predicate)
+
+    def _page(self, persons, ids, faculty_index, cursor, limit, faculty, start_year, predicate):
+        buckets = []
+        if faculty is not None:
+            buckets.append(faculty_index.ids(faculty))
+        if start_year is not None:
+            buckets.append(self._start_year_index.ids(int(start_year)))
+
+        def matches(person_id):
+            return person_id in persons and all(person_id in bucket for bucket in buckets) and \
+                (predicate is None or predicate(persons[person_id]))
+
+        # walking the sorted ids costs about limit * len(ids) / len(bucket) checks, picking the smallest ids of
+        # the smallest filter bucket costs len(bucket): take the cheaper one
+        smallest = min(buckets, key=len) if buckets else None
+        if smallest is not None and len(smallest) ** 2 < limit * len(ids):
+            page = heapq.nsmallest(limit, (person_id for person_id in smallest
+                                           if (cursor is None or person_id > cursor) and matches(person_id)))
+        else:
+            page = []
+            for person_id in ids.iter_after(cursor, max(limit, 256)):
+                if matches(person_id):
+                    page.append(person_id)
+                    if len(page) == limit:
+                        break
+        return [persons[person_id] for person_id in page], page[-1] if len(page) == limit else None
+
     def get_number_of_teachers(self):
         """
         Returns the number of teachers enrolled in the university
@@ -330,18 +1384,20 @@ class University:
             * ValueError if the given faculty does not exist in the university
             * TypeError if start_year isn’t in the dd/mm/yyyy date format,
         """
-        if identity_number in self.students.keys() or identity_number in self.teachers.keys():
-            raise NameError(f'Given id number {identity_number} is already in the university')
-        if not identity_number.isdigit() or len(identity_number) != 9:
-            raise PermissionError(f'Invalid id number {identity_number}. ID number should be 9 digits')
-        if faculty not in self.faculties:
-            raise ValueError(f"Given faculty '{faculty}' is not listed in the university")
-        if not self.check_date_format(start_date):
-            raise TypeError(f"Given start date '{start_date}' is not in the correct format (dd/mm/yyyy)")
-        self.teachers[identity_number] = Teacher(identity_number, full_name, faculty=faculty, start_date=start_date)
+        self._check_new_person('Teacher', identity_number, faculty, start_date)
+        self._add_person(Teacher(identity_number, full_name, faculty=faculty, start_date=start_date))
+        self._record('add_teacher', identity_number, full_name, faculty, start_date)
+
+    def _check_new_person(self, person_type, identity_number, faculty, start_date):
+        listed = identity_number in self.students or identity_number in self.teachers
+        error = new_person_error(person_type, identity_number, faculty, start_date, listed, self.faculties)
+        if error:
+            error_type, message = error
+            raise error_type(message)
 
     ''' general methods '''
 
+    @instrumented(rows=len)
     def get_top_10_students(self):
         """
         Return a list of students “full name”. Sorted by total course points (high to low).
@@ -349,26 +1405,47 @@ class University:
         (Descending: Z to A).
         :return: a list of the top 10 students with most course points taken.
         """
-        students_list_sorted_by_points = sorted(self.get_students(), key=lambda x: (x.points, x.name), reverse=True)
-        students_names = list(map(lambda student: student.name, students_list_sorted_by_points))
-        return list(islice(students_names, 10))
+        return self.get_top_students(10)
 
+    @instrumented(rows=len)
+    def get_top_students(self, k):
+        """
+        Return a list of the k best students “full name”, ranked like get_top_10_students.
+        Served from the maintained leaderboard, so no sort of the students is done.
+        :param k: int - number of students to return
+        :return: a list of the full names of the top k students
+        """
+        return [student.name for student in self._leaderboard.top(k)]
+
+    def get_student_rank(self, identity_number):
+        """
+        Returns the position of the student in the get_top_students ranking
+        :param identity_number: str - student id number
+        :return: int - 1 based rank of the student
+        :error handling
+            * NameError in case identity number is not a student of the university
+        """
+        rank = self._leaderboard.rank(identity_number)
+        if rank is None:
+            raise NameError(f'Given id number {identity_number} is not a student of the university')
+        return rank
+
+    @instrumented(rows=len)
     def get_students_zip_code(self):
         """
         Returns a sorted unique list of strings with the student's city and zip codes - “city zip-code” format,
         e.g. “Haifa 922745”.
-        :return: a unique (=no repetitions) list of all the students' zip code and cities in “city zip-code” format
-        sorted alphabetically (from a to z).
-        """
-        if len(self.get_students()) == 0:
-            return []
-        zipcode_list = []
-        for s in self.students.values():
-            address = s.address
-            city, country, zip_code = tuple(address.split(','))
-            zipcode_list.append(f'{city.strip()} {zip_code.strip()}')
-        return sorted(zipcode_list)
+        :return: a unique (=no repetitions) tuple of all the students' zip code and cities in “city zip-code” format
+        sorted alphabetically (from a to z). The tuple is cached until the students change, so it is immutable.
+        """
+        return self._cache.get('zip_codes', self._compute_students_zip_code)
+
+    def _compute_students_zip_code(self):
+        # the index keys are already sorted, students whose address isn't "city, country, zip-code" are skipped
+        index = self._city_zip_code_index
+        return tuple(city_zip_code for city_zip_code in index.keys() for _ in range(index.count(city_zip_code)))
 
+    @instrumented(rows=len)
     def get_teachers_from(self, date_str):
         """
         Returns a sorted list of teachers' names of all teachers started after the given date, sorted by dates (old to new).
@@ -380,8 +1457,41 @@ class University:
             * ValueError - If the given date isn’t in dd/mm/yyyy format
             * if no teachers match the given date, return an empty list
         """
-        if not self.check_date_format(date_str):
+        start_ordinal = date_to_ordinal(date_str)
+        if start_ordinal is None:
             raise ValueError(f'Given date: {date_str} is not in dd/mm/yyyy format')
-        teachers_list = [t for t in self.get_teachers() if self.compare_dates(date_str, t.start_date)]
-        teachers_list.sort(key=lambda x: (datetime.strptime(x.start_date, '%d/%m/%Y'), x.name))
-        return list(map(lambda x: (x.name, x.start_date), teachers_list))
+        return list(self._teachers_in_date_range(start_ordinal, None))
+
+    def iter_teachers_from(self, date_str):
+        """
+        Generator version of get_teachers_from, yielding the (name, start date) tuples one start date at a time
+        :error handling
+            * ValueError - If the given date isn’t in dd/mm/yyyy format, raised on the call, not on the first next()
+        """
+        start_ordinal = date_to_ordinal(date_str)
+        if start_ordinal is None:
+            raise ValueError(f'Given date: {date_str} is not in dd/mm/yyyy format')
+        return self._teachers_in_date_range(start_ordinal, None)
+
+    @instrumented(rows=len)
+    def get_teachers_between(self, start_date, end_date):
+        """
+        Returns the teachers that started between the two dates (inclusive), sorted like get_teachers_from.
+        :param start_date: str - first start date in dd/mm/yyyy format.
+        :param end_date: str - last start date in dd/mm/yyyy format.
+        :return: a list of (name, start date) tuples of the teachers started in the given range sorted by dates
+        (old to new) and names (A to Z).
+        :error handling
+            * ValueError - If any of the given dates isn’t in dd/mm/yyyy format
+            * if no teachers match the given dates, return an empty list
+        """
+        start_ordinal, end_ordinal = date_to_ordinal(start_date), date_to_ordinal(end_date)
+        for date_str, ordinal in ((start_date, start_ordinal), (end_date, end_ordinal)):
+            if ordinal is None:
+                raise ValueError(f'Given date: {date_str} is not in dd/mm/yyyy format')
+        return list(self._teachers_in_date_range(start_ordinal, end_ordinal))
+
+    def _teachers_in_date_range(self, start_ordinal, end_ordinal):
+        for ordinal in self._teacher_date_index.range_keys(start_ordinal, end_ordinal):
+            for teacher in sorted(self._teacher_date_index.get(ordinal), key=lambda x: x.name):
+                yield teacher.name, teacher.start_date
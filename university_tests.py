@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from university import University
 
@@ -185,6 +187,903 @@ class UniversityTest(unittest.TestCase):
         teachers_from = uni.get_teachers_from("01/01/1990")
         self.assertEqual(len(teachers_from), 20)
 
+    def test_load_students_bulk(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        report = uni.load_students_bulk(students_file_path, chunk_size=7)
+        self.assertEqual(report.rows, 20)
+        self.assertEqual(report.loaded, 20)
+        self.assertEqual(report.rejects, [])
+        self.assertEqual(uni.get_number_of_students(), 20)
+        report = uni.load_students_bulk(students_file_path)
+        self.assertEqual(report.loaded, 0)
+        self.assertEqual(len(report.rejects), 20)
+        self.assertEqual(report.rejects[0]['identity_number'], "645591116")
+        # the batch insert builds the same indexes as loading row by row
+        rows = University("my_uny")
+        rows.load_courses(courses_file_path)
+        rows.load_students(students_file_path)
+        self.assertEqual(uni.get_top_students(20), rows.get_top_students(20))
+        self.assertEqual(uni.get_students_zip_code(), rows.get_students_zip_code())
+        ids = lambda persons: [person.identity_number for person in persons]
+        self.assertEqual(ids(uni.get_persons_by_start_year(2000, 2010)),
+                         ids(rows.get_persons_by_start_year(2000, 2010)))
+        self.assertEqual(ids(uni.get_students_by_city("Lisbon")), ids(rows.get_students_by_city("Lisbon")))
+        self.assertEqual(ids(uni.iter_students()), ids(rows.iter_students()))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'students.csv')
+            with open(path, 'w') as f:
+                f.write('identity_number,full_name,faculty,start_date,address\n\n'
+                        '123456789,New Student,Arts,2020,"Eilat, Israel, 881000"\n'
+                        '123456780,,Arts\n')
+            report = uni.load_students_bulk(path)
+        self.assertEqual(report.rows, 2)
+        self.assertEqual(report.rejects, [{'row': 2, 'identity_number': '123456780',
+                                           'reason': 'missing fields: full_name, start_date, address'}])
+        self.assertEqual(uni.get_person_by_id("123456789").address, "Eilat, Israel, 881000")
+
+    def test_load_teachers_bulk(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        report = uni.load_teachers_bulk(teachers_file_path, chunk_size=3)
+        self.assertEqual(report.loaded, 20)
+        self.assertEqual(len(uni.get_teachers()), 20)
+
+    def test_faculty_and_start_year_indexes(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_students(students_file_path)
+        uni.load_teachers(teachers_file_path)
+        humanities = uni.get_students_in_faculty("Humanities & Liberal Arts")
+        self.assertEqual({s.identity_number for s in humanities}, {"995262665", "970138793", "953020087", "409737565"})
+        uni.add_student("883720579", "Sandie Leifeste", "Arts", "2008", "Rio Branco, Bulgaria, 6196762")
+        uni.change_faculty("883720579", "Health")
+        self.assertEqual(uni.get_students_in_faculty("Arts"), [])
+        self.assertIn(uni.get_person_by_id("883720579"), uni.get_students_in_faculty("Health"))
+        persons = uni.get_persons_by_start_year(2008)
+        self.assertIn(uni.get_person_by_id("883720579"), persons)
+        years = [uni.get_start_year(p.start_date) for p in uni.get_persons_by_start_year(2000, 2010)]
+        self.assertEqual(years, sorted(years))
+        self.assertTrue(all(2000 <= year <= 2010 for year in years))
+
+    def test_course_roster_index(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.add_student("718929205", "Cindelyn Han", "Agriculture & Natural Resources", "2007",
+                        "Shanghai, Egypt, 8440710")
+        uni.add_teacher("329622030", "Luci Erskine", "Communications & Journalism", "05/02/2003")
+        uni.add_course('718929205', 1100)
+        uni.add_course('329622030', 1100)
+        self.assertEqual([p.identity_number for p in uni.get_course_roster(1100)], ['718929205', '329622030'])
+        self.assertEqual(uni.get_teachers_in_faculty("Agriculture & Natural Resources"),
+                         [uni.get_person_by_id('329622030')])
+        uni.remove_course('329622030', 1100)
+        self.assertEqual(uni.get_teachers_in_faculty("Agriculture & Natural Resources"), [])
+        self.assertEqual([p.identity_number for p in uni.get_course_roster(1100)], ['718929205'])
+
+    def test_leaderboard_matches_full_sort(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_students(students_file_path)
+        uni.add_student("883720579", "Jere Cressida", "Psychology & Social Work", "2008", "Rio Branco, Bulgaria, 6196762")
+        uni.add_course("645591116", 5200)
+        uni.add_course("883720579", 5200)
+        uni.add_course("885227800", 5200)
+        uni.add_course("885227800", 5201)
+        uni.add_course("547526213", 3201)
+        uni.remove_course("885227800", 5201)
+        expected = sorted(uni.get_students(), key=lambda x: (x.points, x.name), reverse=True)
+        self.assertEqual(uni.get_top_students(21), [s.name for s in expected])
+        self.assertEqual(uni.get_student_rank(expected[0].identity_number), 1)
+        self.assertEqual(uni.get_student_rank("645591116"), 2)
+        self.assertEqual(uni.get_student_rank("883720579"), 3)
+        self.assertEqual(uni.get_person_by_id("885227800").points, 5.5)
+        with self.assertRaises(NameError):
+            uni.get_student_rank("000000000")
+        # tiny blocks: ranks stay right through block splits, drops and in-place updates
+        from indexes import Leaderboard
+        board = Leaderboard()
+        board.BLOCK_SIZE = 2
+        students = uni.get_students()
+        for student in students:
+            board.add(student)
+        for student in students[::3]:
+            board.remove(student)
+        board.rank(students[1].identity_number)
+        board.add(students[0])
+        board.remove(students[4])
+        ranked = board.top(len(students))
+        self.assertEqual([board.rank(s.identity_number) for s in ranked], list(range(1, len(ranked) + 1)))
+
+    def test_get_teachers_from_order(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_teachers(teachers_file_path)
+        uni.add_teacher("329622031", "Luci Erskine", "Communications & Journalism", "14/05/1996")
+        uni.add_teacher("971169961", "Adda Fillbert", "Education", "14/05/1996")
+        teachers = sorted(uni.get_teachers(), key=lambda t: (uni.get_start_year(t.start_date),
+                                                             t.start_date[3:5], t.start_date[:2], t.name))
+        expected = [(t.name, t.start_date) for t in teachers if uni.compare_dates("14/05/1996", t.start_date)]
+        self.assertEqual(uni.get_teachers_from("14/05/1996"), expected)
+        self.assertEqual(uni.get_teachers_from("01/01/2100"), [])
+        with self.assertRaises(ValueError):
+            uni.get_teachers_from("1996-05-14")
+
+    def test_get_teachers_between(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_teachers(teachers_file_path)
+        teachers = uni.get_teachers_between("01/01/2000", "31/12/2009")
+        self.assertEqual(teachers, [t for t in uni.get_teachers_from("01/01/2000")
+                                    if uni.get_start_year(t[1]) <= 2009])
+        self.assertIn(("Sallie Keily", "01/03/2005"), teachers)
+        self.assertEqual(uni.get_teachers_between("01/03/2005", "01/03/2005"), [("Sallie Keily", "01/03/2005")])
+
+    def test_compact_storage(self):
+        uni = University("my_uny", compact=True)
+        uni.load_courses(courses_file_path)
+        uni.add_student("718929205", "Cindelyn Han", "Agriculture & Natural Resources", "2007",
+                        "Shanghai, Egypt, 8440710")
+        uni.add_teacher("329622030", "Luci Erskine", "Communications & Journalism", "05/02/2003")
+        uni.add_course('718929205', 1100)
+        uni.add_course('718929205', 1101)
+        uni.add_course('329622030', 1100)
+        cindelyn = uni.get_person_by_id('718929205')
+        self.assertFalse(hasattr(cindelyn, '__dict__'))
+        self.assertIs(uni.get_courses('718929205')[0], uni.get_course_by_id(1100))
+        self.assertEqual([c["id"] for c in uni.get_courses('718929205')], [1100, 1101])
+        self.assertEqual(cindelyn.points, 4.5)
+        uni.remove_course('718929205', 1100)
+        uni.remove_course('329622030', 1100)
+        self.assertEqual(list(cindelyn.courses.keys()), ['1101'])
+        self.assertEqual(cindelyn.points, 2.5)
+        self.assertEqual(uni.get_person_by_id('329622030').faculties, ["Communications & Journalism"])
+
+    def test_load_shards(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        reports = uni.load_shards([students_file_path, students_file_path], [teachers_file_path], processes=2)
+        self.assertEqual([r.loaded for r in reports], [20, 0, 20])
+        self.assertEqual(len(reports[1].rejects), 20)
+        self.assertEqual(uni.get_number_of_students(), 20)
+        self.assertEqual(uni.get_number_of_teachers(), 20)
+        self.assertEqual(uni.get_students(), list(uni.students.values()))
+        self.assertEqual(uni.get_person_by_id("645591116").name, "Jere Cressida")
+        # the workers build the persons: parsed addresses and dates come back with them
+        self.assertEqual(len(uni.get_students_by_city("Lisbon")), 2)
+        self.assertEqual(len(uni.get_teachers_from("01/01/1900")), 20)
+        # a single shard is read in this process
+        single = University("my_uny")
+        [report] = single.load_shards(teachers_files=[teachers_file_path])
+        self.assertEqual(report.loaded, 20)
+
+    def test_snapshot_round_trip(self):
+        uni = University("my_uny")
+        uni.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+        uni.add_course("645591116", 5200)
+        uni.add_course("885227800", 5201)
+        uni.add_course("184547133", 5200)
+        uni.add_course("184547133", 1100)
+        uni.add_student("123456789", "Zoë Ångström", "Arts", "2019", "Malmö, Sweden, 2112")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'uni.snap')
+            uni.save_snapshot(path)
+            restored = University("restored")
+            restored.load_snapshot(path)
+            compact = University("compact", compact=True)
+            compact.load_snapshot(path)
+        self.assertEqual(restored.get_person_by_id("123456789").name, "Zoë Ångström")
+        self.assertEqual(restored.get_students_by_city("Malmö"), [restored.get_person_by_id("123456789")])
+        self.assertEqual(restored.get_student_total_points("645591116"), uni.get_student_total_points("645591116"))
+        self.assertEqual(compact.get_courses("184547133"), uni.get_courses("184547133"))
+        self.assertEqual(compact.get_top_10_students(), uni.get_top_10_students())
+        self.assertEqual(restored.name, "my_uny")
+        self.assertEqual(restored.list_courses(), uni.list_courses())
+        self.assertEqual(sorted(restored.get_faculties()), sorted(uni.get_faculties()))
+        self.assertEqual(restored.get_top_10_students(), uni.get_top_10_students())
+        self.assertEqual(restored.get_teachers_from("01/01/1990"), uni.get_teachers_from("01/01/1990"))
+        self.assertEqual(restored.get_courses("184547133"), uni.get_courses("184547133"))
+        self.assertEqual(restored.get_person_by_id("184547133").faculties, uni.get_person_by_id("184547133").faculties)
+        self.assertEqual(restored.get_course_roster(5200), [restored.get_person_by_id("645591116"),
+                                                            restored.get_person_by_id("184547133")])
+
+    def test_snapshot_reader_find(self):
+        from snapshot import SnapshotReader, SnapshotError
+        uni = University("my_uny")
+        uni.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+        uni.add_course("645591116", 5200)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'uni.snap')
+            uni.save_snapshot(path)
+            with SnapshotReader(path) as reader:
+                self.assertEqual(len(reader), 40)
+                record = reader.find("645591116")
+                self.assertEqual(record['full_name'], "Jere Cressida")
+                self.assertEqual(record['courses'], [5200])
+                self.assertIsNone(reader.find("000000000"))
+            with self.assertRaises(SnapshotError):
+                University("bad").load_snapshot(students_file_path)
+
+    def test_add_courses_bulk(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.add_student("718929205", "Cindelyn Han", "Agriculture & Natural Resources", "2007",
+                        "Shanghai, Egypt, 8440710")
+        uni.add_teacher("329622030", "Luci Erskine", "Communications & Journalism", "05/02/2003")
+        pairs = [('718929205', course_id) for course_id in range(1100, 1107)] + \
+                [('718929205', 1199), ('718929205', 1100), ('718929205', 6000), ('000000000', 1100), ('329622030', 9999),
+                 ('329622030', 1100), ('329622030', 6000), ('329622030', 2100)]
+        results = uni.add_courses_bulk(pairs, all_or_nothing=True)
+        self.assertEqual([r.accepted for r in results], [False] * len(pairs))
+        self.assertEqual(uni.get_courses('718929205'), [])
+        results = uni.add_courses_bulk(pairs)
+        self.assertEqual([r.accepted for r in results],
+                         [True] * 7 + [False, False, False, False, False, True, True, False])
+        self.assertIn('exceed 30 points', results[7].reason)
+        self.assertIn('already enrolled', results[8].reason)
+        self.assertIn('3 other faculties', results[-1].reason)
+        self.assertEqual(len(uni.get_courses('718929205')), 7)
+        self.assertEqual(uni.get_person_by_id('329622030').faculties,
+                         ["Communications & Journalism", "Agriculture & Natural Resources", "Arts"])
+        with self.assertRaises(PermissionError):
+            uni.add_course('329622030', 2100)
+
+    def test_journal_replay_and_compaction(self):
+        from journal import Journal
+        with tempfile.TemporaryDirectory() as tmp:
+            journal_path, snapshot_path = os.path.join(tmp, 'uni.journal'), os.path.join(tmp, 'uni.snap')
+            uni = University("my_uny")
+            uni.load_courses(courses_file_path)
+            uni.attach_journal(Journal(journal_path, sync_every=2))
+            uni.add_student("883720579", "Sandie Leifeste", "Arts", "2008", "Rio Branco, Bulgaria, 6196762")
+            uni.add_student("718929205", "Cindelyn Han", "Arts", "2007", "Shanghai, Egypt, 8440710")
+            uni.change_faculty("718929205", "Agriculture & Natural Resources")
+            uni.add_course("718929205", 1100)
+            uni.add_courses_bulk([("718929205", 1101), ("883720579", 6000)])
+            uni.remove_course("718929205", 1100)
+            uni._journal.sync()
+            from_base = University("my_uny")
+            from_base.load_courses(courses_file_path)
+            self.assertEqual(from_base.replay_journal(journal_path), 7)
+            self.assertEqual(from_base.get_courses("718929205"), uni.get_courses("718929205"))
+            uni.compact_journal(snapshot_path)
+            uni.add_teacher("329622030", "Luci Erskine", "Communications & Journalism", "05/02/2003")
+            uni.add_course("329622030", 1100)
+            uni.remove_course("883720579", 6000)
+            uni._journal.close()
+
+            recovered = University("my_uny")
+            self.assertEqual(recovered.recover(snapshot_path, journal_path), 3)
+            recovered._journal.close()
+            for person_id in ("883720579", "718929205", "329622030"):
+                self.assertEqual(recovered.get_courses(person_id), uni.get_courses(person_id))
+            self.assertEqual(recovered.get_person_by_id("718929205").faculty, "Agriculture & Natural Resources")
+
+    def test_journal_flushes_every_entry(self):
+        import time
+        from journal import Journal
+        with tempfile.TemporaryDirectory() as tmp:
+            journal_path = os.path.join(tmp, 'uni.journal')
+            journal = Journal(journal_path, sync_every=100, sync_interval=0.05)
+            journal.append(1, 'remove_person', ["883720579"])
+            # on disk (in the OS cache) before any fsync, so a process crash doesn't lose it
+            self.assertEqual(list(Journal.entries(journal_path)), [(1, 'remove_person', ["883720579"])])
+            # an idle journal still fsyncs its last batch
+            deadline = time.monotonic() + 5
+            while journal._pending and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(journal._pending, 0)
+            journal.close()
+
+    def test_service_batches_writes(self):
+        import asyncio
+        from service import UniversityService, generate_operations, run_load
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_students(students_file_path)
+
+        async def scenario():
+            async with UniversityService(uni) as service:
+                results = await asyncio.gather(service.add_course("645591116", 5200),
+                                               service.add_course("885227800", 5200),
+                                               service.get_top_10_students(),
+                                               service.add_course("645591116", 5200),
+                                               return_exceptions=True)
+                # a remove between two adds splits them into separate add_courses_bulk calls, in queue order
+                results += await asyncio.gather(service.remove_course("645591116", 5200),
+                                                service.add_course("645591116", 5200),
+                                                return_exceptions=True)
+                stats = await run_load(service, generate_operations(uni, 500, seed=1), concurrency=20)
+                return results, service.batches, stats
+
+        results, batches, stats = asyncio.run(scenario())
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[3], ValueError)
+        self.assertEqual(results[4:], [None, None])
+        self.assertEqual(len(uni.get_courses("885227800")), 1)
+        self.assertEqual(stats['requests'], 500)
+        self.assertLessEqual(stats['p50'], stats['p99'])
+        self.assertGreater(batches, 0)
+
+    def test_concurrent_university(self):
+        import threading
+        from concurrency import ConcurrentUniversity
+        uni = ConcurrentUniversity("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_students(students_file_path)
+        course_ids = [c['id'] for c in uni.list_courses() if c['faculty'] == "Humanities & Liberal Arts"]
+        students = [s.identity_number for s in uni.get_students_in_faculty("Humanities & Liberal Arts")]
+        views = []
+
+        def enroll(seed):
+            for i in range(200):
+                person_id = students[(seed + i) % len(students)]
+                course_id = course_ids[(seed * 7 + i) % len(course_ids)]
+                try:
+                    uni.add_course(person_id, course_id)
+                except (ValueError, PermissionError):
+                    uni.remove_course(person_id, course_id)
+
+        def observe():
+            for _ in range(50):
+                views.append(uni.snapshot())
+
+        threads = [threading.Thread(target=enroll, args=(seed,)) for seed in range(4)]
+        threads.append(threading.Thread(target=observe))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        views.append(uni.snapshot())
+        for view in views:
+            for student in view.students.values():
+                points = sum(uni.get_course_by_id(course_id)['points'] for course_id in student.courses)
+                self.assertEqual(student.points, points)
+                self.assertLessEqual(student.points, 30)
+        for person_id in students:
+            self.assertEqual(views[-1].students[person_id].courses, tuple(uni.get_person_by_id(person_id).courses))
+        # unchanged persons are shared with the previous snapshot, changed ones are copied
+        self.assertIs(uni.snapshot(), views[-1])
+        changed, unchanged = [person_id for person_id in students if views[-1].students[person_id].courses][:2]
+        uni.remove_course(changed, views[-1].students[changed].courses[0])
+        uni.add_student("883720579", "Jere Cressida", "Arts", "2008", "Haifa, Israel, 922745")
+        latest = uni.snapshot()
+        self.assertEqual(len(latest.students[changed].courses), len(views[-1].students[changed].courses) - 1)
+        self.assertIs(latest.students[unchanged], views[-1].students[unchanged])
+        self.assertEqual(latest.students["883720579"].name, "Jere Cressida")
+        self.assertNotIn("883720579", views[-1].students)
+        with self.assertRaises(TypeError):
+            latest.students["883720579"] = None
+        expected = sorted(uni.get_students(), key=lambda x: (x.points, x.name), reverse=True)
+        self.assertEqual(uni.get_top_10_students(), [s.name for s in expected[:10]])
+
+    def test_derived_cache_invalidation(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_faculties(courses_file_path)
+        uni.load_students(students_file_path)
+        zips = uni.get_students_zip_code()
+        self.assertEqual(uni.get_students_zip_code(), zips)
+        self.assertEqual(uni.cache_stats()['hits'], 1)
+        uni.add_student("883720579", "Sandie Leifeste", "Arts", "2008", "Rio Branco, Bulgaria, 6196762")
+        self.assertEqual(list(uni.get_students_zip_code()), sorted(zips + ("Rio Branco 6196762",)))
+        self.assertIs(uni.get_students_zip_code(), uni.get_students_zip_code())
+        self.assertEqual(len(uni.get_students_zip_code()), 21)
+
+        self.assertEqual(uni.get_student_total_points("645591116"), 0)
+        uni.add_course("645591116", 5200)
+        self.assertEqual(uni.get_student_total_points("645591116"), 5.5)
+        uni.remove_course("645591116", 5200)
+        self.assertEqual(uni.get_student_total_points("645591116"), 0)
+
+        misses = uni.cache_stats()['misses']
+        uni.load_faculties(courses_file_path)
+        self.assertEqual(len(uni.get_faculties()), 16)
+        self.assertEqual(uni.cache_stats()['misses'], misses)
+
+    def test_address_indexes(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_students(students_file_path)
+        uni.add_student("883720579", "Sandie Leifeste", "Arts", "2008", "Lisbon, Bulgaria, 0101999")
+        uni.add_student("883720578", "Broken Address", "Arts", "2008", "somewhere without commas")
+        lisbon = uni.get_students_by_city("Lisbon")
+        self.assertEqual([s.identity_number for s in lisbon], ["645591116", "939560097", "883720579"])
+        self.assertIs(lisbon[0].parsed_address.city, lisbon[2].parsed_address.city)
+        self.assertEqual([s.address for s in uni.get_students_by_zip_prefix("0101")],
+                         ["Lisbon, Luxembourg, 0101937", "Lisbon, Bulgaria, 0101999"])
+        self.assertEqual(uni.get_students_by_zip_prefix("99"), [])
+        zip_codes = uni.get_students_zip_code()
+        self.assertEqual(len(zip_codes), 21)
+        self.assertEqual(list(zip_codes), sorted(zip_codes))
+        self.assertEqual(uni.get_distinct_city_zip_codes(), sorted(set(zip_codes)))
+        self.assertEqual(uni.get_person_by_id("883720578").address, "somewhere without commas")
+        uni.remove_person("883720579")
+        self.assertEqual(len(uni.get_students_by_city("Lisbon")), 2)
+
+    def test_student_without_address(self):
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.add_student("883720579", "Sandie Leifeste", "Arts", "2008", None)
+        self.assertIsNone(uni.get_person_by_id("883720579").address)
+        self.assertEqual(uni.get_students_zip_code(), ())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'uni.snap')
+            uni.save_snapshot(path)
+            restored = University("restored")
+            restored.load_snapshot(path)
+        self.assertIsNone(restored.get_person_by_id("883720579").address)
+
+    def test_instrumentation(self):
+        import json
+        from instrumentation import metrics
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.get_top_10_students()
+        self.assertEqual(metrics.snapshot(), {})
+        with tempfile.TemporaryDirectory() as tmp:
+            metrics.enable(profile_dir=tmp)
+            try:
+                uni.load_students_bulk(students_file_path)
+                uni.add_course("645591116", 5200)
+                with self.assertRaises(ValueError):
+                    uni.add_course("645591116", 5200)
+                uni.get_top_10_students()
+                metrics.export_json(os.path.join(tmp, 'metrics.json'))
+                metrics.export_prometheus(os.path.join(tmp, 'metrics.prom'))
+                with open(os.path.join(tmp, 'metrics.json')) as f:
+                    methods = json.load(f)['methods']
+                with open(os.path.join(tmp, 'metrics.prom')) as f:
+                    prometheus = f.read()
+                profiles = os.listdir(tmp)
+            finally:
+                metrics.disable()
+                metrics.reset()
+        self.assertEqual(methods['load_students_bulk']['rows'], 20)
+        self.assertEqual(methods['add_course']['calls'], 2)
+        self.assertEqual(methods['add_course']['errors'], 1)
+        self.assertEqual(methods['get_top_10_students']['rows'], 10)
+        self.assertEqual(sum(methods['add_course']['buckets']), 2)
+        self.assertIn('myuniversity_calls_total{method="add_course"} 2', prometheus)
+        self.assertIn('myuniversity_latency_seconds_bucket{method="add_course",le="+Inf"} 2', prometheus)
+        self.assertIn('load_students_bulk-1.prof', profiles)
+
+    def test_benchmark_dataset_and_baseline(self):
+        from benchmark import write_dataset, compare_to_baseline, snapshot_benchmark
+        with tempfile.TemporaryDirectory() as tmp:
+            students_file, teachers_file, courses_file = write_dataset(tmp, 200, seed=3)
+            with open(students_file) as f:
+                first = f.read()
+            write_dataset(tmp, 200, seed=3)
+            with open(students_file) as f:
+                self.assertEqual(f.read(), first)
+            uni = University("bench")
+            uni.load_courses(courses_file)
+            self.assertEqual(uni.load_students_bulk(students_file).loaded, 200)
+            self.assertEqual(uni.load_teachers_bulk(teachers_file).loaded, 10)
+        result = snapshot_benchmark(200, seed=3)
+        self.assertEqual((result['csv']['operations'], result['snapshot']['operations']), (210, 210))
+        self.assertGreater(result['speedup'], 0)
+        baseline = {'sizes': {'1000': {'add_course': {'throughput': 100.0}, 'peak_rss_kb': 1}}}
+        results = {'sizes': {'1000': {'add_course': {'throughput': 70.0}, 'peak_rss_kb': 1}}}
+        self.assertEqual([r['operation'] for r in compare_to_baseline(results, baseline)], ['add_course'])
+        self.assertEqual(compare_to_baseline(results, baseline, tolerance=0.5), [])
+
+    def test_analytics(self):
+        from analytics import UniversityAnalytics
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.load_students(students_file_path)
+        analytics = UniversityAnalytics(uni)
+        self.assertEqual(analytics.refresh(), 20)
+        self.assertEqual(analytics.refresh(), 0)
+        uni.load_teachers(teachers_file_path)
+        uni.add_course("645591116", 5200)
+        uni.add_course("885227800", 5200)
+        uni.add_course("885227800", 5201)
+        uni.add_course("184547133", 5200)
+        uni.add_course("184547133", 1100)
+        self.assertEqual(analytics.refresh(), 22)
+        uni.remove_course("885227800", 5201)
+        uni.remove_person("409737565")
+        points = analytics.points_by_faculty()
+        self.assertEqual(points["Psychology & Social Work"], {'students': 2, 'total': 11.0, 'mean': 5.5, 'min': 5.5,
+                                                              'max': 5.5})
+        self.assertEqual(points["Humanities & Liberal Arts"]['students'], 3)
+        self.assertEqual(analytics.enrollment_counts(), {5200: 2})
+        self.assertEqual(analytics.enrollment_counts('Teacher'), {5200: 1, 1100: 1})
+        self.assertEqual(analytics.teacher_load_by_faculty(),
+                         {"Psychology & Social Work": {'teachers': 1, 'courses': 1},
+                          "Agriculture & Natural Resources": {'teachers': 1, 'courses': 1}})
+        cohorts = analytics.cohort_by_start_year()
+        self.assertEqual(sum(cohorts.values()), 19)
+        self.assertEqual(list(cohorts), sorted(cohorts))
+        self.assertEqual(sum(analytics.cohort_by_start_year('Teacher').values()), 20)
+        # the row of the removed student is reused
+        rows = len(analytics._kind)
+        uni.add_student("883720579", "Jere Cressida", "Arts", "2008", "Haifa, Israel, 922745")
+        self.assertEqual(analytics.cohort_by_start_year()[2008], cohorts.get(2008, 0) + 1)
+        self.assertEqual(len(analytics._kind), rows)
+        analytics.close()
+
+    def test_streaming_course_catalog(self):
+        import json
+        import catalog
+        with open(courses_file_path) as f:
+            courses = json.load(f)
+        uni = University("my_uny")
+        read_size, catalog.READ_SIZE = catalog.READ_SIZE, 64
+        try:
+            uni.load_courses(courses_file_path)
+        finally:
+            catalog.READ_SIZE = read_size
+        self.assertEqual(uni.list_courses(), courses)
+        self.assertIs(uni.get_course_by_id(1100), uni.get_course_by_id("1100"))
+        self.assertEqual(uni.courses.record(1100).name, "GENERAL AGRICULTURE")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'courses.ndjson')
+            with open(path, 'w') as f:
+                f.write(''.join(json.dumps(course) + '\n' for course in courses))
+            ndjson = University("my_uny")
+            ndjson.load_courses(path)
+        self.assertEqual(ndjson.list_courses(), courses)
+        self.assertEqual(sorted(ndjson.get_faculties()), sorted({c['faculty'] for c in courses}))
+
+    def test_course_capacity_and_waitlist(self):
+        from seats import CourseFullError
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        ids = [f'10000000{i}' for i in range(6)]
+        for identity_number in ids:
+            uni.add_student(identity_number, "Student " + identity_number, "Arts", "2010", "Haifa, Israel, 922745")
+        uni.add_course(ids[0], 6000)
+        uni.set_course_capacity(6000, 2)
+        self.assertEqual(uni.get_course_seats(6000), {'capacity': 2, 'taken': 1, 'free': 1, 'waiting': 0})
+        results = uni.allocate_seats([(ids[1], 6000), (ids[2], 6000), (ids[3], 6000, 5), (ids[4], 1100),
+                                      (ids[5], 6000)])
+        self.assertEqual([r.status for r in results], ['waitlisted', 'waitlisted', 'enrolled', 'rejected',
+                                                       'waitlisted'])
+        self.assertEqual(uni.get_waitlist(6000), [ids[1], ids[2], ids[5]])
+        self.assertEqual(uni.request_seat(ids[4], 6000, priority=1), 'waitlisted')
+        with self.assertRaises(CourseFullError):
+            uni.add_course(ids[4], 6000)
+        uni.remove_course(ids[0], 6000)
+        self.assertEqual([c['id'] for c in uni.get_courses(ids[4])], [6000])
+        uni.remove_person(ids[1])
+        uni.set_course_capacity(6000, 4)
+        self.assertEqual(uni.get_waitlist(6000), [])
+        self.assertEqual(sorted(p.identity_number for p in uni.get_course_roster(6000)), [ids[2], ids[3], ids[4], ids[5]])
+        self.assertEqual(uni.get_course_seats(6000)['free'], 0)
+        with self.assertRaises(ValueError):
+            uni.set_course_capacity(6000, -1)
+
+    def test_waitlist_reprioritise(self):
+        from seats import SeatAllocator
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        ids = [f'10000000{i}' for i in range(4)]
+        for identity_number in ids:
+            uni.add_student(identity_number, "Student " + identity_number, "Arts", "2010", "Haifa, Israel, 922745")
+        uni.set_course_capacity(6000, 1)
+        uni.add_course(ids[0], 6000)
+        for identity_number in ids[1:]:
+            uni.request_seat(identity_number, 6000)
+        self.assertEqual(uni.request_seat(ids[3], 6000, priority=2), 'waitlisted')
+        self.assertEqual(uni.get_waitlist(6000), [ids[3], ids[1], ids[2]])
+        self.assertEqual(uni.get_course_seats(6000)['waiting'], 3)
+        uni.remove_course(ids[0], 6000)
+        self.assertEqual([c['id'] for c in uni.get_courses(ids[3])], [6000])
+        self.assertEqual(uni.get_waitlist(6000), [ids[1], ids[2]])
+        # a removed person leaves the waitlists
+        uni.remove_person(ids[1])
+        self.assertEqual(uni.get_waitlist(6000), [ids[2]])
+        self.assertEqual(uni.get_course_seats(6000)['waiting'], 1)
+        # the stale entries of re-prioritised persons are skipped and don't pile up
+        seats = SeatAllocator()
+        for round_number in range(1000):
+            seats.enqueue('6000', str(round_number % 3), priority=round_number)
+        self.assertEqual(seats.waiting('6000'), 3)
+        self.assertLess(len(seats._waitlists['6000']), 200)
+        self.assertEqual([seats.pop_next('6000') for _ in range(4)], ['0', '2', '1', None])
+
+    def test_incremental_reload(self):
+        import csv
+        uni = University("my_uny")
+        uni.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+        uni.add_course("645591116", 5200)
+        with open(students_file_path) as f:
+            rows = list(csv.DictReader(f))
+        first = uni.reload_students(students_file_path)
+        self.assertEqual((first.inserted, first.updated, first.deleted, first.conflicts), ([], [], [], []))
+        self.assertEqual(first.unchanged, uni.get_number_of_students())
+        rows[0]['faculty'] = 'Arts'
+        rows[1]['address'] = 'Haifa, Israel, 922745'
+        rows[1]['full_name'] = 'Mariann Gino-Cohen'
+        removed = rows.pop(2)
+        rows.append({'identity_number': '123456789', 'full_name': 'New Student', 'faculty': 'Arts',
+                     'start_date': '2020', 'address': 'Eilat, Israel, 881000'})
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'students.csv')
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            report = uni.reload_students(path)
+            self.assertEqual(report.inserted, ['123456789'])
+            self.assertEqual(report.updated, ['547526213'])
+            self.assertEqual(report.deleted, [removed['identity_number']])
+            self.assertEqual([c['identity_number'] for c in report.conflicts], ['645591116'])
+            self.assertEqual(report.unchanged, first.unchanged - 3)
+            self.assertEqual(uni.get_person_by_id('645591116').faculty, 'Psychology & Social Work')
+            self.assertEqual([c['id'] for c in uni.get_courses('645591116')], [5200])
+            self.assertEqual([s.name for s in uni.get_students_by_city('Haifa')], ['Mariann Gino-Cohen'])
+            self.assertIsNone(uni.get_person_by_id(removed['identity_number']))
+            again = uni.reload_students(path)
+            self.assertEqual((again.inserted, again.updated, again.deleted), ([], [], []))
+            self.assertEqual(len(again.conflicts), 1)
+
+    def test_cli(self):
+        import contextlib
+        import io
+        import main
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot = ['--snapshot', os.path.join(tmp, 'uni.snap')]
+            self.assertEqual(main.main(snapshot + ['load']), 0)
+            self.assertEqual(main.main(snapshot + ['enroll', '645591116', '5200']), 0)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                self.assertEqual(main.main(snapshot + ['query', 'top', '-k', '1']), 0)
+                self.assertEqual(main.main(['query', 'courses', '--faculty', 'Arts']), 0)
+            lines = output.getvalue().splitlines()
+            self.assertEqual(lines[0], '1. Jere Cressida')
+            self.assertEqual(lines[1], '6000 FINE ARTS (Arts, 2 points)')
+            with contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(main.main(snapshot + ['enroll', '645591116', '5200']), 1)
+
+    def test_sqlite_backend(self):
+        from sqlite_university import SQLiteUniversity
+        memory = University("my_uny")
+        with tempfile.TemporaryDirectory() as tmp, SQLiteUniversity("my_uny", os.path.join(tmp, 'uni.db')) as sqlite:
+            for uni in (memory, sqlite):
+                uni.load_courses(courses_file_path)
+                report = uni.load_students_bulk(students_file_path, chunk_size=7)
+                uni.load_teachers_bulk(teachers_file_path)
+                uni.add_course("645591116", 5200)
+                uni.add_course("547526213", 3201)
+                uni.add_course("184547133", 5200)
+                with self.assertRaises(PermissionError):
+                    uni.add_course("645591116", 1100)
+                results = uni.add_courses_bulk([("608551548", 9999), ("184547133", 1100)])
+                self.assertEqual([r.accepted for r in results], [False, True])
+                uni.remove_course("547526213", 3201)
+            self.assertEqual(sqlite.get_number_of_students(), report.loaded)
+            self.assertEqual(sqlite.get_courses("184547133"), memory.get_courses("184547133"))
+            self.assertEqual(sqlite.get_person_by_id("184547133").faculties,
+                             memory.get_person_by_id("184547133").faculties)
+            self.assertEqual(sqlite.get_top_10_students(), memory.get_top_10_students())
+            self.assertEqual(sqlite.get_students_zip_code(), memory.get_students_zip_code())
+            self.assertEqual(sqlite.get_teachers_from("01/01/2015"), memory.get_teachers_from("01/01/2015"))
+            self.assertEqual(sqlite.get_student_total_points("645591116"), 5.5)
+            # students and teachers are query backed mappings, in the same order as the in memory ones
+            self.assertEqual(list(sqlite.students), list(memory.students))
+            self.assertEqual(len(sqlite.teachers), len(memory.teachers))
+            self.assertEqual([t.name for t in sqlite.teachers.values()], [t.name for t in memory.teachers.values()])
+            self.assertEqual(sqlite.students["645591116"].courses, memory.students["645591116"].courses)
+            self.assertIn("645591116", sqlite.students)
+            self.assertNotIn("645591116", sqlite.teachers)
+            with self.assertRaises(KeyError):
+                sqlite.teachers["645591116"]
+            with self.assertRaises(ValueError):
+                sqlite.check_person_validity(memory.get_person_by_id("645591116"), sqlite.students)
+            self.assertEqual(list(sqlite.iter_students(faculty="Arts")), sqlite.page_students(limit=1000,
+                                                                                              faculty="Arts")[0])
+            self.assertTrue(sqlite.check_date_format("14/05/1996"))
+            self.assertFalse(sqlite.check_date_format("1996"))
+            self.assertTrue(sqlite.compare_dates("14/05/1996", "15/05/1996"))
+            sqlite.load_faculties(courses_file_path)
+            self.assertEqual(sorted(sqlite.get_faculties()), sorted(memory.get_faculties()))
+
+            def error(method, *args):
+                try:
+                    method(*args)
+                except Exception as e:
+                    return type(e), str(e)
+
+            # both backends share the validation rules and messages
+            for name, args in [('add_student', ("645591116", "Sandie Leifeste", "Arts", "2008", "Haifa")),
+                               ('add_student', ("12345", "Sandie Leifeste", "Arts", "2008", "Haifa")),
+                               ('add_student', ("123456789", "Sandie Leifeste", "Arts", "08/2008", "Haifa")),
+                               ('add_teacher', ("123456789", "Luci Erskine", "Nowhere", "05/02/2003")),
+                               ('add_teacher', ("123456789", "Luci Erskine", "Arts", "2003")),
+                               ('change_faculty', ("184547133", "Arts")),
+                               ('change_faculty', ("645591116", "Nowhere")),
+                               ('change_faculty', ("645591116", "Arts")),
+                               ('remove_person', ("645591116",)),
+                               ('remove_person', ("000000000",))]:
+                self.assertIsNotNone(error(getattr(memory, name), *args))
+                self.assertEqual(error(getattr(sqlite, name), *args), error(getattr(memory, name), *args))
+            changes = sqlite._conn.total_changes
+            sqlite.change_faculty("645591116", sqlite.get_person_by_id("645591116").faculty)
+            self.assertEqual(sqlite._conn.total_changes, changes)
+            sqlite.remove_person("608551548")
+            self.assertIsNone(sqlite.get_person_by_id("608551548"))
+
+    def test_timetable(self):
+        from timetable import ScheduleConflictError
+        uni = University("my_uny")
+        uni.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+        uni.set_course_slots(5200, ["Mon 10:00-12:00", "Wed 10:00-11:00"])
+        uni.set_course_slots(5201, ["Wed 10:30-12:00"])
+        uni.set_course_slots(5202, ["Wed 11:00-12:00"])
+        with self.assertRaises(ValueError):
+            uni.set_course_slots(5203, ["Mon 10:00-09:00"])
+        uni.add_course("645591116", 5200)
+        with self.assertRaises(ScheduleConflictError):
+            uni.add_course("645591116", 5201)
+        uni.set_course_slots(5206, ["Wed 11:30-12:00"])
+        results = uni.add_courses_bulk([("645591116", 5202), ("645591116", 5206)])
+        self.assertEqual([r.accepted for r in results], [True, False])
+        self.assertIn('clash with course 5202', results[1].reason)
+        self.assertEqual(uni.get_schedule("645591116"), [("Mon 10:00-12:00", 5200), ("Wed 10:00-11:00", 5200),
+                                                         ("Wed 11:00-12:00", 5202)])
+        uni.remove_course("645591116", 5200)
+        uni.remove_course("645591116", 5202)
+        uni.add_course("645591116", 5201)
+        with self.assertRaises(PermissionError):
+            uni.set_course_slots(5201, [])
+        self.assertEqual(uni.courses[str(5202)]["slots"], ["Wed 11:00-12:00"])
+        # three clashing Wednesday courses need three teachers, none of them above the limits
+        uni.set_course_slots(5203, ["Wed 10:00-12:00"])
+        uni.set_course_slots(5299, ["Wed 10:00-12:00"])
+        uni.set_course_slots(5205, ["Wed 10:00-12:00"])
+        assignments = uni.assign_teachers([5203, 5299, 5205], apply=True)
+        self.assertEqual(len(set(assignments.values())), 3)
+        for course_id, teacher_id in assignments.items():
+            self.assertIn(course_id, [c['id'] for c in uni.get_courses(teacher_id)])
+        self.assertEqual(len(uni.assign_teachers()), len(uni.courses) - 3)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'uni.snap')
+            uni.save_snapshot(path)
+            restored = University("restored")
+            restored.load_snapshot(path)
+        self.assertEqual(restored.get_schedule("645591116"), uni.get_schedule("645591116"))
+
+    def test_change_events(self):
+        import threading
+        from events import EventLog, EventsLost
+        uni = University("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.attach_event_log(EventLog(capacity=4))
+        early = uni._events.subscribe(0)
+        uni.add_student("718929205", "Cindelyn Han", "Arts", "2007", "Shanghai, Egypt, 8440710")
+        late = uni._events.subscribe()
+        uni.add_course("718929205", 6000)
+        uni.remove_course("718929205", 6000)
+        events = early.poll(max_events=2)
+        self.assertEqual([(e.offset, e.type) for e in events], [(0, 'add_student'), (1, 'add_course')])
+        self.assertEqual(events[1].data, {'identity_number': "718929205", 'course_id': 6000})
+        self.assertEqual([e.type for e in late.poll()], ['add_course', 'remove_course'])
+        self.assertEqual(late.poll(), [])
+        for _ in range(3):
+            uni.add_course("718929205", 6000)
+            uni.remove_course("718929205", 6000)
+        with self.assertRaises(EventsLost) as lost:
+            early.poll()
+        early.seek(lost.exception.first_offset)
+        self.assertEqual(len(early.poll()), 4)
+        # a blocking log makes the writer wait for its slowest subscriber
+        blocking = EventLog(capacity=2, overflow='block')
+        uni.attach_event_log(blocking)
+        received = []
+
+        def consume():
+            while len(received) < 6:
+                received.extend(subscription.poll(max_events=1, timeout=5))
+
+        with blocking.subscribe() as subscription:
+            consumer = threading.Thread(target=consume)
+            consumer.start()
+            for _ in range(3):
+                uni.add_course("718929205", 6000)
+                uni.remove_course("718929205", 6000)
+            consumer.join()
+        self.assertEqual([e.offset for e in received], list(range(6)))
+
+    def test_blocking_event_log_subscriber_reads_university(self):
+        import threading
+        from concurrency import ConcurrentUniversity
+        from events import EventLog
+        uni = ConcurrentUniversity("my_uny")
+        uni.load_courses(courses_file_path)
+        uni.attach_event_log(EventLog(capacity=1, overflow='block', block_timeout=None))
+        courses = []
+
+        def consume():
+            # a subscriber calling back into the university while the writer waits for room
+            while len(courses) < 3:
+                for event in subscription.poll(timeout=5):
+                    courses.append(uni.get_courses(event.data['identity_number']))
+
+        with uni._events.subscribe() as subscription:
+            consumer = threading.Thread(target=consume)
+            consumer.start()
+            uni.add_student("718929205", "Cindelyn Han", "Arts", "2007", "Shanghai, Egypt, 8440710")
+            uni.add_course("718929205", 6000)
+            uni.remove_course("718929205", 6000)
+            consumer.join(timeout=10)
+        self.assertFalse(consumer.is_alive())
+        self.assertEqual(len(courses), 3)
+        # without subscribers making room, a blocking append gives up after block_timeout and overwrites
+        log = EventLog(capacity=1, overflow='block', block_timeout=0.05)
+        stalled = log.subscribe()
+        log.append(1, 'remove_person', ("718929205",))
+        log.append(2, 'remove_person', ("718929205",))
+        self.assertEqual(log.first_offset, 1)
+        stalled.close()
+
+    def test_name_search(self):
+        uni = University("myUniversity")
+        uni.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+        names = lambda persons: [p.name for p in persons]
+        self.assertIsNone(uni._name_index)
+        self.assertEqual(names(uni.search_persons("JER")), ["Jere Cressida"])
+        self.assertEqual(names(uni.search_persons("jere cressida")), ["Jere Cressida"])
+        self.assertEqual(names(uni.search_persons("ressi", mode='substring')), ["Jere Cressida"])
+        self.assertEqual(names(uni.search_persons("cresida", mode='fuzzy')), ["Jere Cressida"])
+        self.assertEqual(uni.search_persons("cresida", mode='fuzzy', max_distance=0), [])
+        # pages of a ranked result don't overlap
+        matches = uni.search_persons("ab", mode='substring', limit=100)
+        self.assertEqual(names(uni.search_persons("ab", mode='substring', offset=1, limit=2)), names(matches[1:3]))
+        with self.assertRaises(ValueError):
+            uni.search_persons("jer", mode='regex')
+        # the index follows additions and removals
+        person = uni.search_persons("jer")[0]
+        uni.remove_person(person.identity_number)
+        self.assertEqual(uni.search_persons("jer"), [])
+        uni.add_student("718929205", "Cindelyn Jerome", "Arts", "2007", "Shanghai, Egypt, 8440710")
+        self.assertEqual(names(uni.search_persons("jer")), ["Cindelyn Jerome"])
+
+    def test_paginated_iterators(self):
+        uni = University("myUniversity")
+        uni.load_university_data(students_file_path, teachers_file_path, courses_file_path)
+        ids = lambda persons: [p.identity_number for p in persons]
+        self.assertEqual(ids(uni.iter_students()), sorted(ids(uni.get_students())))
+        self.assertEqual(ids(uni.iter_teachers()), sorted(ids(uni.get_teachers())))
+        # cursor pages cover the filtered students exactly once, in identity number order
+        faculty = uni.get_students()[0].faculty
+        expected = sorted(p.identity_number for p in uni.get_students() if p.faculty == faculty)
+        pages, cursor = [], None
+        while True:
+            page, cursor = uni.page_students(cursor, limit=1, faculty=faculty)
+            pages.append(ids(page))
+            if cursor is None:
+                break
+        self.assertEqual([i for page in pages for i in page], expected)
+        self.assertTrue(all(len(page) <= 1 for page in pages))
+        uni.add_course("184547133", 6000)
+        teachers = ids(uni.iter_teachers(start_year=1996, predicate=lambda t: len(t.faculties) > 1))
+        self.assertEqual(teachers, ["184547133"])
+        self.assertEqual(ids(uni.iter_teachers(start_year=1996)),
+                         sorted(p.identity_number for p in uni.get_teachers()
+                                if uni.get_start_year(p.start_date) == 1996))
+        law = list(uni.iter_courses(faculty="Law & Public Policy"))
+        self.assertTrue(law)
+        self.assertEqual(law, [c for c in uni.list_courses() if c["faculty"] == "Law & Public Policy"])
+        self.assertEqual([c["id"] for c in uni.iter_person_courses("184547133", faculty="Arts")], [6000])
+        self.assertEqual(list(uni.iter_person_courses("184547133")), uni.get_courses("184547133"))
+        with self.assertRaises(NameError):
+            uni.iter_person_courses("000000000")
+        self.assertEqual(list(uni.iter_teachers_from("01/01/2000")), uni.get_teachers_from("01/01/2000"))
+        with self.assertRaises(ValueError):
+            uni.iter_teachers_from("2000-01-01")
+        # a student added behind the cursor between pages is skipped, one ahead of it is returned
+        first, cursor = uni.page_students(limit=1)
+        uni.add_student("000000001", "Early Bird", faculty, "2007", "Shanghai, Egypt, 8440710")
+        uni.add_student("999999999", "Late Owl", faculty, "2007", "Shanghai, Egypt, 8440710")
+        rest, cursor = uni.page_students(cursor, limit=100)
+        self.assertEqual(ids(first + rest), sorted(ids(uni.get_students()))[1:])
+        self.assertIsNone(cursor)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)